@@ -0,0 +1,89 @@
+"""Compares the generation speed of the CPU inference options of HuggingFaceLoader.
+
+Usage:
+
+    python benchmarks/cpu_inference.py
+    python benchmarks/cpu_inference.py --model meta-llama/Llama-3.2-1B-Instruct --num-threads 8
+
+Without `--model`, a tiny randomly initialised Llama model is built so that no download is needed.
+"""
+
+import tempfile
+import time
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer()
+
+PROMPT = "Write a short story about a lighthouse keeper who finds a message in a bottle."
+
+
+def tokens_per_second(model: str, max_tokens: int, repeats: int, **options) -> dict:
+    """Loads a model for CPU inference with the given options and measures how fast it generates.
+
+    Args:
+        model: The name or path of the model.
+        max_tokens: The maximum number of tokens to generate per call.
+        repeats: The number of timed calls.
+        **options: Options for HuggingFaceLoader, e.g. `dtype`, `num_threads`, `static_cache` or `compile`.
+
+    Returns:
+        dict: The load time, the number of generated tokens and the tokens per second.
+    """
+    from llmloader.huggingface import HuggingFaceLoader
+    from llmloader.llama_model import ChatLlama3
+    from llmloader.weights import WeightRegistry
+
+    start = time.perf_counter()
+    llm = HuggingFaceLoader(weight_registry=WeightRegistry())(
+        model=model, device="cpu", max_tokens=max_tokens, temperature=1.0, **options
+    )
+    load_time = time.perf_counter() - start
+    chat = ChatLlama3(llm=llm)
+    tokenizer = llm.pipeline.tokenizer
+
+    chat.invoke(PROMPT)  # warm up
+
+    tokens = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        text = chat.invoke(PROMPT).content
+        tokens += len(tokenizer(text, add_special_tokens=False)["input_ids"])
+    elapsed = time.perf_counter() - start
+
+    return dict(load_time=load_time, tokens=tokens, tokens_per_second=tokens / elapsed if elapsed else 0.0)
+
+
+@app.command()
+def main(
+    model: str = typer.Option("", help="The model to benchmark. If empty, a tiny random Llama model is used."),
+    dtype: list[str] = typer.Option(["float32", "bfloat16", "int8"], help="The CPU dtypes to compare"),
+    num_threads: int = typer.Option(None, help="The number of torch threads"),
+    max_tokens: int = typer.Option(64, help="The maximum number of tokens to generate per call"),
+    repeats: int = typer.Option(3, help="The number of timed calls for each dtype"),
+):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not model:
+            from tiny_llama import save_tiny_llama
+
+            model = str(save_tiny_llama(tmpdir))
+
+        table = Table(title=f"CPU inference: {model}")
+        table.add_column("dtype")
+        table.add_column("load (s)", justify="right")
+        table.add_column("tokens", justify="right")
+        table.add_column("tokens/sec", justify="right")
+
+        for name in dtype:
+            result = tokens_per_second(model, max_tokens, repeats, dtype=name, num_threads=num_threads)
+            table.add_row(
+                name, f"{result['load_time']:.2f}", str(result["tokens"]), f"{result['tokens_per_second']:.1f}"
+            )
+
+        Console().print(table)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,136 @@
+"""Compares loading models with and without a shared HTTP pool against a local OpenAI compatible stub server.
+
+Usage:
+
+    python benchmarks/http_pool.py
+    python benchmarks/http_pool.py --requests 2000 --threads 32 --latency 0.02
+
+Each request loads a model, as a web handler calling `llmloader.load` per request would, and invokes it.
+The stub server answers every chat completion immediately after `--latency` seconds, so the timings show the
+client side overhead of building clients and opening connections rather than model latency.
+Note that langchain_openai already shares a default client between models with the same base URL,
+so most of the gain over the defaults comes from the client cache.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer()
+
+COMPLETION = json.dumps(
+    {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub/model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+).encode("utf-8")
+
+
+class StubServer(ThreadingHTTPServer):
+    """Serves a fixed chat completion with keep-alive and counts the connections it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), StubHandler)
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(endpoint: str, requests: int, threads: int, models: int, **options) -> float:
+    """Loads and invokes a model for each request from several threads and returns the requests per second."""
+    import llmloader
+
+    def request(i: int) -> None:
+        llm = llmloader.load(f"stub/model-{i % models}", api_key="key", endpoint=endpoint, **options)
+        llm.invoke("ping")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(request, range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+@app.command()
+def main(
+    requests: int = typer.Option(500, help="The number of requests for each mode"),
+    threads: int = typer.Option(16, help="The number of concurrent requests"),
+    models: int = typer.Option(4, help="The number of different model names to load"),
+    latency: float = typer.Option(0.005, help="The number of seconds the stub server waits before answering"),
+    max_connections: int = typer.Option(100, help="The maximum number of connections of the shared pool"),
+):
+    import logging
+    import warnings
+
+    from llmloader.http_pool import HttpPool
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    warnings.filterwarnings("ignore", message="A custom endpoint is set")
+
+    server = StubServer(latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}/v1"
+
+    table = Table(title=f"{requests} requests from {threads} threads to a local stub server")
+    table.add_column("mode")
+    table.add_column("requests/sec", justify="right")
+    table.add_column("connections opened", justify="right")
+    table.add_column("connection reuse", justify="right")
+
+    pool = HttpPool(max_connections=max_connections, max_keepalive_connections=threads)
+    modes = {
+        "default clients": dict(),
+        "shared pool": dict(http_pool=pool),
+        "shared pool + client cache": dict(http_pool=pool, client_cache=True),
+    }
+    # one untimed request per mode so that imports and the first connection are not measured
+    for options in modes.values():
+        run(endpoint, 1, 1, 1, **options)
+
+    for name, options in modes.items():
+        connections = server.connections
+        rate = run(endpoint, requests, threads, models, **options)
+        opened = server.connections - connections
+        table.add_row(name, f"{rate:.0f}", str(opened), f"{1 - opened / requests:.1%}")
+
+    Console().print(table)
+    info = pool.info()
+    Console().print(
+        f"Shared pool: {info.requests} requests, {info.connections} connections, {info.reuse_ratio:.1%} reused"
+    )
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    app()
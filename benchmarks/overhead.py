@@ -0,0 +1,274 @@
+"""Measures the overhead llmloader itself adds to a call, saves the results as JSON and compares them with a baseline.
+
+Usage:
+
+    python benchmarks/overhead.py run --output baseline.json
+    # ... change llmloader ...
+    python benchmarks/overhead.py run --output current.json
+    python benchmarks/overhead.py compare baseline.json current.json --threshold 0.2
+
+The providers are mocked with `patch_llm_fn` from `tests/mocks/models.py`, as in the tests, so `load` measures
+only the resolution of the model name to a loader and the construction of its arguments, and nothing touches the network.
+Each benchmark is timed over several rounds of enough calls to last about 0.2 seconds, and the median time per call
+is compared. `compare` exits with status 1 if any benchmark is slower than the baseline by more than the threshold.
+"""
+
+import base64
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tests"))
+from mocks.models import patch_llm_fn  # noqa: E402
+
+app = typer.Typer()
+
+# The configurations of `load` for each provider, as in the `model_auth` and `credentials` test fixtures
+PROVIDERS = {
+    "openai": dict(model="gpt-5.1"),
+    "anthropic": dict(model="claude-sonnet-4-5"),
+    "gemini": dict(model="gemini-3"),
+    "xai": dict(model="grok-3-pro"),
+    "mistral": dict(model="mistral-3-large"),
+    "llama": dict(model="meta-llama/Llama-3-70b"),
+    "azure": dict(model="deployed_model_name", endpoint="https://dummy-azure-endpoint.open"),
+    "openrouter": dict(model="openrouter/router_model"),
+}
+
+MOCKED_CLASSES = [
+    "langchain_openai.ChatOpenAI",
+    "langchain_anthropic.ChatAnthropic",
+    "langchain_google_genai.ChatGoogleGenerativeAI",
+    "langchain_xai.ChatXAI",
+    "langchain_mistralai.ChatMistralAI",
+    "llmloader.llama_model.ChatLlama3",
+    "langchain_azure_ai.chat_models.AzureAIChatCompletionsModel",
+]
+
+
+UNKNOWN_MODEL = "load/unknown model error"
+
+
+@contextlib.contextmanager
+def mocked_providers(fail: bool = False) -> Iterator[None]:
+    """Replaces the chat model class of every provider with a mock, like the `providers` test fixture.
+
+    Args:
+        fail: Whether the mocks reject the model, as every provider does for a model name it does not know.
+    """
+    with contextlib.ExitStack() as stack:
+        hf_mock = stack.enter_context(patch("llmloader.llama.HuggingFaceLoader.__call__"))
+        hf_mock.side_effect = lambda *args, **kwargs: kwargs.get("model", "")
+        for name in MOCKED_CLASSES:
+            mock, _ = stack.enter_context(patch_llm_fn(name))
+            if fail:
+                mock.side_effect = ValueError("The model does not exist")
+        yield
+
+
+def load_benchmark(config: dict) -> Callable[[], object]:
+    import llmloader
+
+    def run():
+        # loaders record the endpoint in CUSTOM_ENDPOINT, which would send the next provider to Azure
+        try:
+            return llmloader.load(api_key="key123", temperature=0.7, max_tokens=100, **config)
+        finally:
+            os.environ.pop("CUSTOM_ENDPOINT", None)
+
+    return run
+
+
+def unknown_model_benchmark() -> Callable[[], object]:
+    import llmloader
+
+    def run():
+        try:
+            llmloader.load("no-such-model", api_key="key123")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("The unknown model was loaded")
+        finally:
+            os.environ.pop("CUSTOM_ENDPOINT", None)
+
+    return run
+
+
+def benchmarks() -> dict[str, Callable[[], Callable[[], object]]]:
+    """Returns the functions which set up each benchmark and return the call to time, by name."""
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+    import llmloader
+    from llmloader import LLMWrapper
+    from llmloader.dummy_model import DummyLLM
+    from llmloader.metrics import Metrics
+
+    image = dict(data=base64.b64encode(os.urandom(3 * 1024)).decode("ascii"), mime_type="image/png")
+    response = AIMessage(
+        content="ok",
+        response_metadata=dict(token_usage=dict(prompt_tokens=12, completion_tokens=34, total_tokens=46)),
+    )
+    dummy = DummyLLM()
+    prompts = [f"prompt {i}" for i in range(100)]
+    conversation = [SystemMessage(content="You are terse.")] + [
+        message
+        for i in range(10)
+        for message in (HumanMessage(content=f"question {i}"), AIMessage(content=f"answer {i}"))
+    ]
+
+    def chat_llama3_conversion():
+        from llmloader.llama_model import ChatLlama3
+
+        return lambda: ChatLlama3.convert_messages(conversation)
+
+    suite = {f"load/{name}": (lambda config=config: load_benchmark(config)) for name, config in PROVIDERS.items()}
+    suite[UNKNOWN_MODEL] = unknown_model_benchmark
+    suite.update(
+        {
+            "LLMWrapper.format image": lambda: lambda: LLMWrapper.format(dummy, "image", image),
+            "LLMWrapper.get_token_count": lambda: lambda: LLMWrapper.get_token_count(response),
+            "DummyLLM.invoke": lambda: lambda: dummy.invoke("hello"),
+            "DummyLLM.batch of 100": lambda: lambda: dummy.batch(prompts),
+            "DummyChatModel.invoke": lambda: partial(llmloader.load("dummy?").invoke, "hello"),
+            "DummyChatModel.invoke with metrics": lambda: partial(
+                llmloader.load("dummy?", metrics=Metrics()).invoke, "hello"
+            ),
+            "ChatLlama3.convert_messages of 21": chat_llama3_conversion,
+        }
+    )
+    return suite
+
+
+def measure(call: Callable[[], object], rounds: int) -> dict:
+    """Times a call over several rounds of enough calls to last about 0.2 seconds each."""
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+    times = [total / number for total in timer.repeat(repeat=rounds, number=number)]
+    return dict(median=statistics.median(times), min=min(times), rounds=rounds, number=number)
+
+
+def measure_import(rounds: int) -> dict:
+    """Times `import llmloader` in a fresh interpreter for each round."""
+    code = "import time; start = time.perf_counter(); import llmloader; print(time.perf_counter() - start)"
+    times = [
+        float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+        for _ in range(rounds)
+    ]
+    return dict(median=statistics.median(times), min=min(times), rounds=rounds, number=1)
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def version() -> str:
+    from importlib.metadata import PackageNotFoundError
+    from importlib.metadata import version as package_version
+
+    try:
+        return package_version("llmloader")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+@app.command()
+def run(
+    output: Path = typer.Option(Path("overhead.json"), help="The JSON file to save the results to"),
+    rounds: int = typer.Option(7, help="The number of rounds of each benchmark"),
+    only: str = typer.Option("", help="Only run the benchmarks whose name contains this text"),
+):
+    """Runs the benchmarks and saves the time per call of each to a JSON file."""
+    import warnings
+
+    warnings.filterwarnings("ignore")
+    console = Console()
+    results = {}
+    if only.lower() in "import llmloader":
+        results["import llmloader"] = measure_import(rounds)
+
+    for name, setup in benchmarks().items():
+        if only.lower() not in name.lower():
+            continue
+        with mocked_providers(fail=name == UNKNOWN_MODEL):
+            call = setup()
+            call()  # untimed so that lazy imports and caches are warm
+            results[name] = measure(call, rounds)
+
+    table = Table(title=f"Time per call, median of {rounds} rounds")
+    table.add_column("benchmark")
+    table.add_column("median", justify="right")
+    table.add_column("min", justify="right")
+    for name, result in results.items():
+        table.add_row(name, format_time(result["median"]), format_time(result["min"]))
+    console.print(table)
+
+    meta = dict(
+        llmloader=version(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        created=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    )
+    output.write_text(json.dumps(dict(meta=meta, results=results), indent=2) + "\n", encoding="utf-8")
+    console.print(f"Saved to {output}")
+
+
+@app.command()
+def compare(
+    baseline: Path = typer.Argument(..., help="The JSON file of the baseline results"),
+    current: Path = typer.Argument(..., help="The JSON file of the results to check"),
+    threshold: float = typer.Option(0.2, help="The relative slowdown of the median time which counts as a regression"),
+):
+    """Compares two result files and exits with status 1 if any benchmark regressed by more than the threshold."""
+    before = json.loads(baseline.read_text(encoding="utf-8"))["results"]
+    after = json.loads(current.read_text(encoding="utf-8"))["results"]
+
+    table = Table(title=f"{current} against {baseline}")
+    table.add_column("benchmark")
+    table.add_column("baseline", justify="right")
+    table.add_column("current", justify="right")
+    table.add_column("change", justify="right")
+    table.add_column("")
+    regressions = []
+    for name in [*before, *(name for name in after if name not in before)]:
+        if name not in before or name not in after:
+            table.add_row(name, "", "", "", "only in baseline" if name in before else "new")
+            continue
+        old, new = before[name]["median"], after[name]["median"]
+        change = new / old - 1
+        if change > threshold:
+            status = "[red]regression[/red]"
+            regressions.append(name)
+        elif change < -threshold:
+            status = "[green]faster[/green]"
+        else:
+            status = ""
+        table.add_row(name, format_time(old), format_time(new), f"{change:+.1%}", status)
+
+    console = Console()
+    console.print(table)
+    if regressions:
+        console.print(f"{len(regressions)} regressions over {threshold:.0%}: {', '.join(regressions)}")
+        raise typer.Exit(code=1)
+    console.print(f"No regressions over {threshold:.0%}")
+
+
+if __name__ == "__main__":
+    app()
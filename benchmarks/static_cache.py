@@ -0,0 +1,58 @@
+"""Compares the generation speed of HuggingFaceLoader with and without a static KV cache and compilation on the CPU.
+
+Usage:
+
+    python benchmarks/static_cache.py
+    python benchmarks/static_cache.py --model meta-llama/Llama-3.2-1B-Instruct --num-threads 8
+
+Without `--model`, a tiny randomly initialised Llama model is built so that no download is needed.
+The load time includes the warm up, which compiles the decode step when `compile` is used.
+"""
+
+import tempfile
+
+import typer
+from cpu_inference import tokens_per_second
+from rich.console import Console
+from rich.table import Table
+
+app = typer.Typer()
+
+MODES = {
+    "dynamic cache": dict(),
+    "static cache": dict(static_cache=True),
+    "static cache + compile": dict(compile=True),
+}
+
+
+@app.command()
+def main(
+    model: str = typer.Option("", help="The model to benchmark. If empty, a tiny random Llama model is used."),
+    dtype: str = typer.Option("float32", help="The CPU dtype"),
+    num_threads: int = typer.Option(None, help="The number of torch threads"),
+    max_tokens: int = typer.Option(64, help="The maximum number of tokens to generate per call"),
+    repeats: int = typer.Option(5, help="The number of timed calls for each mode"),
+):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if not model:
+            from tiny_llama import save_tiny_llama
+
+            model = str(save_tiny_llama(tmpdir))
+
+        table = Table(title=f"Static KV cache and compilation on CPU: {model}")
+        table.add_column("mode")
+        table.add_column("load (s)", justify="right")
+        table.add_column("tokens", justify="right")
+        table.add_column("tokens/sec", justify="right")
+
+        for name, options in MODES.items():
+            result = tokens_per_second(model, max_tokens, repeats, dtype=dtype, num_threads=num_threads, **options)
+            table.add_row(
+                name, f"{result['load_time']:.2f}", str(result["tokens"]), f"{result['tokens_per_second']:.1f}"
+            )
+
+        Console().print(table)
+
+
+if __name__ == "__main__":
+    app()
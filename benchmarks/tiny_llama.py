@@ -0,0 +1,30 @@
+"""Builds a tiny, randomly initialised Llama model on disk so that local model benchmarks need no downloads."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tests"))
+from mocks.models import tiny_llama  # noqa: E402
+
+
+def save_tiny_llama(path: Path | str, hidden_size: int = 256, num_hidden_layers: int = 4, seed: int = 0) -> Path:
+    """Saves the `tiny_llama` model of the tests, with its character-level tokenizer and Llama 3 style chat template.
+
+    The directory can be loaded with `llmloader.huggingface.HuggingFaceLoader` like a model on the Hugging Face Hub.
+
+    Args:
+        path: The directory to save the model to.
+        hidden_size: The hidden size of the model.
+        num_hidden_layers: The number of transformer layers.
+        seed: The random seed used to initialise the weights.
+
+    Returns:
+        Path: The directory with the saved model.
+    """
+    path = Path(path)
+    model, tokenizer = tiny_llama(
+        hidden_size=hidden_size, num_hidden_layers=num_hidden_layers, max_position_embeddings=2048, seed=seed
+    )
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
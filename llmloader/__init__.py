@@ -1,16 +1,86 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+import importlib
+import os
+import threading
+from typing import TYPE_CHECKING
 
 from .anthropic import AnthropicLoader
 from .azure import AzureAILoader
+from .cache import CacheInfo, ClientCache, default_client_cache, fingerprint
 from .dummy import DummyLoader
 from .gemini import GeminiLoader
+from .http_pool import HttpPool, HttpPoolInfo, default_http_pool
 from .llama import LlamaLoader
+from .loader import Loader
 from .mistral import MistralLoader
 from .openai import OpenAILoader
 from .openrouter import OpenRouterLoader
-from .wrappers import *
+from .registry import LoaderRegistry
 from .xai import XAILoader
 
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from langchain_core.caches import BaseCache
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    from .concurrency import AdaptiveConcurrency
+    from .metrics import Metrics
+    from .rate_limit import RateLimiter
+    from .wrappers import LLMWrapper
+
+__all__ = [
+    "load",
+    "resolve",
+    "register",
+    "unload",
+    "set_weight_budget",
+    "clear_cache",
+    "cache_info",
+    "http_pool_info",
+    "loaders",
+    "default_registry",
+    "default_client_cache",
+    "default_http_pool",
+    "Loader",
+    "LoaderRegistry",
+    "ClientCache",
+    "CacheInfo",
+    "HttpPool",
+    "HttpPoolInfo",
+    "LLMWrapper",
+    "OpenAILoader",
+    "AnthropicLoader",
+    "GeminiLoader",
+    "XAILoader",
+    "MistralLoader",
+    "LlamaLoader",
+    "DummyLoader",
+    "AzureAILoader",
+    "OpenRouterLoader",
+]
+
+# Attributes which are imported from submodules on first access so that `import llmloader` stays cheap.
+# The loader modules above only import their provider SDKs when a model is loaded.
+_lazy_attributes = {
+    "LLMWrapper": ".wrappers",
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_attributes:
+        module = importlib.import_module(_lazy_attributes[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_lazy_attributes))
+
+
 loaders = [
     OpenAILoader(),
     AnthropicLoader(),
@@ -23,25 +93,135 @@ loaders = [
     OpenRouterLoader(),
 ]
 
+default_registry = LoaderRegistry(loaders)
+
+
+_response_caches: dict[str, BaseCache] = {}
+_response_caches_lock = threading.Lock()
+
 
 def load(
-    model: str, temperature: float | None = None, api_key: str = "", max_tokens: int | None = None, **kwargs
+    model: str | list[str],
+    temperature: float | None = None,
+    api_key: str = "",
+    max_tokens: int | None = None,
+    client_cache: bool | ClientCache = False,
+    cache: str | Path | BaseCache | None = None,
+    http_pool: bool | HttpPool = False,
+    endpoints: list[tuple] | None = None,
+    balance: str = "least_outstanding",
+    rate_limit: RateLimiter | dict | None = None,
+    concurrency: AdaptiveConcurrency | None = None,
+    metrics: bool | Metrics = False,
+    **kwargs,
 ) -> BaseChatModel:
+    # The calls in flight are limited by an adaptive controller, e.g. for `batch` and `abatch`
+    if concurrency is not None:
+        from .concurrency import AdaptiveChatModel
+
+        llm = load(
+            model,
+            temperature,
+            api_key,
+            max_tokens,
+            client_cache=client_cache,
+            http_pool=http_pool,
+            endpoints=endpoints,
+            balance=balance,
+            rate_limit=rate_limit,
+            metrics=metrics,
+            **kwargs,
+        )
+        llm = AdaptiveChatModel(model=llm, controller=concurrency)
+        # cached responses are answered before taking a slot so that their latency does not skew the controller
+        if cache is not None:
+            llm.cache = _open_response_cache(cache)
+        return llm
+
+    # A list of models is loaded as a failover chain which tries them in order
+    if isinstance(model, (list, tuple)):
+        from .failover import FailoverChatModel
+
+        models = [
+            load(
+                name,
+                temperature,
+                api_key,
+                max_tokens,
+                client_cache=client_cache,
+                http_pool=http_pool,
+                endpoints=endpoints,
+                balance=balance,
+                rate_limit=rate_limit,
+                metrics=metrics,
+                **kwargs,
+            )
+            for name in model
+        ]
+        llm = FailoverChatModel(models=models)
+        if cache is not None:
+            llm.cache = _open_response_cache(cache)
+        return llm
+
+    # Several endpoints or API keys for one model are loaded as a model which balances the calls across them
+    if endpoints:
+        llm = _load_balanced(
+            model,
+            endpoints,
+            balance,
+            temperature=temperature,
+            api_key=api_key,
+            max_tokens=max_tokens,
+            client_cache=client_cache,
+            http_pool=http_pool,
+            rate_limit=rate_limit,
+            metrics=metrics,
+            **kwargs,
+        )
+        if cache is not None:
+            llm.cache = _open_response_cache(cache)
+        return llm
+
     # If the model isn't a string, then assume it can work as an LLM
     # This is useful for when the model is already loaded and for testing mock LLMs
     if not isinstance(model, str):
         return model
 
+    # Reuse a previously constructed client with the same configuration if requested
+    # an empty ClientCache is falsy so it is checked by type
+    if client_cache is True or isinstance(client_cache, ClientCache):
+        clients = default_client_cache if client_cache is True else client_cache
+        options = dict(cache=cache, http_pool=http_pool, rate_limit=rate_limit, metrics=metrics)
+        options = {name: value for name, value in options.items() if value}
+        key = clients.make_key(model, temperature, api_key, max_tokens, dict(kwargs, **options))
+        return clients.get_or_create(
+            key,
+            lambda: load(
+                model=model, temperature=temperature, api_key=api_key, max_tokens=max_tokens, **options, **kwargs
+            ),
+        )
+
     errors = []
+    endpoint = kwargs.get("endpoint", "") or os.getenv("CUSTOM_ENDPOINT", "")
 
-    for loader in loaders:
+    for loader in default_registry.candidates(model, endpoint=endpoint):
+        loader_kwargs = kwargs
+        if http_pool and loader.supports_http_client and "http_client" not in kwargs:
+            pool = default_http_pool if http_pool is True else http_pool
+            loader_kwargs = dict(kwargs, http_client=pool.client, http_async_client=pool.async_client)
         try:
-            llm = loader(model=model, api_key=api_key, temperature=temperature, max_tokens=max_tokens, **kwargs)
+            llm = loader(model=model, api_key=api_key, temperature=temperature, max_tokens=max_tokens, **loader_kwargs)
         except Exception as e:
             errors.append(e)
             continue
 
         if llm is not None:
+            if cache is not None:
+                llm.cache = _open_response_cache(cache)
+            if rate_limit is not None:
+                _attach_rate_limiter(llm, rate_limit, f"{model}@{endpoint}#{fingerprint(api_key)}")
+            if metrics:
+                _attach_metrics(llm, metrics, loader, model)
             return llm
 
     if not errors:
@@ -55,3 +235,128 @@ def load(
         )
 
     raise ValueError(error_message)
+
+
+def _load_balanced(model: str, endpoints: list[tuple], balance: str, api_key: str = "", **options) -> BaseChatModel:
+    """Loads a client of the model for each `(endpoint, api_key[, weight])` of `load(..., endpoints=...)`.
+
+    An empty endpoint uses the provider's default endpoint, or CUSTOM_ENDPOINT if it is set,
+    and an empty API key uses the `api_key` given to `load`.
+    """
+    from .balancer import BalancedChatModel
+
+    members, weights = [], []
+    for member in endpoints:
+        endpoint, member_api_key, weight = (
+            (*member, 1.0)[:3] if isinstance(member, (list, tuple)) else (member, "", 1.0)
+        )
+        # loaders store the endpoint in CUSTOM_ENDPOINT, which must not leak into the next member
+        custom_endpoint = os.environ.get("CUSTOM_ENDPOINT")
+        try:
+            endpoint_options = dict(endpoint=endpoint) if endpoint else {}
+            members.append(load(model, api_key=member_api_key or api_key, **endpoint_options, **options))
+        finally:
+            if custom_endpoint is None:
+                os.environ.pop("CUSTOM_ENDPOINT", None)
+            else:
+                os.environ["CUSTOM_ENDPOINT"] = custom_endpoint
+        weights.append(float(weight))
+
+    return BalancedChatModel(members=members, weights=weights, strategy=balance)
+
+
+def _attach_rate_limiter(llm: BaseChatModel, rate_limit: RateLimiter | dict, name: str) -> None:
+    """Sets the rate limiter of `load(..., rate_limit=...)` on a model and settles its token usage after each call.
+
+    A dictionary of `RateLimiter` arguments creates a limiter named after the model, endpoint and API key,
+    so that every process loading the same model with the same key shares its budget.
+    """
+    from .rate_limit import RateLimitCallback, RateLimiter
+
+    limiter = rate_limit if isinstance(rate_limit, RateLimiter) else RateLimiter(**{"name": name, **rate_limit})
+    llm.rate_limiter = limiter
+    llm.callbacks = [*(llm.callbacks or []), RateLimitCallback(limiter)]
+
+
+def _attach_metrics(llm: BaseChatModel, metrics: bool | Metrics, loader: Loader, model: str) -> None:
+    """Adds a callback which records the calls of a model from `load(..., metrics=...)`, labeled by loader and model.
+
+    With `metrics=True` the calls are recorded in `llmloader.metrics.default_metrics`.
+    """
+    from .metrics import Metrics, MetricsCallback, default_metrics
+
+    provider = type(loader).__name__.removesuffix("Loader").lower()
+    callback = MetricsCallback(metrics if isinstance(metrics, Metrics) else default_metrics, provider, model)
+    llm.callbacks = [*(llm.callbacks or []), callback]
+
+
+def _open_response_cache(cache: str | Path | BaseCache) -> BaseCache:
+    """Returns the response cache for `load(..., cache=...)`: a path opens a `ResponseCache` in that file.
+
+    Loads with the same path share one `ResponseCache` so that its hit and miss counts cover all of them.
+    """
+    from langchain_core.caches import BaseCache
+
+    if isinstance(cache, BaseCache):
+        return cache
+
+    from pathlib import Path
+
+    from .response_cache import ResponseCache
+
+    path = str(Path(cache).expanduser().resolve())
+    with _response_caches_lock:
+        if path not in _response_caches:
+            _response_caches[path] = ResponseCache(path)
+        return _response_caches[path]
+
+
+def resolve(model: str, endpoint: str = "") -> Loader | None:
+    """Returns the loader that `load` would try first for a model name, without constructing the model."""
+    return default_registry.resolve(model, endpoint=endpoint)
+
+
+def register(loader: Loader | type[Loader]) -> Loader:
+    """Registers a custom loader so that `load` can use it for the model name prefixes it declares."""
+    return default_registry.register(loader)
+
+
+def unload(model_name: str | None = None) -> int:
+    """Frees the shared weights of locally loaded Hugging Face models.
+
+    Args:
+        model_name: The model to unload. If None then all local models are unloaded.
+
+    Returns:
+        The number of sets of weights removed.
+    """
+    from .weights import default_weight_registry
+
+    return default_weight_registry.unload(model_name)
+
+
+def set_weight_budget(memory_budget: int | None) -> None:
+    """Sets the number of bytes of unused local model weights to keep for reuse after their models are deleted.
+
+    Args:
+        memory_budget: The number of bytes. If 0 (the default) then the weights are freed with the last model
+            using them, and if None then they are kept until `unload` is called.
+    """
+    from .weights import default_weight_registry
+
+    default_weight_registry.set_memory_budget(memory_budget)
+
+
+def clear_cache() -> None:
+    """Removes all clients from the default client cache used by `load(..., client_cache=True)`."""
+    default_client_cache.clear()
+
+
+def http_pool_info() -> HttpPoolInfo:
+    """Returns the connection reuse statistics of the default HTTP pool used by `load(..., http_pool=True)`."""
+    return default_http_pool.info()
+
+
+def cache_info() -> CacheInfo:
+    """Returns the statistics of the default client cache used by `load(..., client_cache=True)`."""
+    return default_client_cache.info()
@@ -1,19 +1,26 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class AnthropicLoader(Loader):
+    prefixes = ('claude',)
+
     def __call__(
         self,
         model: str,
         temperature: float | None = None,
         api_key: str | None = None,
         max_tokens: int | None = None,
-        **kwargs
+        **kwargs,
     ) -> BaseChatModel | None:
 
-        if not model.startswith('claude'):
+        if not model.startswith(self.prefixes):
             return None
 
         if self.has_endpoint(kwargs=kwargs):
@@ -1,9 +1,20 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class AzureAILoader(Loader):
+    uses_endpoint = True
+    supports_http_client = True
+
+    def accepts(self, model: str) -> bool:
+        return "/" not in model
+
     def __call__(
         self,
         model: str,
@@ -13,7 +24,7 @@ class AzureAILoader(Loader):
         **kwargs,
     ) -> BaseChatModel | None:
 
-        if "/" in model:
+        if not self.accepts(model):
             return None
 
         endpoint = self.has_endpoint(kwargs=kwargs)
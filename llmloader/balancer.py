@@ -0,0 +1,293 @@
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from typing import Any, Literal, NamedTuple
+
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+from .errors import is_rate_limit, retry_after
+from .failover import provider_name
+
+
+class MemberInfo(NamedTuple):
+    endpoint: str
+    weight: float
+    requests: int
+    outstanding: int
+    rate_limited: int
+    cooling_for: float
+
+
+class BalancedChatModel(BaseChatModel):
+    """A chat model which spreads calls across several clients of the same model, e.g. one per endpoint and API key.
+
+    Each call goes to the member with the fewest requests in flight ("least_outstanding") or to the members in turn
+    in proportion to their weights ("weighted_round_robin"). A member which reports a rate limit is taken out of
+    rotation for its Retry-After, or `cooldown` seconds, and the call is retried on another member.
+    When every member is cooling down, the call waits for the first to return, up to `max_wait` seconds.
+
+    The member which answered is recorded in the `response_metadata` of the message as
+    `{"balancer": {"member": ..., "endpoint": ...}}`.
+    """
+
+    members: list[BaseChatModel]
+    """The clients to spread the calls across."""
+    weights: list[float] = Field(default_factory=list)
+    """The relative share of the calls of each member for "weighted_round_robin". If empty, all are equal."""
+    strategy: Literal["least_outstanding", "weighted_round_robin"] = "least_outstanding"
+    cooldown: float = 10.0
+    """The number of seconds a rate limited member is out of rotation if the provider gives no Retry-After."""
+    max_wait: float = 60.0
+    """The longest a call waits for a member when all of them are cooling down."""
+    clock: Callable[[], float] = time.monotonic
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _endpoints: list[str] = PrivateAttr(default_factory=list)
+    _requests: list[int] = PrivateAttr(default_factory=list)
+    _outstanding: list[int] = PrivateAttr(default_factory=list)
+    _rate_limited: list[int] = PrivateAttr(default_factory=list)
+    _available_at: list[float] = PrivateAttr(default_factory=list)
+    _current: list[float] = PrivateAttr(default_factory=list)
+
+    def model_post_init(self, __context: Any) -> None:
+        if not self.members:
+            raise ValueError("A balanced model needs at least one member")
+        if not self.weights:
+            self.weights = [1.0] * len(self.members)
+        if len(self.weights) != len(self.members) or min(self.weights) <= 0:
+            raise ValueError("Give one positive weight for each member")
+        count = len(self.members)
+        self._endpoints = [provider_name(member) for member in self.members]
+        self._requests = [0] * count
+        self._outstanding = [0] * count
+        self._rate_limited = [0] * count
+        self._available_at = [0.0] * count
+        self._current = [0.0] * count
+
+    @property
+    def _llm_type(self) -> str:
+        return "balanced"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        # every member serves the same model, so responses do not depend on which one answers
+        return {"members": self.members[0]._identifying_params}
+
+    def info(self) -> list[MemberInfo]:
+        """Returns the number of requests, the requests in flight and the rate limits of each member."""
+        now = self.clock()
+        with self._lock:
+            return [
+                MemberInfo(
+                    self._endpoints[i],
+                    self.weights[i],
+                    self._requests[i],
+                    self._outstanding[i],
+                    self._rate_limited[i],
+                    max(self._available_at[i] - now, 0.0),
+                )
+                for i in range(len(self.members))
+            ]
+
+    def _acquire(self) -> tuple[int | None, float]:
+        """Picks a member and counts the request as in flight.
+
+        Returns:
+            tuple: The index of the member, or None and the number of seconds until a member is available.
+        """
+        now = self.clock()
+        with self._lock:
+            available = [i for i, available_at in enumerate(self._available_at) if available_at <= now]
+            if not available:
+                return None, min(self._available_at) - now
+
+            if self.strategy == "least_outstanding":
+                # ties go to the member with the fewest requests so far, weighted, so that idle members take turns
+                index = min(available, key=lambda i: (self._outstanding[i] / self.weights[i], self._requests[i]))
+            else:
+                # smooth weighted round robin: the members are interleaved rather than served in bursts
+                total = sum(self.weights[i] for i in available)
+                for i in available:
+                    self._current[i] += self.weights[i]
+                index = max(available, key=lambda i: self._current[i])
+                self._current[index] -= total
+
+            self._requests[index] += 1
+            self._outstanding[index] += 1
+            return index, 0.0
+
+    def _release(self, index: int, error: BaseException | None = None) -> bool:
+        """Ends a request and returns whether it failed with a rate limit and should be retried on another member."""
+        with self._lock:
+            self._outstanding[index] -= 1
+            if error is None or not is_rate_limit(error):
+                return False
+            delay = retry_after(error)
+            self._rate_limited[index] += 1
+            self._available_at[index] = self.clock() + (self.cooldown if delay is None else delay)
+            return True
+
+    def _retry(self, index: int, error: Exception, retries: int) -> bool:
+        """Ends a failed request and returns whether to retry it: rate limited calls are retried up to twice per member."""
+        return self._release(index, error) and retries < 2 * len(self.members)
+
+    def _wait_time(self, wait: float, error: BaseException | None) -> float:
+        if wait > self.max_wait:
+            if error is not None:
+                raise error
+            raise TimeoutError(f"Every member is rate limited for at least {wait:.1f} more seconds")
+        return wait
+
+    def _metadata(self, index: int) -> dict:
+        return {"balancer": {"member": index, "endpoint": self._endpoints[index]}}
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        error, retries = None, 0
+        while True:
+            index, wait = self._acquire()
+            if index is None:
+                time.sleep(self._wait_time(wait, error))
+                continue
+            try:
+                message = self.members[index].invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._retry(index, e, retries):
+                    raise
+                error, retries = e, retries + 1
+                continue
+            except BaseException:
+                # cancelled or interrupted: the member must not stay counted as busy
+                self._release(index)
+                raise
+            self._release(index)
+            message.response_metadata.update(self._metadata(index))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        error, retries = None, 0
+        while True:
+            index, wait = self._acquire()
+            if index is None:
+                await asyncio.sleep(self._wait_time(wait, error))
+                continue
+            try:
+                message = await self.members[index].ainvoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._retry(index, e, retries):
+                    raise
+                error, retries = e, retries + 1
+                continue
+            except BaseException:
+                # cancelled or interrupted: the member must not stay counted as busy
+                self._release(index)
+                raise
+            self._release(index)
+            message.response_metadata.update(self._metadata(index))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        error, retries = None, 0
+        while True:
+            index, wait = self._acquire()
+            if index is None:
+                time.sleep(self._wait_time(wait, error))
+                continue
+            try:
+                stream = self.members[index].stream(messages, stop=stop, **kwargs)
+                first = next(stream, None)
+            except Exception as e:
+                if not self._retry(index, e, retries):
+                    raise
+                error, retries = e, retries + 1
+                continue
+            except BaseException:
+                # cancelled or interrupted: the member must not stay counted as busy
+                self._release(index)
+                raise
+            # the request stays in flight until the stream is consumed
+            try:
+                if first is None:
+                    return
+                first.response_metadata.update(self._metadata(index))
+                yield self._chunk(first, run_manager)
+                for chunk in stream:
+                    yield self._chunk(chunk, run_manager)
+            finally:
+                self._release(index)
+            return
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        error, retries = None, 0
+        while True:
+            index, wait = self._acquire()
+            if index is None:
+                await asyncio.sleep(self._wait_time(wait, error))
+                continue
+            try:
+                stream = self.members[index].astream(messages, stop=stop, **kwargs)
+                first = await anext(stream, None)
+            except Exception as e:
+                if not self._retry(index, e, retries):
+                    raise
+                error, retries = e, retries + 1
+                continue
+            except BaseException:
+                # cancelled or interrupted: the member must not stay counted as busy
+                self._release(index)
+                raise
+            try:
+                if first is None:
+                    return
+                first.response_metadata.update(self._metadata(index))
+                yield await self._achunk(first, run_manager)
+                async for chunk in stream:
+                    yield await self._achunk(chunk, run_manager)
+            finally:
+                self._release(index)
+            return
+
+    @staticmethod
+    def _chunk(chunk, run_manager: CallbackManagerForLLMRun | None) -> ChatGenerationChunk:
+        generation = ChatGenerationChunk(message=chunk)
+        if run_manager:
+            run_manager.on_llm_new_token(generation.text, chunk=generation)
+        return generation
+
+    @staticmethod
+    async def _achunk(chunk, run_manager: AsyncCallbackManagerForLLMRun | None) -> ChatGenerationChunk:
+        generation = ChatGenerationChunk(message=chunk)
+        if run_manager:
+            await run_manager.on_llm_new_token(generation.text, chunk=generation)
+        return generation
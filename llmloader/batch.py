@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseLanguageModel
+
+    from .concurrency import AdaptiveConcurrency
+
+# The number of times a rate limited prompt is tried again when the concurrency adapts to rate limits
+RATE_LIMIT_RETRIES = 3
+
+
+class BatchSummary(NamedTuple):
+    completed: int
+    failed: int
+    skipped: int
+
+
+def read_prompts(path: Path | str) -> Iterator[tuple[str, str]]:
+    """Reads (id, prompt) pairs from a JSON Lines file.
+
+    Each line is either a JSON string with the prompt or an object with a "prompt" key and an optional "id" key.
+    Without an id, the line number (starting at 1) is used. Blank lines are ignored.
+
+    Raises:
+        ValueError: If a line is not JSON, has no prompt or repeats an id.
+    """
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number} of {path} is not valid JSON: {e}") from e
+            if isinstance(item, str):
+                item = dict(prompt=item)
+            if not isinstance(item, dict) or "prompt" not in item:
+                raise ValueError(f"Line {line_number} of {path} has no prompt")
+
+            prompt_id = str(item.get("id", line_number))
+            if prompt_id in seen:
+                raise ValueError(f"Line {line_number} of {path} repeats the id '{prompt_id}'")
+            seen.add(prompt_id)
+            yield prompt_id, item["prompt"]
+
+
+def validate_prompts(path: Path | str) -> int:
+    """Reads a whole JSON Lines file of prompts without keeping them and returns the number of prompts.
+
+    Raises:
+        ValueError: If a line is not JSON, has no prompt or repeats an id. See `read_prompts`.
+    """
+    return sum(1 for _ in read_prompts(path))
+
+
+def completed_ids(path: Path | str) -> set[str]:
+    """Returns the ids of the prompts with a response in a results file written by `run_batch`.
+
+    Prompts which failed are not included so that they are tried again.
+    A truncated last line, e.g. from a crash while writing, is ignored.
+    """
+    path = Path(path)
+    if not path.exists():
+        return set()
+
+    ids = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(result, dict) and "response" in result:
+                ids.add(str(result["id"]))
+    return ids
+
+
+def _end_last_line(path: Path | str) -> None:
+    """Ends a results file with a newline if a crash cut off its last line, so the next result starts on its own line."""
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, 2)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+async def arun_batch(
+    llm: BaseLanguageModel,
+    input: Path | str,
+    output: Path | str,
+    concurrency: int | AdaptiveConcurrency = 8,
+    count: bool = False,
+) -> BatchSummary:
+    """Runs every prompt in a JSON Lines file through a model and appends the results to another JSON Lines file.
+
+    Up to `concurrency` prompts are in flight at once. With an `AdaptiveConcurrency` controller, the number in flight
+    follows its limit instead, and a prompt which hits a rate limit is tried again up to `RATE_LIMIT_RETRIES` times
+    after the controller has backed off. Each result is written and flushed as soon as it arrives
+    as a line with the "id" of the prompt and its "response", or its "error" if the call failed.
+    Prompts which already have a response in the output file are skipped, so an interrupted run can be restarted
+    with the same arguments to pick up where it stopped. The input is checked in full before any prompt is sent.
+
+    Args:
+        llm: The model.
+        input: The JSON Lines file of prompts. See `read_prompts`.
+        output: The JSON Lines file to append the results to.
+        concurrency: The maximum number of prompts to run at once, or a controller which adapts it.
+        count: Whether to add the token usage of each response to its result.
+
+    Returns:
+        BatchSummary: The number of prompts completed, failed and skipped.
+
+    Raises:
+        ValueError: If the input file is invalid. See `read_prompts`.
+    """
+    from langchain_core.output_parsers import StrOutputParser
+
+    from .concurrency import AdaptiveConcurrency
+    from .errors import is_rate_limit
+
+    parser = StrOutputParser()
+    controller = concurrency if isinstance(concurrency, AdaptiveConcurrency) else None
+    # the prompts are read lazily while running, so a bad line must fail here rather than halfway through the run
+    validate_prompts(input)
+    done = completed_ids(output)
+    _end_last_line(output)
+    prompts = read_prompts(input)
+    completed = failed = skipped = 0
+
+    def pending() -> Iterator[tuple[str, str]]:
+        nonlocal skipped
+        for prompt_id, prompt in prompts:
+            if prompt_id in done:
+                skipped += 1
+                continue
+            yield prompt_id, prompt
+
+    queue = pending()
+
+    with open(output, "a", encoding="utf-8") as f:
+
+        def write(result: dict) -> None:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+
+        async def invoke(prompt: str):
+            if controller is None:
+                return await llm.ainvoke(prompt)
+            for retry in range(RATE_LIMIT_RETRIES + 1):
+                try:
+                    async with controller.aslot():
+                        return await llm.ainvoke(prompt)
+                except Exception as e:
+                    if retry == RATE_LIMIT_RETRIES or not is_rate_limit(e):
+                        raise
+
+        async def worker() -> None:
+            nonlocal completed, failed
+            # the workers share one iterator so that the prompts are read lazily
+            for prompt_id, prompt in queue:
+                try:
+                    response = await invoke(prompt)
+                except Exception as e:
+                    failed += 1
+                    write(dict(id=prompt_id, error=f"{type(e).__name__}: {e}"))
+                    continue
+
+                result = dict(id=prompt_id, response=parser.invoke(response))
+                if count:
+                    from llmloader.wrappers import LLMWrapper
+
+                    result["usage"] = LLMWrapper.get_token_count(getattr(response, "response_metadata", {}))
+                completed += 1
+                write(result)
+
+        # with a controller there is a worker for each slot it can open and the idle ones wait for a slot
+        workers = controller.max_limit if controller is not None else max(concurrency, 1)
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+    return BatchSummary(completed, failed, skipped)
+
+
+def run_batch(
+    llm: BaseLanguageModel,
+    input: Path | str,
+    output: Path | str,
+    concurrency: int | AdaptiveConcurrency = 8,
+    count: bool = False,
+) -> BatchSummary:
+    """Runs every prompt in a JSON Lines file through a model. See `arun_batch`."""
+    return asyncio.run(arun_batch(llm, input, output, concurrency=concurrency, count=count))
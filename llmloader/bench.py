@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import random
+import struct
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseLanguageModel
+
+PERCENTILES = (50, 95, 99)
+
+
+class Sample(NamedTuple):
+    latency: float
+    ttft: float
+    output_tokens: int
+    stream: bool
+    error: str | None = None
+    rate_limited: bool = False
+
+
+class RequestMix(NamedTuple):
+    """The requests a benchmark sends, each drawn at random.
+
+    Args:
+        prompt_tokens: The approximate prompt sizes in tokens to choose from.
+        image_fraction: The fraction of requests with an image.
+        image_size: The width and height of the images in pixels.
+        stream_fraction: The fraction of requests which stream the response.
+    """
+
+    prompt_tokens: tuple[int, ...] = (100,)
+    image_fraction: float = 0.0
+    image_size: int = 512
+    stream_fraction: float = 0.0
+
+
+def noise_png(size: int, seed: int = 0) -> bytes:
+    """Returns a square PNG of random pixels, which do not compress, so the payload is as large as a photo of its size."""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+
+def output_tokens(result) -> int:
+    """Returns the number of output tokens reported for a response, or 0 if they are not reported."""
+    if not hasattr(result, "response_metadata"):
+        return 0
+
+    from .wrappers import LLMWrapper
+
+    tokens = LLMWrapper.get_token_count(result)["output_tokens"]
+    if not tokens and getattr(result, "usage_metadata", None):
+        # streamed responses often report the usage only in the standard LangChain field
+        tokens = result.usage_metadata.get("output_tokens", 0)
+    return tokens
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Returns the q-th percentile of the values with linear interpolation, or None if there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class LoadGenerator:
+    """Sends a mix of requests to a model at a target concurrency or request rate for a fixed duration.
+
+    Args:
+        llm: The model.
+        mix: The requests to send.
+        seed: The seed of the random choice of each request, so runs send the same requests.
+    """
+
+    def __init__(self, llm: BaseLanguageModel, mix: RequestMix = RequestMix(), seed: int = 0):
+        self.llm = llm
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.count = 0
+        self._image: dict | None = None
+
+    def image(self) -> dict:
+        if self._image is None:
+            from .wrappers import LLMWrapper
+
+            data = base64.b64encode(noise_png(self.mix.image_size)).decode("ascii")
+            self._image = LLMWrapper.format(self.llm, "image", dict(data=data, mime_type="image/png"))
+        return self._image
+
+    def request(self) -> tuple[Any, bool]:
+        """Returns the input and whether to stream for the next request."""
+        from langchain_core.messages import HumanMessage
+
+        self.count += 1
+        words = self.rng.choice(self.mix.prompt_tokens)
+        # a different start for each request so that provider prompt caches do not hide the prefill time
+        text = f"Request {self.count}. Reply with one short sentence about these words: " + " ".join(
+            self.rng.choice(("alpha", "bravo", "charlie", "delta", "echo", "foxtrot")) for _ in range(words)
+        )
+        stream = self.rng.random() < self.mix.stream_fraction
+        if self.rng.random() < self.mix.image_fraction:
+            return [HumanMessage(content=[dict(type="text", text=text), self.image()])], stream
+        return text, stream
+
+    async def call(self, input: Any, stream: bool) -> Sample:
+        from .errors import is_rate_limit
+
+        start = time.perf_counter()
+        first_token = None
+        try:
+            if stream:
+                result = None
+                async for chunk in self.llm.astream(input):
+                    if first_token is None and (chunk if isinstance(chunk, str) else chunk.content):
+                        first_token = time.perf_counter()
+                    result = chunk if result is None else result + chunk
+            else:
+                result = await self.llm.ainvoke(input)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            return Sample(latency, latency, 0, stream, f"{type(e).__name__}: {e}", is_rate_limit(e))
+        end = time.perf_counter()
+        return Sample(end - start, (first_token or end) - start, output_tokens(result), stream)
+
+    async def run(self, duration: float, concurrency: int = 1, rate: float | None = None) -> list[Sample]:
+        """Sends requests for `duration` seconds and returns a sample for each.
+
+        Args:
+            duration: The number of seconds to send requests for. Requests in flight at the end are awaited.
+            concurrency: The number of requests in flight, each sent as soon as the previous one finishes.
+            rate: The number of requests per second to send regardless of how long they take, instead of `concurrency`.
+        """
+        deadline = time.perf_counter() + duration
+        samples: list[Sample] = []
+
+        if rate is not None:
+            # an open loop, so that a slow model builds a queue as it would under real traffic
+            tasks = []
+            next_start = time.perf_counter()
+            while next_start < deadline:
+                await asyncio.sleep(max(next_start - time.perf_counter(), 0))
+                tasks.append(asyncio.ensure_future(self.call(*self.request())))
+                next_start += 1 / rate
+            return list(await asyncio.gather(*tasks))
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                samples.append(await self.call(*self.request()))
+
+        await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+        return samples
+
+
+def summarize(samples: list[Sample], duration: float) -> dict:
+    """Returns the throughput, latency and time to first token percentiles, token rate and error rates of a run."""
+    succeeded = [sample for sample in samples if sample.error is None]
+    streamed = [sample for sample in succeeded if sample.stream]
+    tokens = sum(sample.output_tokens for sample in succeeded)
+    decode = [
+        sample.output_tokens / (sample.latency - sample.ttft)
+        for sample in streamed
+        if sample.output_tokens and sample.latency > sample.ttft
+    ]
+    summary = dict(
+        requests=len(samples),
+        duration=duration,
+        requests_per_second=len(samples) / duration if duration else 0.0,
+        error_rate=(len(samples) - len(succeeded)) / len(samples) if samples else 0.0,
+        rate_limit_rate=sum(sample.rate_limited for sample in samples) / len(samples) if samples else 0.0,
+        output_tokens=tokens,
+        output_tokens_per_second=tokens / duration if duration else 0.0,
+        stream_tokens_per_second=percentile(decode, 50),
+    )
+    for q in PERCENTILES:
+        summary[f"latency_p{q}"] = percentile([sample.latency for sample in succeeded], q)
+    for q in PERCENTILES:
+        # only streams have a first token before the end of the response
+        summary[f"ttft_p{q}"] = percentile([sample.ttft for sample in streamed], q)
+    errors: dict[str, int] = {}
+    for sample in samples:
+        if sample.error is not None:
+            name = sample.error.split(":")[0]
+            errors[name] = errors.get(name, 0) + 1
+    summary["errors"] = errors
+    return summary
+
+
+def run_bench(
+    llm: BaseLanguageModel,
+    duration: float,
+    concurrency: int = 1,
+    rate: float | None = None,
+    mix: RequestMix = RequestMix(),
+    seed: int = 0,
+) -> dict:
+    """Sends a mix of requests to a model for a fixed duration and summarizes the results. See `LoadGenerator.run`."""
+    generator = LoadGenerator(llm, mix, seed=seed)
+    start = time.perf_counter()
+    samples = asyncio.run(generator.run(duration, concurrency=concurrency, rate=rate))
+    return summarize(samples, time.perf_counter() - start)
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    ttl: float | None
+
+
+def fingerprint(secret: str | None) -> str:
+    """Returns a short, non-reversible fingerprint of a secret so it can be used in a cache key."""
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:16]
+
+
+def freeze(value: Any) -> Any:
+    """Converts a value into something hashable so that it can be part of a cache key.
+
+    Dictionaries, lists, tuples and sets are converted recursively.
+    Objects which cannot be hashed are identified by their id.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(freeze(v)) for v in value))
+    try:
+        hash(value)
+    except TypeError:
+        return ("id", id(value))
+    return value
+
+
+class ClientCache:
+    """A thread-safe LRU cache of constructed chat clients with a time-to-live.
+
+    Args:
+        maxsize: The maximum number of clients to keep. The least recently used client is evicted first.
+        ttl: The number of seconds a client stays in the cache. If None then clients never expire.
+    """
+
+    def __init__(self, maxsize: int = 32, ttl: float | None = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._pending: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        model: str, temperature: float | None, api_key: str | None, max_tokens: int | None, kwargs: dict
+    ) -> tuple:
+        """Builds a normalized cache key for the arguments to `llmloader.load`.
+
+        The API key is stored as a fingerprint. If no API key is given, the fingerprint covers the
+        `*_API_KEY` environment variables so that changing the environment does not return a stale client.
+        """
+        endpoint = kwargs.get("endpoint", "") or os.getenv("CUSTOM_ENDPOINT", "")
+        if not api_key:
+            api_key = "\n".join(f"{k}={v}" for k, v in sorted(os.environ.items()) if k.endswith("_API_KEY"))
+        other_kwargs = {k: v for k, v in kwargs.items() if k != "endpoint"}
+        return (model, temperature, max_tokens, endpoint, fingerprint(api_key), freeze(other_kwargs))
+
+    def _lookup(self, key: tuple) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        created, client = entry
+        if self.ttl is not None and time.monotonic() - created > self.ttl:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, client
+
+    def get_or_create(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """Returns the cached client for `key` or builds it with `factory` and stores it.
+
+        Concurrent requests for the same missing key wait for a single construction.
+        """
+        with self._lock:
+            found, client = self._lookup(key)
+            if found:
+                self.hits += 1
+                return client
+            key_lock = self._pending.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                found, client = self._lookup(key)
+                if found:
+                    self.hits += 1
+                    return client
+                self.misses += 1
+
+            try:
+                client = factory()
+            except BaseException:
+                with self._lock:
+                    self._pending.pop(key, None)
+                raise
+
+            with self._lock:
+                self._pending.pop(key, None)
+                self._entries[key] = (time.monotonic(), client)
+                self._entries.move_to_end(key)
+                while len(self._entries) > max(self.maxsize, 0):
+                    self._entries.popitem(last=False)
+            return client
+
+    def clear(self) -> None:
+        """Removes all clients from the cache and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        """Returns the hit and miss statistics and the current size of the cache."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries), self.ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+default_client_cache = ClientCache()
@@ -0,0 +1,282 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, NamedTuple
+
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from .errors import is_rate_limit, retry_after
+
+
+class ConcurrencyInfo(NamedTuple):
+    limit: int
+    in_flight: int
+    successes: int
+    rate_limited: int
+    decreases: int
+    latency: float | None
+    paused_for: float
+
+
+class AdaptiveConcurrency:
+    """A limit on the number of calls in flight which adapts with additive increase, multiplicative decrease (AIMD).
+
+    Every successful call raises the limit by `increase / limit`, so the limit grows by about `increase` for each
+    round of calls. A rate limit error, or a call taking more than `latency_tolerance` times the usual latency,
+    multiplies the limit by `decrease`. The limit is cut at most once per usual latency, so that the many calls
+    which fail together in a burst of rate limits count as one signal. A Retry-After also pauses new calls for that long.
+
+    Use `slot` or `aslot` around each call, or wrap a model with `AdaptiveChatModel`. Thread and asyncio callers
+    can share one controller.
+
+    Args:
+        initial: The starting limit.
+        min_limit: The lowest limit.
+        max_limit: The highest limit.
+        increase: The amount the limit grows by for each round of successful calls.
+        decrease: The factor the limit is multiplied by on a rate limit or latency spike.
+        latency_tolerance: How many times the usual latency counts as a spike. If None then latency is ignored.
+        smoothing: The weight of each new latency in the moving average of the usual latency.
+        clock: The monotonic clock, replaceable for testing.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float | None = 2.0,
+        smoothing: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not 1 <= min_limit <= initial <= max_limit:
+            raise ValueError("The limits must satisfy 1 <= min_limit <= initial <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.clock = clock
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self.decreases = 0
+        self.latency: float | None = None
+        self.history: deque[tuple[float, float]] = deque([(clock(), float(initial))], maxlen=1000)
+        """The time and new value of each change of the limit, most recent last."""
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _take(self) -> float | None:
+        """Takes a slot if one is free. Returns 0 if taken, the seconds left of a pause, or None to wait for a slot."""
+        paused_for = self._paused_until - self.clock()
+        if paused_for > 0:
+            return paused_for
+        if self.in_flight >= int(self.limit):
+            return None
+        self.in_flight += 1
+        return 0
+
+    def acquire(self) -> None:
+        """Waits for a free slot and takes it."""
+        with self._condition:
+            while (wait := self._take()) != 0:
+                self._condition.wait(timeout=wait)
+
+    async def aacquire(self) -> None:
+        """Waits for a free slot without blocking the event loop and takes it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                wait = self._take()
+                if wait == 0:
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            try:
+                await asyncio.wait_for(future, timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, latency: float, error: BaseException | None = None) -> None:
+        """Frees a slot and adapts the limit to the outcome of the call.
+
+        Args:
+            latency: The number of seconds the call took.
+            error: The error raised by the call, if any. Only rate limits lower the limit.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = self.clock()
+            if error is not None:
+                if is_rate_limit(error):
+                    self.rate_limited += 1
+                    delay = retry_after(error)
+                    if delay:
+                        self._paused_until = max(self._paused_until, now + delay)
+                    self._cut(now)
+            elif (
+                self.latency_tolerance is not None
+                and self.latency is not None
+                and latency > self.latency_tolerance * self.latency
+            ):
+                # a spike is not averaged in, so that the usual latency does not drift up under overload
+                self._cut(now)
+            else:
+                self.successes += 1
+                self.latency = (
+                    latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+                )
+                self._set_limit(self.limit + self.increase / self.limit, now)
+            self._wake()
+
+    def _cut(self, now: float) -> None:
+        if now - self._last_decrease < (self.latency or 0.0):
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self._set_limit(self.limit * self.decrease, now)
+
+    def _set_limit(self, limit: float, now: float) -> None:
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if int(limit) != int(self.limit):
+            self.history.append((now, float(int(limit))))
+        self.limit = limit
+
+    def _wake(self) -> None:
+        self._condition.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Holds a slot for the duration of a call and adapts the limit to its outcome."""
+        self.acquire()
+        start = self.clock()
+        try:
+            yield
+        except BaseException as e:
+            self.release(self.clock() - start, e)
+            raise
+        self.release(self.clock() - start)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        """Holds a slot for the duration of an async call and adapts the limit to its outcome."""
+        await self.aacquire()
+        start = self.clock()
+        try:
+            yield
+        except BaseException as e:
+            self.release(self.clock() - start, e)
+            raise
+        self.release(self.clock() - start)
+
+    def info(self) -> ConcurrencyInfo:
+        """Returns the current limit, the calls in flight and the counts of successes, rate limits and decreases."""
+        with self._lock:
+            return ConcurrencyInfo(
+                int(self.limit),
+                self.in_flight,
+                self.successes,
+                self.rate_limited,
+                self.decreases,
+                self.latency,
+                max(self._paused_until - self.clock(), 0.0),
+            )
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveChatModel(BaseChatModel):
+    """A chat model which limits the calls in flight to another model with an `AdaptiveConcurrency` controller.
+
+    Use it for bulk calls, e.g. with `batch` or `abatch`, so that their concurrency follows what the provider
+    can take instead of a fixed `max_concurrency`.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    """The model to call."""
+    controller: AdaptiveConcurrency
+    """The controller of the calls in flight. It can be shared by several models with a common quota."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "adaptive"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return self.model._identifying_params
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        with self.controller.slot():
+            message = self.model.invoke(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with self.controller.aslot():
+            message = await self.model.ainvoke(messages, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        with self.controller.slot():
+            for chunk in self.model.stream(messages, stop=stop, **kwargs):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with self.controller.aslot():
+            async for chunk in self.model.astream(messages, stop=stop, **kwargs):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
@@ -1,41 +1,69 @@
-from collections.abc import Sequence
+from __future__ import annotations
 
-from langchain_core.language_models.llms import LLM
-from langchain_core.outputs import Generation, LLMResult
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.llms import LLM
 
-class DummyLLM(LLM):
-    """A dummy LLM that just returns the input prompt in .content."""
+    from .dummy_model import DummyChatModel
+
+# The parameters of "dummy?..." model names and their types
+DUMMY_PARAMETERS = {
+    "latency_ms": float,
+    "tps": float,
+    "error_rate": float,
+    "retry_after": float,
+    "output_tokens": int,
+    "seed": int,
+}
 
-    def _call(
-        self,
-        prompt: str,
-        stop: str | Sequence[str] | None = None,
-        run_manager=None,
-        **kwargs,
-    ) -> str:
-        # For backwards compatibility: return raw string
-        return prompt
 
-    @property
-    def _identifying_params(self) -> dict[str, str]:
-        return {}
+def __getattr__(name: str):
+    # DummyLLM lives in dummy_model so that langchain_core is only imported when it is needed
+    if name in ("DummyLLM", "DummyChatModel"):
+        from . import dummy_model
 
-    @property
-    def _llm_type(self) -> str:
-        return "dummy"
+        return getattr(dummy_model, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class DummyLoader(Loader):
+    """Loads "dummy", which echoes the prompt instantly, or a simulated chat model configured in the model name.
+
+    For example, "dummy?latency_ms=200&tps=50&error_rate=0.01" loads a `DummyChatModel` with 200 ms of prefill,
+    50 tokens per second and 1% simulated rate limits. See `DUMMY_PARAMETERS` for the parameters.
+    """
+
+    prefixes = ('dummy',)
+    uses_endpoint = None
+
+    def accepts(self, model: str) -> bool:
+        return model == 'dummy' or model.startswith('dummy?')
+
     def __call__(
         self,
         model: str,
         *args,
+        max_tokens: int | None = None,
         **kwargs,
-    ) -> LLM | None:
-        if not model == 'dummy':
+    ) -> LLM | DummyChatModel | None:
+        if not self.accepts(model):
             return None
 
-        return DummyLLM()
+        if model == 'dummy':
+            from .dummy_model import DummyLLM
+
+            return DummyLLM()
+
+        from urllib.parse import parse_qsl
+
+        from .dummy_model import DummyChatModel
+
+        parameters = {}
+        for name, value in parse_qsl(model.partition('?')[2], strict_parsing=False):
+            if name not in DUMMY_PARAMETERS:
+                raise ValueError(f"Unknown dummy model parameter '{name}'. Use any of: {', '.join(DUMMY_PARAMETERS)}")
+            parameters[name] = DUMMY_PARAMETERS[name](value)
+        return DummyChatModel(model_name=model, max_tokens=max_tokens, **parameters)
@@ -0,0 +1,192 @@
+import asyncio
+import random
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, NamedTuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+class DummyLLM(LLM):
+    """A dummy LLM that just returns the input prompt in .content."""
+
+    def _call(
+        self,
+        prompt: str,
+        stop: str | Sequence[str] | None = None,
+        run_manager=None,
+        **kwargs,
+    ) -> str:
+        # For backwards compatibility: return raw string
+        return prompt
+
+    @property
+    def _identifying_params(self) -> dict[str, str]:
+        return {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "dummy"
+
+
+def _sleep(seconds: float) -> None:
+    # even a sleep of 0 gives up the GIL, which costs more than the rest of a call without latency
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+class SimulatedResponse(NamedTuple):
+    status_code: int
+    headers: dict[str, str]
+
+
+class RateLimitError(Exception):
+    """A simulated 429 from `DummyChatModel`, with a Retry-After header like the provider SDKs' errors."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Simulated rate limit")
+        self.status_code = 429
+        self.response = SimulatedResponse(429, {"retry-after": f"{retry_after:g}"})
+
+
+class DummyChatModel(BaseChatModel):
+    """A chat model which simulates a provider's timing, usage reporting and rate limits without network access.
+
+    It answers after `latency_ms` of prefill and then produces `tps` tokens per second, counting each word as a token.
+    The response echoes the last message, or is `output_tokens` words long if that is set. A fraction `error_rate`
+    of calls fail with a simulated 429. The usage is reported in `response_metadata["token_usage"]`, as read by
+    `LLMWrapper.get_token_count`, and in `usage_metadata`.
+
+    Load it with `llmloader.load("dummy?latency_ms=200&tps=50&error_rate=0.01")`.
+    """
+
+    model_name: str = "dummy"
+    """The name of the simulated model, which is the model name it was loaded with."""
+    latency_ms: float = 0.0
+    """The number of milliseconds before the first token."""
+    tps: float = 0.0
+    """The number of output tokens per second after the first. If 0, the whole response arrives at once."""
+    error_rate: float = 0.0
+    """The fraction of calls which fail with a simulated 429."""
+    retry_after: float = 1.0
+    """The number of seconds in the Retry-After header of the simulated 429s."""
+    output_tokens: int = 0
+    """The number of tokens in each response. If 0, the last message is echoed."""
+    max_tokens: int | None = None
+    """The most tokens in a response."""
+    seed: int | None = None
+    """The seed of the simulated errors, for reproducible runs."""
+
+    _random: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "dummy-chat"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return dict(
+            latency_ms=self.latency_ms,
+            tps=self.tps,
+            error_rate=self.error_rate,
+            output_tokens=self.output_tokens,
+            max_tokens=self.max_tokens,
+        )
+
+    def _respond(self, messages: list[BaseMessage]) -> tuple[list[str], dict]:
+        """Returns the words of the response and the token usage, or raises a simulated rate limit."""
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise RateLimitError(self.retry_after)
+
+        input_tokens = sum(len(message.text.split()) for message in messages)
+        if self.output_tokens:
+            words = [f"token{i}" for i in range(self.output_tokens)]
+        else:
+            words = messages[-1].text.split() if messages else []
+        if self.max_tokens is not None:
+            words = words[: self.max_tokens]
+        usage = dict(input_tokens=input_tokens, output_tokens=len(words), total_tokens=input_tokens + len(words))
+        return words, usage
+
+    def _message(self, words: list[str], usage: dict) -> AIMessage:
+        return AIMessage(
+            content=" ".join(words),
+            response_metadata=dict(model_name="dummy", token_usage=usage),
+            usage_metadata=usage,
+        )
+
+    def _chunks(self, words: list[str], usage: dict) -> Iterator[ChatGenerationChunk]:
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+        # the usage comes with a final empty chunk, as providers report it at the end of a stream
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", response_metadata=dict(model_name="dummy", token_usage=usage), usage_metadata=usage
+            )
+        )
+
+    def _decode_time(self, words: list[str]) -> float:
+        return max(len(words) - 1, 0) / self.tps if self.tps else 0.0
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        _sleep(self.latency_ms / 1000)
+        words, usage = self._respond(messages)
+        _sleep(self._decode_time(words))
+        return ChatResult(generations=[ChatGeneration(message=self._message(words, usage))])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency_ms / 1000)
+        words, usage = self._respond(messages)
+        await asyncio.sleep(self._decode_time(words))
+        return ChatResult(generations=[ChatGeneration(message=self._message(words, usage))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        _sleep(self.latency_ms / 1000)
+        words, usage = self._respond(messages)
+        for i, chunk in enumerate(self._chunks(words, usage)):
+            if 0 < i < len(words) and self.tps:
+                time.sleep(1 / self.tps)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        words, usage = self._respond(messages)
+        for i, chunk in enumerate(self._chunks(words, usage)):
+            if 0 < i < len(words) and self.tps:
+                await asyncio.sleep(1 / self.tps)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,56 @@
+import time
+from email.utils import parsedate_to_datetime
+
+# Errors with these status codes are caused by the request itself, so another provider would reject it too
+REQUEST_ERROR_STATUS = (400, 413, 422)
+# 529 is Anthropic's "overloaded" status
+RATE_LIMIT_STATUS = (429, 529)
+
+
+def status_code(error: BaseException) -> int | None:
+    """Returns the HTTP status code of an error raised by a provider SDK, or None if it has none.
+
+    Each SDK has its own exception classes, so errors are classified by their status code without importing the SDKs.
+    """
+    for candidate in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "status", "code"):
+            value = getattr(candidate, attribute, None)
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+    return None
+
+
+def _headers(error: BaseException):
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None) or {}
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    """Returns whether an error reports that the provider is rate limiting or overloaded."""
+    if status_code(error) in RATE_LIMIT_STATUS:
+        return True
+    name = type(error).__name__
+    return name in ("RateLimitError", "ResourceExhausted", "OverloadedError")
+
+
+def is_request_error(error: BaseException) -> bool:
+    """Returns whether an error is caused by the request, e.g. an invalid parameter, rather than by the provider."""
+    return status_code(error) in REQUEST_ERROR_STATUS
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Returns the number of seconds the provider asks to wait before retrying, from the Retry-After headers."""
+    headers = _headers(error)
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(float(value) / 1000, 0.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (AttributeError, TypeError, ValueError):
+        return None
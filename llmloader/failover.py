@@ -0,0 +1,379 @@
+import itertools
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from typing import Any, NamedTuple
+from urllib.parse import urlparse
+
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
+from pydantic import PrivateAttr
+
+from .errors import is_rate_limit, is_request_error, retry_after
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BreakerInfo(NamedTuple):
+    state: str
+    failures: int
+    opened: int
+    retry_in: float
+
+
+class CircuitBreaker:
+    """A thread-safe circuit breaker which stops calls to a provider after repeated failures.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls are refused for `recovery_time` seconds.
+    Then it is half open: a single call is let through as a probe. If the probe succeeds the breaker closes,
+    otherwise it opens again.
+
+    Args:
+        failure_threshold: The number of consecutive failures which opens the breaker.
+        recovery_time: The number of seconds the breaker stays open before a probe is allowed.
+        clock: The monotonic clock, replaceable for testing.
+    """
+
+    def __init__(
+        self, failure_threshold: int = 3, recovery_time: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.clock = clock
+        self.failures = 0
+        self.opened = 0
+        self._state = CLOSED
+        self._open_until = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """The state of the breaker: "closed", "open" or "half_open"."""
+        with self._lock:
+            if self._state == OPEN and self.clock() >= self._open_until:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Returns whether a call may be made now. When half open, only the first caller is allowed as the probe.
+
+        A probe which never reports its result, e.g. because it was cancelled, is replaced after `recovery_time`.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = self.clock()
+            if self._state == OPEN:
+                if now < self._open_until:
+                    return False
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._probing and now - self._probe_started < self.recovery_time:
+                return False
+            self._probing = True
+            self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        """Closes the breaker and resets the failure count."""
+        with self._lock:
+            self.failures = 0
+            self._state = CLOSED
+            self._probing = False
+
+    def record_failure(self, open_for: float | None = None) -> None:
+        """Counts a failure, opening the breaker when the threshold is reached or a probe fails.
+
+        Args:
+            open_for: If given, the breaker opens at once for this many seconds instead of `recovery_time`,
+                e.g. the Retry-After of a rate limit.
+        """
+        with self._lock:
+            self.failures += 1
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold or open_for is not None:
+                self._state = OPEN
+                self._open_until = self.clock() + (self.recovery_time if open_for is None else open_for)
+                self._probing = False
+                self.opened += 1
+
+    def info(self) -> BreakerInfo:
+        """Returns the state, the consecutive failures, how often the breaker opened and the seconds until a probe."""
+        state = self.state
+        with self._lock:
+            retry_in = max(self._open_until - self.clock(), 0.0) if state == OPEN else 0.0
+            return BreakerInfo(state, self.failures, self.opened, retry_in)
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, model: str | None = None) -> CircuitBreaker:
+    """Returns the circuit breaker of a provider, or of one of its models, shared by every failover chain.
+
+    The breaker of a model is stored as "provider/model".
+    """
+    key = provider if model is None else f"{provider}/{model}"
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker()
+        return _breakers[key]
+
+
+def breaker_info() -> dict[str, BreakerInfo]:
+    """Returns the state of the circuit breaker of each provider and rate limited model used so far."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {provider: breaker.info() for provider, breaker in breakers.items()}
+
+
+def reset_breakers() -> None:
+    """Forgets the state of all providers' circuit breakers."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def model_name(llm: BaseChatModel) -> str:
+    """Returns the name of the model a chat model calls."""
+    for attribute in ("model_name", "model", "model_id"):
+        value = getattr(llm, attribute, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(llm).__name__
+
+
+def provider_name(llm: BaseChatModel) -> str:
+    """Returns the provider a chat model calls: the host of its API, or its LangChain type if it has no URL."""
+    for attribute in ("openai_api_base", "xai_api_base", "anthropic_api_url", "base_url", "endpoint"):
+        url = getattr(llm, attribute, None)
+        if isinstance(url, str) and url:
+            return urlparse(url).netloc or url
+    try:
+        return llm._llm_type
+    except Exception:
+        return type(llm).__name__
+
+
+class FailoverError(Exception):
+    """Raised when every model of a failover chain failed or was skipped because its breaker is open.
+
+    Attributes:
+        errors: The error of each model that was tried, by model name.
+        skipped: The names of the models that were skipped.
+    """
+
+    def __init__(self, errors: dict[str, BaseException], skipped: list[str]):
+        self.errors = errors
+        self.skipped = skipped
+        lines = [f"{name}: {type(error).__name__}: {error}" for name, error in errors.items()]
+        lines += [f"{name}: skipped, its circuit breaker is open" for name in skipped]
+        super().__init__("All models of the failover chain failed.\n" + "\n".join(lines))
+
+
+class FailoverChatModel(BaseChatModel):
+    """A chat model which calls a list of models in order, falling over to the next one when a call fails.
+
+    Each provider has a `CircuitBreaker` shared by all chains in the process. Models whose provider has failed
+    repeatedly are skipped at once instead of waiting for another timeout, until a probe call succeeds.
+    Rate limits only trip the breaker of the model which was limited, since providers limit each model separately,
+    and a Retry-After opens it at once for that long. Errors caused by the request itself, such as an invalid
+    parameter (HTTP 400, 413 and 422), are raised without falling over.
+
+    The model which answered is recorded in the `response_metadata` of the message as
+    `{"failover": {"model": ..., "provider": ..., "index": ...}}`, where index is its position in the chain.
+    Streams fall over only until the first chunk is received.
+    """
+
+    models: list[BaseChatModel]
+    """The models to call, in order of preference."""
+
+    _names: list[str] = PrivateAttr(default_factory=list)
+    _providers: list[str] = PrivateAttr(default_factory=list)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._names = [model_name(model) for model in self.models]
+        self._providers = [provider_name(model) for model in self.models]
+
+    @property
+    def _llm_type(self) -> str:
+        return "failover"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"models": [f"{provider}/{name}" for provider, name in zip(self._providers, self._names)]}
+
+    @property
+    def breakers(self) -> list[CircuitBreaker]:
+        """The circuit breaker of each model's provider."""
+        return [get_breaker(provider) for provider in self._providers]
+
+    def _metadata(self, index: int) -> dict:
+        return {"failover": {"model": self._names[index], "provider": self._providers[index], "index": index}}
+
+    @staticmethod
+    def _child_config(
+        run_manager: CallbackManagerForLLMRun | AsyncCallbackManagerForLLMRun | None,
+    ) -> RunnableConfig | None:
+        """Returns the config which reports the call to a model of the chain as a child run of the chain's run."""
+        if run_manager is None:
+            return None
+        # LLM run managers have no get_child, so the child manager is built as ParentRunManager.get_child does
+        callbacks = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+        callbacks.set_handlers(run_manager.inheritable_handlers)
+        callbacks.add_tags(run_manager.inheritable_tags)
+        callbacks.add_metadata(run_manager.inheritable_metadata)
+        return RunnableConfig(callbacks=callbacks)
+
+    def _allow(self, index: int) -> bool:
+        """Returns whether the model at `index` may be called, i.e. neither it nor its provider is broken."""
+        provider = self._providers[index]
+        return get_breaker(provider, self._names[index]).allow() and get_breaker(provider).allow()
+
+    def _succeeded(self, index: int) -> None:
+        get_breaker(self._providers[index], self._names[index]).record_success()
+        get_breaker(self._providers[index]).record_success()
+
+    def _failed(self, index: int, error: Exception) -> bool:
+        """Records a failed call and returns whether the chain should fall over to the next model."""
+        provider = self._providers[index]
+        if is_request_error(error):
+            # the provider answered, so it is healthy, but every provider would reject the request
+            get_breaker(provider).record_success()
+            return False
+        if is_rate_limit(error):
+            # the provider answered too, but this model is limited, so the provider's other models can still be used
+            get_breaker(provider, self._names[index]).record_failure(retry_after(error))
+        else:
+            get_breaker(provider).record_failure()
+        return True
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        errors, skipped = {}, []
+        config = self._child_config(run_manager)
+        for index, model in enumerate(self.models):
+            if not self._allow(index):
+                skipped.append(self._names[index])
+                continue
+            try:
+                message = model.invoke(messages, config, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._failed(index, e):
+                    raise
+                errors[self._names[index]] = e
+                continue
+            self._succeeded(index)
+            message.response_metadata.update(self._metadata(index))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise FailoverError(errors, skipped)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        errors, skipped = {}, []
+        config = self._child_config(run_manager)
+        for index, model in enumerate(self.models):
+            if not self._allow(index):
+                skipped.append(self._names[index])
+                continue
+            try:
+                message = await model.ainvoke(messages, config, stop=stop, **kwargs)
+            except Exception as e:
+                if not self._failed(index, e):
+                    raise
+                errors[self._names[index]] = e
+                continue
+            self._succeeded(index)
+            message.response_metadata.update(self._metadata(index))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise FailoverError(errors, skipped)
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        errors, skipped = {}, []
+        config = self._child_config(run_manager)
+        for index, model in enumerate(self.models):
+            if not self._allow(index):
+                skipped.append(self._names[index])
+                continue
+            stream = model.stream(messages, config, stop=stop, **kwargs)
+            try:
+                first = next(stream, None)
+            except Exception as e:
+                if not self._failed(index, e):
+                    raise
+                errors[self._names[index]] = e
+                continue
+            self._succeeded(index)
+            if first is None:
+                first = AIMessageChunk(content="")
+            first.response_metadata.update(self._metadata(index))
+            for chunk in itertools.chain([first], stream):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+            return
+        raise FailoverError(errors, skipped)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        errors, skipped = {}, []
+        config = self._child_config(run_manager)
+        for index, model in enumerate(self.models):
+            if not self._allow(index):
+                skipped.append(self._names[index])
+                continue
+            stream = model.astream(messages, config, stop=stop, **kwargs)
+            try:
+                first = await anext(stream, None)
+            except Exception as e:
+                if not self._failed(index, e):
+                    raise
+                errors[self._names[index]] = e
+                continue
+            self._succeeded(index)
+            if first is None:
+                first = AIMessageChunk(content="")
+            first.response_metadata.update(self._metadata(index))
+            generation = ChatGenerationChunk(message=first)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+            async for chunk in stream:
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+            return
+        raise FailoverError(errors, skipped)
@@ -1,9 +1,16 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class GeminiLoader(Loader):
+    prefixes = ("gemini", "gemma")
+
     def __call__(
         self,
         model: str,
@@ -13,7 +20,7 @@ class GeminiLoader(Loader):
         **kwargs,
     ) -> BaseChatModel | None:
 
-        if not model.startswith(("gemini", "gemma")):
+        if not model.startswith(self.prefixes):
             return None
 
         if self.has_endpoint(kwargs=kwargs):
@@ -0,0 +1,145 @@
+import threading
+import warnings
+from typing import NamedTuple
+
+
+class HttpPoolInfo(NamedTuple):
+    requests: int
+    connections: int
+    reused: int
+    reuse_ratio: float
+
+
+class HttpPool:
+    """Shared synchronous and asynchronous HTTP clients for the models loaded with `load(..., http_pool=...)`.
+
+    Every loaded client which supports it sends its requests through the same connection pools,
+    so connections and TLS sessions are reused across models instead of each client opening its own.
+    The `httpx` clients are created when they are first used.
+
+    Args:
+        max_connections: The maximum number of open connections in each pool.
+        max_keepalive_connections: The maximum number of idle connections kept open for reuse.
+        keepalive_expiry: The number of seconds an idle connection is kept open.
+        timeout: The number of seconds to wait for a response.
+        connect_timeout: The number of seconds to wait to establish a connection.
+        http2: Whether to use HTTP/2 where the server supports it. This needs the `h2` package.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 600.0,
+        connect_timeout: float = 10.0,
+        http2: bool = False,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.http2 = http2
+        self.requests = 0
+        self.connections = 0
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def _options(self) -> dict:
+        import httpx
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                warnings.warn(
+                    "HTTP/2 is disabled because the h2 package is not installed: pip install h2", stacklevel=4
+                )
+                http2 = False
+
+        return dict(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            http2=http2,
+        )
+
+    def _count(self, event_name: str) -> None:
+        with self._lock:
+            if (
+                event_name == "connection.connect_tcp.complete"
+                or event_name == "connection.connect_unix_socket.complete"
+            ):
+                self.connections += 1
+
+    def _on_request(self, request) -> None:
+        with self._lock:
+            self.requests += 1
+        # httpcore reports when it opens a new connection through the trace extension
+        request.extensions["trace"] = lambda event_name, info: self._count(event_name)
+
+    async def _on_async_request(self, request) -> None:
+        async def trace(event_name, info):
+            self._count(event_name)
+
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = trace
+
+    @property
+    def client(self):
+        """The shared `httpx.Client`."""
+        with self._lock:
+            if self._client is None:
+                import httpx
+
+                self._client = httpx.Client(**self._options(), event_hooks=dict(request=[self._on_request]))
+            return self._client
+
+    @property
+    def async_client(self):
+        """The shared `httpx.AsyncClient`."""
+        with self._lock:
+            if self._async_client is None:
+                import httpx
+
+                self._async_client = httpx.AsyncClient(
+                    **self._options(), event_hooks=dict(request=[self._on_async_request])
+                )
+            return self._async_client
+
+    def info(self) -> HttpPoolInfo:
+        """Returns the number of requests sent, the connections opened and how many requests reused a connection."""
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return HttpPoolInfo(
+                self.requests, self.connections, reused, reused / self.requests if self.requests else 0.0
+            )
+
+    def close(self) -> None:
+        """Closes the synchronous client's connections.
+
+        The models loaded with the pool keep the closed client, so they cannot be used after closing it. Models loaded
+        with the pool afterwards get a new client.
+        """
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Closes the connections of both clients. As with `close`, models loaded with the pool cannot be used after."""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.aclose()
+        self.close()
+
+
+default_http_pool = HttpPool()
@@ -1,25 +1,61 @@
-from langchain_core.language_models.llms import LLM
+from __future__ import annotations
 
+import warnings
+from typing import TYPE_CHECKING
+
+from .cache import freeze
 from .loader import Loader
+from .weights import WeightKey, WeightRegistry, default_weight_registry
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.llms import LLM
+
+CPU_DTYPES = ("float32", "bfloat16", "int8")
+
+# Prompts of two lengths so that the compiled decode step is also recompiled for dynamic shapes while warming up
+WARM_UP_PROMPTS = ("Hello", "Hello, how are you today?")
 
 
 class HuggingFaceLoader(Loader):
+    def __init__(self, weight_registry: WeightRegistry | None = None):
+        self.weight_registry = default_weight_registry if weight_registry is None else weight_registry
+
     def __call__(
-        self, model: str, temperature: float | None = None, api_key: str = "", max_tokens: int = None, **kwargs
+        self,
+        model: str,
+        temperature: float | None = None,
+        api_key: str = "",
+        max_tokens: int = None,
+        device: str | None = None,
+        dtype: str | None = None,
+        num_threads: int | None = None,
+        static_cache: bool = False,
+        compile: bool = False,
+        **kwargs,
     ) -> LLM | None:
-        """Adapted from https://www.pinecone.io/learn/llama-2/"""
+        """Adapted from https://www.pinecone.io/learn/llama-2/
+
+        Args:
+            device: "cuda" or "cpu". If None then CUDA is used when it is available.
+            dtype: On CPU, the precision of the weights: "float32" (default), "bfloat16"
+                or "int8" for dynamic int8 quantization of the linear layers.
+                On CUDA, the weights are quantized to 4 bits with bitsandbytes.
+            num_threads: The number of threads torch uses for intra-op parallelism on CPU.
+            static_cache: Generate with SDPA attention and a preallocated static KV cache.
+            compile: Compile the decode step with `torch.compile`. This implies `static_cache`.
+                The model is warmed up once when it is loaded. If compilation is not supported,
+                generation falls back to eager execution with a warning.
+        """
 
         model_name = model
 
         import os
-
-        os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
+        import weakref
+        from functools import partial
 
         import torch
         import transformers
 
-        torch.cuda.empty_cache()
-
         # from langchain_huggingface import HuggingFacePipeline
         from langchain_community.llms import HuggingFacePipeline
 
@@ -29,6 +65,62 @@ class HuggingFaceLoader(Loader):
         if not max_tokens:
             max_tokens = 1024
 
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+
+        static_cache = static_cache or compile
+        if static_cache:
+            # the static cache is preallocated and written in place by the SDPA attention layers
+            kwargs.setdefault("attn_implementation", "sdpa")
+
+        # share one copy of the weights between every model loaded with the same configuration
+        if device == "cpu":
+            dtype = dtype or "float32"
+            if dtype not in CPU_DTYPES:
+                raise ValueError(f"Unsupported dtype '{dtype}' for CPU inference. Choose from: {', '.join(CPU_DTYPES)}")
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            quantization = "int8-dynamic" if dtype == "int8" else "none"
+            key = WeightKey(model_name, dtype, quantization, "cpu", freeze(kwargs))
+            load_weights = partial(self.load_cpu_weights, model_name, api_key=api_key, dtype=dtype, **kwargs)
+        else:
+            os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
+            torch.cuda.empty_cache()
+            key = WeightKey(model_name, "float16", "bnb-4bit-fp4", "auto", freeze(kwargs))
+            load_weights = partial(self.load_weights, model_name, api_key=api_key, **kwargs)
+
+        model, tokenizer = self.weight_registry.acquire(key, load_weights)
+
+        # device = 0 if torch.cuda.is_available() else -1
+        try:
+            pipeline = transformers.pipeline(
+                model=model,
+                tokenizer=tokenizer,
+                return_full_text=True,  # langchain expects the full text
+                task='text-generation',
+                temperature=temperature,  # 'randomness' of outputs, 0.0 is the min and 1.0 the max
+                repetition_penalty=1.1,  # without this output begins repeating
+                max_new_tokens=max_tokens,
+                **(self.static_cache_options(device, compile) if static_cache else {}),
+            )
+        except BaseException:
+            # no pipeline holds the reference, so the weights could otherwise never be unloaded
+            self.weight_registry.release(key)
+            raise
+        # give the weights back to the registry when the pipeline is garbage collected
+        weakref.finalize(pipeline, self.weight_registry.release, key)
+
+        if static_cache:
+            self.warm_up(pipeline)
+
+        llm = HuggingFacePipeline(pipeline=pipeline)
+
+        return llm
+
+    def load_weights(self, model_name: str, api_key: str = "", **kwargs):
+        """Loads the model, quantized to 4 bits for the GPU, and the tokenizer from the Hugging Face Hub."""
+        import torch
+        import transformers
+
         # set quantization configuration to load large model with less GPU memory
         # this requires the `bitsandbytes` library
         bnb_config = transformers.BitsAndBytesConfig(
@@ -54,7 +146,7 @@ class HuggingFaceLoader(Loader):
             token=api_key,
             torch_dtype=torch.float16,
             low_cpu_mem_usage=True,
-            **kwargs
+            **kwargs,
         )
         model.eval()
 
@@ -63,17 +155,108 @@ class HuggingFaceLoader(Loader):
             token=api_key,
         )
 
-        # device = 0 if torch.cuda.is_available() else -1
-        pipeline = transformers.pipeline(
-            model=model,
-            tokenizer=tokenizer,
-            return_full_text=True,  # langchain expects the full text
-            task='text-generation',
-            temperature=temperature,  # 'randomness' of outputs, 0.0 is the min and 1.0 the max
-            repetition_penalty=1.1,  # without this output begins repeating
-            max_new_tokens=max_tokens,
+        return model, tokenizer
+
+    def load_cpu_weights(self, model_name: str, api_key: str = "", dtype: str = "float32", **kwargs):
+        """Loads the model for CPU inference and the tokenizer from the Hugging Face Hub.
+
+        Args:
+            dtype: "float32", "bfloat16" or "int8". With "int8", the linear layers are quantized
+                dynamically after loading the weights in float32.
+        """
+        import torch
+        import transformers
+
+        model_config = transformers.AutoConfig.from_pretrained(
+            model_name,
+            token=api_key,
         )
 
-        llm = HuggingFacePipeline(pipeline=pipeline)
+        model = transformers.AutoModelForCausalLM.from_pretrained(
+            model_name,
+            trust_remote_code=True,
+            config=model_config,
+            token=api_key,
+            torch_dtype=torch.bfloat16 if dtype == "bfloat16" else torch.float32,
+            low_cpu_mem_usage=True,
+            **kwargs,
+        )
+        model.eval()
 
-        return llm
+        if dtype == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        tokenizer = transformers.AutoTokenizer.from_pretrained(
+            model_name,
+            token=api_key,
+        )
+
+        return model, tokenizer
+
+    def static_cache_options(self, device: str, compile: bool = False) -> dict:
+        """Returns the generation options for a static KV cache and, optionally, a compiled decode step."""
+        import transformers
+
+        options = dict(cache_implementation="static")
+        if not compile:
+            return options
+
+        if not hasattr(transformers, "CompileConfig"):
+            warnings.warn(
+                "This version of transformers cannot compile generation. Generating without compilation.",
+                UserWarning,
+                stacklevel=3,
+            )
+            return options
+
+        # CUDA graphs reduce the launch overhead on the GPU and are not available on the CPU
+        on_cuda = device.startswith("cuda")
+        compile_config = transformers.CompileConfig(mode="reduce-overhead" if on_cuda else "default")
+        if not on_cuda:
+            # transformers only compiles automatically on accelerators, and has no public option to compile on the
+            # CPU, so this relies on the flag transformers itself uses while it still exists
+            if not hasattr(compile_config, "_compile_all_devices"):
+                warnings.warn(
+                    f"This version of transformers cannot compile generation on {device}. "
+                    "Generating without compilation.",
+                    UserWarning,
+                    stacklevel=3,
+                )
+                return options
+            compile_config._compile_all_devices = True
+        options["compile_config"] = compile_config
+        return options
+
+    def warm_up(self, pipeline) -> None:
+        """Runs short generations so that the static cache is allocated and the decode step is compiled at load time.
+
+        If this fails, compilation is disabled. If it fails without compilation, the default dynamic cache is used.
+        """
+        generation_config = pipeline.generation_config
+
+        def generate():
+            for prompt in WARM_UP_PROMPTS:
+                pipeline(prompt, max_new_tokens=4, return_full_text=False)
+
+        if generation_config.compile_config is not None:
+            try:
+                generate()
+                return
+            except Exception as e:
+                warnings.warn(
+                    f"Compilation failed, generating without it: {e}",
+                    UserWarning,
+                    stacklevel=3,
+                )
+                generation_config.compile_config = None
+                generation_config.disable_compile = True
+
+        try:
+            generate()
+        except Exception as e:
+            warnings.warn(
+                f"Generation with a static cache failed, using a dynamic cache: {e}",
+                UserWarning,
+                stacklevel=3,
+            )
+            generation_config.cache_implementation = None
@@ -0,0 +1,331 @@
+import binascii
+import hashlib
+import io
+import mimetypes
+import mmap
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+# Multiple of 3 bytes so that the base64 encoding of each chunk can be concatenated without padding in between
+CHUNK_SIZE = 3 * 2**20
+
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+)
+
+ImageSource = str | os.PathLike | bytes | bytearray | memoryview
+
+
+class ImageLimits(NamedTuple):
+    """The largest image a provider uses. Larger images are downscaled by the provider, so sending them is wasted."""
+
+    max_long_side: int | None = None
+    max_short_side: int | None = None
+    max_bytes: int | None = None
+
+    def scale(self, width: int, height: int) -> float:
+        """Returns the factor to scale an image by to fit within the limits, at most 1."""
+        scale = 1.0
+        if self.max_long_side:
+            scale = min(scale, self.max_long_side / max(width, height, 1))
+        if self.max_short_side:
+            scale = min(scale, self.max_short_side / max(min(width, height), 1))
+        return scale
+
+
+class ResizeInfo(NamedTuple):
+    images: int
+    resized: int
+    original_bytes: int
+    final_bytes: int
+    bytes_saved: int
+
+
+class ResizeStats:
+    """Thread-safe counts of the images checked against provider limits and the bytes saved by resizing them."""
+
+    def __init__(self):
+        self.images = 0
+        self.resized = 0
+        self.original_bytes = 0
+        self.final_bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, original_bytes: int, final_bytes: int) -> None:
+        """Adds the size of an image before and after it was checked against the limits."""
+        with self._lock:
+            self.images += 1
+            self.resized += final_bytes != original_bytes
+            self.original_bytes += original_bytes
+            self.final_bytes += final_bytes
+
+    def info(self) -> ResizeInfo:
+        """Returns the counts and the number of bytes saved."""
+        with self._lock:
+            return ResizeInfo(
+                self.images,
+                self.resized,
+                self.original_bytes,
+                self.final_bytes,
+                self.original_bytes - self.final_bytes,
+            )
+
+    def clear(self) -> None:
+        """Resets the counts."""
+        with self._lock:
+            self.images = self.resized = self.original_bytes = self.final_bytes = 0
+
+
+default_resize_stats = ResizeStats()
+
+
+class ImageCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+
+def detect_mime_type(data: bytes | memoryview, path: str | os.PathLike | None = None) -> str:
+    """Returns the MIME type of an image from the signature at the start of its data, or from its file extension."""
+    header = bytes(data[:16])
+    for signature, mime_type in SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    if header[4:12] == b"ftypavif":
+        return "image/avif"
+
+    if path is not None:
+        mime_type, _ = mimetypes.guess_type(str(path))
+        if mime_type:
+            return mime_type
+    return "application/octet-stream"
+
+
+def digest(data: bytes | memoryview, chunk_size: int = CHUNK_SIZE) -> str:
+    """Returns a hash of the data, read in chunks."""
+    hasher = hashlib.blake2b(digest_size=20)
+    for start in range(0, len(data), chunk_size):
+        hasher.update(data[start : start + chunk_size])
+    return hasher.hexdigest()
+
+
+def encode_base64(data: bytes | memoryview, chunk_size: int = CHUNK_SIZE) -> str:
+    """Encodes data to base64 in chunks, writing into a single preallocated buffer.
+
+    Only one chunk of the input is copied at a time, so a memory mapped file is never read into memory as a whole.
+    """
+    chunk_size -= chunk_size % 3
+    size = len(data)
+    encoded = bytearray(4 * ((size + 2) // 3))
+    position = 0
+    for start in range(0, size, chunk_size):
+        chunk = binascii.b2a_base64(data[start : start + chunk_size], newline=False)
+        encoded[position : position + len(chunk)] = chunk
+        position += len(chunk)
+    return encoded.decode("ascii")
+
+
+@contextmanager
+def image_data(source: ImageSource) -> Iterator[memoryview]:
+    """Yields a read-only view of image bytes, memory mapping the file if the source is a path."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with memoryview(source) as view:
+            yield view
+        return
+
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release()
+
+
+def _save(image, quality: int) -> tuple[bytes, str]:
+    buffer = io.BytesIO()
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), "image/png"
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def downscale(
+    data: bytes | memoryview,
+    limits: ImageLimits,
+    quality: int = 85,
+    stats: ResizeStats | None = default_resize_stats,
+) -> tuple[bytes | memoryview, str | None]:
+    """Resizes and recompresses an image which is larger than the limits of a provider.
+
+    Images are scaled to fit within the maximum dimensions and saved as JPEG, or as PNG if they have transparency.
+    If the result is larger than `max_bytes`, the JPEG quality is lowered to 55 and then the image is made smaller.
+    Images within the limits, animations and files which Pillow cannot read are returned unchanged.
+    Pillow is an optional dependency: without it, images are returned unchanged with a warning.
+
+    Args:
+        data: The image.
+        limits: The limits of the provider.
+        quality: The JPEG quality of resized images.
+        stats: The counts to add the size of the image before and after resizing to. If None then nothing is counted.
+
+    Returns:
+        tuple: The image data and its new MIME type, or the original data and None if it is unchanged.
+    """
+    resized, mime_type = _downscale(data, limits, quality)
+    if stats is not None:
+        stats.record(len(data), len(resized))
+    return resized, mime_type
+
+
+def _downscale(data: bytes | memoryview, limits: ImageLimits, quality: int) -> tuple[bytes | memoryview, str | None]:
+    try:
+        from PIL import Image
+    except ImportError:
+        warnings.warn("Images are not resized because Pillow is not installed: pip install pillow", stacklevel=4)
+        return data, None
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        return data, None
+    if getattr(image, "is_animated", False):
+        return data, None
+
+    scale = limits.scale(*image.size)
+    if scale >= 1 and (limits.max_bytes is None or len(data) <= limits.max_bytes):
+        return data, None
+
+    if scale < 1:
+        size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    while True:
+        encoded, mime_type = _save(image, quality)
+        if limits.max_bytes is None or len(encoded) <= limits.max_bytes or min(image.size) <= 16:
+            break
+        if mime_type == "image/jpeg" and quality > 55:
+            quality -= 10
+        else:
+            image = image.resize(
+                (max(image.width * 4 // 5, 1), max(image.height * 4 // 5, 1)), Image.Resampling.LANCZOS
+            )
+
+    # recompressing an image which is only over the byte limit must make it smaller
+    if scale >= 1 and len(encoded) >= len(data):
+        return data, None
+    return encoded, mime_type
+
+
+class ImageCache:
+    """A thread-safe LRU cache of base64 encoded images keyed by the digest of their contents.
+
+    Args:
+        max_bytes: The maximum total length of the cached encodings. The least recently used are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        """Returns the cached encoding for a digest, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        """Stores an encoding, evicting the least recently used encodings to stay within `max_bytes`."""
+        size = len(entry["data"])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key)["data"])
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted["data"])
+
+    def clear(self) -> None:
+        """Removes all cached encodings."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self) -> ImageCacheInfo:
+        """Returns the hit and miss statistics and the size of the cache."""
+        with self._lock:
+            return ImageCacheInfo(self.hits, self.misses, len(self._entries), self._bytes, self.max_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+default_image_cache = ImageCache()
+
+
+def encode_image(
+    source: ImageSource,
+    cache: ImageCache | None = default_image_cache,
+    limits: ImageLimits | None = None,
+) -> dict:
+    """Encodes an image file or image bytes to the `data` and `mime_type` dictionary used by `LLMWrapper.format`.
+
+    Files are memory mapped and encoded in chunks. Encodings are cached by the digest of the image.
+
+    Args:
+        source: The path to an image file or the bytes of an image.
+        cache: The cache of encodings. If None then nothing is cached.
+        limits: If given, images larger than these limits are downscaled before they are encoded. See `downscale`.
+
+    Returns:
+        dict: The base64 encoded image as "data" and its MIME type as "mime_type".
+    """
+    path = None if isinstance(source, (bytes, bytearray, memoryview)) else Path(source)
+    with image_data(source) as data:
+        key = (digest(data) + (repr(tuple(limits)) if limits else "")) if cache is not None else ""
+        entry = cache.get(key) if cache is not None else None
+        if entry is None:
+            mime_type = detect_mime_type(data, path)
+            if limits is not None:
+                data, resized_mime_type = downscale(data, limits)
+                mime_type = resized_mime_type or mime_type
+            entry = dict(data=encode_base64(data), mime_type=mime_type)
+            if cache is not None:
+                cache.put(key, entry)
+    return dict(entry)
@@ -1,19 +1,39 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .huggingface import HuggingFaceLoader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    from .prefix_cache import PrefixCache
+
 
 class LlamaLoader(HuggingFaceLoader):
+    prefixes = ('meta-llama/Meta-Llama', 'meta-llama/Llama')
+
     def __call__(
         self,
         model: str,
         temperature: float | None = None,
         api_key: str | None = "",
         max_tokens: int | None = None,
-        **kwargs
+        batch_size: int | None = None,
+        max_batch_wait: float | None = None,
+        prefix_cache: PrefixCache | bool = False,
+        **kwargs,
     ) -> BaseChatModel | None:
+        """Loads a Llama chat model. The other arguments are passed to `HuggingFaceLoader`.
 
-        if not model.startswith(('meta-llama/Meta-Llama', 'meta-llama/Llama')):
+        Args:
+            batch_size: The maximum number of conversations generated at once by `batch` and concurrent async calls.
+            max_batch_wait: The number of seconds concurrent async calls wait for others to fill a batch.
+            prefix_cache: A `PrefixCache` of the attention keys and values of repeated conversation prefixes,
+                which can be shared between models, or True for a new one.
+        """
+
+        if not model.startswith(self.prefixes):
             return None
 
         if self.has_endpoint(kwargs=kwargs):
@@ -29,4 +49,17 @@ class LlamaLoader(HuggingFaceLoader):
 
         from .llama_model import ChatLlama3
 
-        return ChatLlama3(llm=llm)
+        # only the options which are given are passed so that the model's defaults apply otherwise
+        options = {}
+        if batch_size is not None:
+            options["batch_size"] = batch_size
+        if max_batch_wait is not None:
+            options["max_batch_wait"] = max_batch_wait
+        if prefix_cache is True:
+            from .prefix_cache import PrefixCache
+
+            prefix_cache = PrefixCache()
+        if prefix_cache is not False:
+            options["prefix_cache"] = prefix_cache
+
+        return ChatLlama3(llm=llm, **options)
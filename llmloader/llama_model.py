@@ -1,30 +1,71 @@
+import asyncio
+import contextlib
+import contextvars
+import copy
+import re
+import threading
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
 from langchain_community.llms import HuggingFacePipeline
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
-from langchain_core.language_models import BaseChatModel
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
 from langchain_core.messages import (
     AIMessage,
+    AIMessageChunk,
     BaseMessage,
     HumanMessage,
     SystemMessage,
 )
-from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
+from pydantic import PrivateAttr
+
+from .cache import freeze
+from .prefix_cache import PrefixCache
+from .scheduler import BatchScheduler
+
+
+def stop_at(text: str, stop: list[str] | None) -> str:
+    """Cuts a response at the first of the stop sequences in it."""
+    if not stop:
+        return text
+    return re.split("|".join(map(re.escape, stop)), text, maxsplit=1)[0]
+
+
+def partial_stop(text: str, stop: list[str] | None) -> int:
+    """Returns the length of the longest end of `text` which could be the start of a stop sequence."""
+    for length in range(min(len(text), max(map(len, stop or [""])) - 1), 0, -1):
+        if any(sequence.startswith(text[-length:]) for sequence in stop):
+            return length
+    return 0
 
 
 class ChatLlama3(BaseChatModel):
     llm: HuggingFacePipeline
+    batch_size: int = 8
+    """The maximum number of conversations to generate at once in `batch` and in the async scheduler."""
+    max_batch_wait: float = 0.01
+    """The number of seconds the async scheduler waits for concurrent requests to fill a batch."""
+
+    prefix_cache: PrefixCache | None = None
+    """An opt-in cache of the attention keys and values of repeated conversation prefixes, e.g. a long system prompt.
+    When set, conversations are generated one at a time so that each can reuse its cached prefix."""
+
+    _scheduler: BatchScheduler | None = PrivateAttr(default=None)
 
     @property
     def _llm_type(self) -> str:
         """Get the type of language model used by this chat model. Used for logging purposes only."""
         return "ChatLlama3"
 
-    def _generate(
-        self,
-        messages: list[BaseMessage],
-        stop: list[str] | None = None,
-        run_manager: CallbackManagerForLLMRun | None = None,
-        **kwargs,
-    ) -> ChatResult:
+    @staticmethod
+    def convert_messages(messages: list[BaseMessage]) -> list[dict]:
+        """Converts LangChain messages to the role/content dictionaries used by the Llama chat template."""
         llama_messages = []
 
         for message in messages:
@@ -38,27 +79,344 @@ class ChatLlama3(BaseChatModel):
                 role = ""
             llama_messages.append(dict(role=role, content=message.content))
 
+        return llama_messages
+
+    def terminators(self) -> list[int]:
+        tokenizer = self.llm.pipeline.tokenizer
         terminators = [
-            self.llm.pipeline.tokenizer.eos_token_id,
-            self.llm.pipeline.tokenizer.convert_tokens_to_ids("<|eot_id|>"),
+            tokenizer.eos_token_id,
+            tokenizer.convert_tokens_to_ids("<|eot_id|>"),
         ]
+        return [terminator for terminator in terminators if terminator is not None]
 
-        outputs = self.llm.pipeline(
-            llama_messages,
-            # max_new_tokens=512,
-            eos_token_id=terminators,
-            do_sample=True,
-            # temperature=0.1,
-            # top_p=0.2,
+    def render(self, messages: list[BaseMessage]) -> str:
+        """Renders a conversation to a prompt string with the tokenizer's chat template."""
+        return self.llm.pipeline.tokenizer.apply_chat_template(
+            self.convert_messages(messages), tokenize=False, add_generation_prompt=True
         )
-        result = outputs[0]["generated_text"][-1]
-        chat_generations = []
 
-        chat_generation = ChatGeneration(
-            message=AIMessage(content=result['content'])  # , generation_info=g.generation_info
-        )
-        chat_generations.append(chat_generation)
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs,
+    ) -> ChatResult:
+        return self._generate_many([messages], stop=stop, **kwargs)[0]
+
+    @property
+    def scheduler(self) -> BatchScheduler:
+        """The scheduler which gathers concurrent async calls into batches. Use `scheduler.metrics()` to monitor it."""
+        if self._scheduler is None:
+            self._scheduler = BatchScheduler(
+                self._generate_requests, max_batch_size=self.batch_size, max_wait=self.max_batch_wait
+            )
+        return self._scheduler
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs,
+    ) -> ChatResult:
+        return await self.scheduler.submit((messages, stop, kwargs))
+
+    def _generate_requests(self, requests: list[tuple[list[BaseMessage], list[str] | None, dict]]) -> list[ChatResult]:
+        """Generates a batch of (messages, stop, generation options) requests from the scheduler.
+
+        Requests with the same stop sequences and options are generated together.
+        """
+        groups: dict[Any, list[int]] = {}
+        for index, (_, stop, kwargs) in enumerate(requests):
+            groups.setdefault(freeze((stop, kwargs)), []).append(index)
+
+        results: list[ChatResult | None] = [None] * len(requests)
+        for indexes in groups.values():
+            _, stop, kwargs = requests[indexes[0]]
+            generated = self._generate_many([requests[index][0] for index in indexes], stop=stop, **kwargs)
+            for index, result in zip(indexes, generated):
+                results[index] = result
+        return results
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs,
+    ) -> Iterator[ChatGenerationChunk]:
+        """Yields the response token by token while the pipeline generates in a background thread.
+
+        If the consumer stops early, generation is stopped at the next token and the thread is joined.
+        """
+        with contextlib.closing(self._stream_chunks(messages, threading.Event(), stop=stop, **kwargs)) as chunks:
+            for chunk in chunks:
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    def _stream_chunks(
+        self, messages: list[BaseMessage], cancelled: threading.Event, stop: list[str] | None = None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        """Yields the chunks of the response generated in a background thread, which stops once `cancelled` is set.
 
-        return ChatResult(
-            generations=chat_generations,  # llm_output=result['content']
+        The response is cut at the first stop sequence, as in `_generate`, and generation stops there. Text which
+        could be the start of a stop sequence is held back until the next token shows whether it is.
+        """
+        from transformers import (
+            StoppingCriteria,
+            StoppingCriteriaList,
+            TextIteratorStreamer,
         )
+
+        pipeline = self.llm.pipeline
+        tokenizer = pipeline.tokenizer
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        class Cancelled(StoppingCriteria):
+            def __init__(self):
+                self.prompt_length = None
+
+            def __call__(self, input_ids, scores, **kwargs) -> bool:
+                if cancelled.is_set():
+                    return True
+                if not stop:
+                    return False
+                # the first call sees the prompt and one generated token
+                if self.prompt_length is None:
+                    self.prompt_length = input_ids.shape[-1] - 1
+                text = tokenizer.decode(input_ids[0, self.prompt_length :], skip_special_tokens=True)
+                return any(sequence in text for sequence in stop)
+
+        def generate():
+            try:
+                pipeline(
+                    self.render(messages),
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([Cancelled()]),
+                    return_full_text=False,
+                    add_special_tokens=False,  # the chat template already adds the special tokens
+                    eos_token_id=self.terminators(),
+                    do_sample=True,
+                    **kwargs,
+                )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()  # wake up the consumer so that the error can be raised
+
+        def chunk(text: str) -> ChatGenerationChunk:
+            return ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+        thread = threading.Thread(target=generate, name="ChatLlama3-stream", daemon=True)
+        thread.start()
+        pending = ""
+        try:
+            for text in streamer:
+                pending += text
+                if not pending:
+                    continue
+                if stop:
+                    cut = stop_at(pending, stop)
+                    if cut != pending:
+                        pending = ""
+                        if cut:
+                            yield chunk(cut)
+                        break
+                    held = partial_stop(pending, stop)
+                    text, pending = pending[: len(pending) - held], pending[len(pending) - held :]
+                else:
+                    text, pending = pending, ""
+                if text:
+                    yield chunk(text)
+        finally:
+            cancelled.set()
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        if pending:
+            yield chunk(pending)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Yields the response token by token without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+        chunks = self._stream_chunks(messages, cancelled, stop=stop, **kwargs)
+        done = object()
+        pending = None
+        try:
+            while True:
+                pending = loop.run_in_executor(None, next, chunks, done)
+                # shielded so that a cancelled consumer can still wait below for the chunk being read
+                chunk = await asyncio.shield(pending)
+                if chunk is done:
+                    break
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            # the generator cannot be closed while another thread is reading from it, so generation is stopped
+            # first and the read in flight is awaited
+            cancelled.set()
+            if pending is not None and not pending.done():
+                with contextlib.suppress(Exception):
+                    await pending
+            await loop.run_in_executor(None, chunks.close)
+
+    def _generate_many(
+        self, conversations: list[list[BaseMessage]], stop: list[str] | None = None, **kwargs
+    ) -> list[ChatResult]:
+        """Generates a response for each conversation, running them through the pipeline in micro-batches.
+
+        Prompts are left-padded and grouped by length to reduce padding.
+        The results are in the same order as `conversations`.
+
+        Args:
+            conversations: The conversations.
+            stop: Sequences at which to cut every response.
+            **kwargs: Generation options for the pipeline, e.g. `max_new_tokens`.
+        """
+        if self.prefix_cache is not None:
+            texts = [self._generate_with_prefix_cache(messages, **kwargs) for messages in conversations]
+        else:
+            texts = self._generate_batched(conversations, **kwargs)
+
+        return [
+            ChatResult(generations=[ChatGeneration(message=AIMessage(content=stop_at(text, stop)))]) for text in texts
+        ]
+
+    def _generate_batched(self, conversations: list[list[BaseMessage]], **kwargs) -> list[str]:
+        pipeline = self.llm.pipeline
+        tokenizer = pipeline.tokenizer
+
+        prompts = [self.render(messages) for messages in conversations]
+        order = sorted(range(len(prompts)), key=lambda index: len(prompts[index]))
+        batch_size = max(self.batch_size, 1)
+
+        # decoder-only models need left padding so that generation continues directly from each prompt. The
+        # tokenizer is shared with other models of the same weights, so its settings are restored afterwards.
+        padding_side, pad_token = tokenizer.padding_side, tokenizer.pad_token
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        texts = [""] * len(prompts)
+        try:
+            for start in range(0, len(order), batch_size):
+                indexes = order[start : start + batch_size]
+                outputs = pipeline(
+                    [prompts[index] for index in indexes],
+                    batch_size=len(indexes),
+                    return_full_text=False,
+                    add_special_tokens=False,  # the chat template already adds the special tokens
+                    eos_token_id=self.terminators(),
+                    pad_token_id=tokenizer.pad_token_id,
+                    do_sample=True,
+                    **kwargs,
+                )
+                for index, output in zip(indexes, outputs):
+                    texts[index] = output[0]["generated_text"]
+        finally:
+            tokenizer.padding_side, tokenizer.pad_token = padding_side, pad_token
+
+        return texts
+
+    def batch(
+        self,
+        inputs: list[LanguageModelInput],
+        config: RunnableConfig | list[RunnableConfig] | None = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> list[BaseMessage | Exception]:
+        """Generates responses for many inputs together rather than one at a time.
+
+        The inputs are run with `abatch`, so each is its own run with the cache, rate limiter and callbacks of
+        `invoke`, and the scheduler generates the ones which are not cached in batches of up to `batch_size`.
+        """
+        if not inputs:
+            return []
+
+        coroutine = self.abatch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # an event loop is already running in this thread, so the batch runs in its own loop on another thread
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ChatLlama3-batch") as executor:
+            return executor.submit(context.run, asyncio.run, coroutine).result()
+
+    def _prefix_cache_model(self) -> str:
+        """Returns the identity of the model in the prefix cache: its name or path and its dtype.
+
+        A model built in memory without a name is identified by the object, so it never shares entries.
+        """
+        model = self.llm.pipeline.model
+        name = getattr(model, "name_or_path", "") or f"object-{id(model)}"
+        return f"{name}:{getattr(model, 'dtype', '')}"
+
+    def _generate_with_prefix_cache(self, messages: list[BaseMessage], **kwargs) -> str:
+        """Generates a response reusing the cached keys and values for the conversation before the last message.
+
+        Only the tokens after the cached prefix are run through the model before generation starts.
+        """
+        import torch
+
+        pipeline = self.llm.pipeline
+        tokenizer = pipeline.tokenizer
+        model = pipeline.model
+
+        prompt = self.render(messages)
+        prompt_ids = tokenizer(prompt, add_special_tokens=False)["input_ids"]
+
+        prefix_ids = []
+        if len(messages) > 1:
+            prefix = tokenizer.apply_chat_template(self.convert_messages(messages[:-1]), tokenize=False)
+            if prompt.startswith(prefix):
+                prefix_ids = tokenizer(prefix, add_special_tokens=False)["input_ids"]
+            # the prefix must tokenize the same way at the start of the prompt and leave tokens to run
+            if prompt_ids[: len(prefix_ids)] != prefix_ids or len(prefix_ids) >= len(prompt_ids):
+                prefix_ids = []
+
+        # the options the pipeline was built with, e.g. max_new_tokens, are merged into its generation config
+        generation_config = getattr(pipeline, "generation_config", None) or model.generation_config
+        generate_kwargs = dict(generation_config=generation_config, **kwargs)
+        model_id = self._prefix_cache_model()
+
+        with torch.no_grad():
+            if prefix_ids:
+                past_key_values = self.prefix_cache.get(prefix_ids, model_id)
+                if past_key_values is None:
+                    prefix_tensor = torch.tensor([prefix_ids], device=model.device)
+                    computed = model(prefix_tensor, use_cache=True).past_key_values
+                    self.prefix_cache.put(prefix_ids, computed, model_id)
+                    past_key_values = copy.deepcopy(computed)
+                generate_kwargs["past_key_values"] = past_key_values
+                # a static cache cannot be preallocated when generation continues from the cached prefix
+                generation_config = generate_kwargs.get("generation_config")
+                if getattr(generation_config, "cache_implementation", None) is not None:
+                    generation_config = copy.deepcopy(generation_config)
+                    generation_config.cache_implementation = None
+                    generate_kwargs["generation_config"] = generation_config
+                generate_kwargs.pop("cache_implementation", None)
+
+            input_ids = torch.tensor([prompt_ids], device=model.device)
+            output = model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                eos_token_id=self.terminators(),
+                pad_token_id=tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id,
+                do_sample=True,
+                **generate_kwargs,
+            )
+
+        return tokenizer.decode(output[0, len(prompt_ids) :], skip_special_tokens=True)
@@ -1,11 +1,29 @@
+from __future__ import annotations
+
 import os
 import warnings
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
-from langchain_core.language_models.chat_models import BaseChatModel
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 
 class Loader(ABC):
+    prefixes: tuple[str, ...] = ()
+    """The model name prefixes handled by this loader. Loaders without prefixes are tried as fallbacks."""
+
+    uses_endpoint: bool | None = False
+    """True if the loader serves custom endpoints, False if it defers to other loaders when one is set
+    and None if the endpoint makes no difference."""
+
+    supports_http_client: bool = False
+    """True if the models of this loader accept shared `http_client` and `http_async_client` arguments."""
+
+    def accepts(self, model: str) -> bool:
+        """Returns whether this loader can handle a model name beyond matching its prefixes."""
+        return True
+
     @abstractmethod
     def __call__(
         self,
@@ -1,15 +1,41 @@
+import time
+from pathlib import Path
+
 import typer
-from langchain_core.output_parsers import StrOutputParser
 from rich.console import Console
+from typer.core import TyperGroup
+
+from llmloader import load
+
+
+class DefaultCommandGroup(TyperGroup):
+    """Runs the `main` command unless the first argument names another command, so `llmloader "prompt"` works."""
+
+    default_command = "main"
+
+    def parse_args(self, ctx, args: list[str]) -> list[str]:
+        group_options = {option for param in self.get_params(ctx) for option in param.opts}
+        if args and args[0] not in self.commands and args[0] not in group_options:
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
 
-from llmloader import LLMWrapper, load
 
-app = typer.Typer()
+app = typer.Typer(cls=DefaultCommandGroup)
+
+
+def print_timing(console: Console, start: float, first_token: float, end: float, tokens: int) -> None:
+    """Prints the time to first token, total latency and output tokens per second of a response."""
+    console.print(f"Time to first token: {first_token - start:.3f} s")
+    console.print(f"Total latency: {end - start:.3f} s")
+    if tokens and end > start:
+        console.print(f"Output tokens: {tokens} ({tokens / (end - start):.1f} tokens/sec)")
+    else:
+        console.print("Output tokens: not reported by the model")
 
 
 @app.command()
 def main(
-    prompt: str = typer.Argument(help="Prompt for the model"),
+    prompt: str = typer.Argument(None, help="Prompt for the model"),
     model: str = typer.Option("gpt-4o-mini", help="Model Name"),
     temperature: float = typer.Option(0.1, help="Temperature for sampling"),
     max_tokens: int = typer.Option(None, help="Max number of tokens to generate"),
@@ -17,17 +43,189 @@ def main(
     endpoint: str = typer.Option("", help="Endpoint for the model"),
     all_results: bool = typer.Option(False, help="Print all results"),
     count: bool = typer.Option(False, help="Count tokens in the response"),
+    input: Path = typer.Option(
+        None, help="A JSON Lines file of prompts, each a string or an object with 'prompt' and optional 'id' keys"
+    ),
+    output: Path = typer.Option(None, help="The JSON Lines file to append the results to when using --input"),
+    concurrency: int = typer.Option(8, help="The maximum number of prompts to run at once when using --input"),
+    adaptive: bool = typer.Option(
+        False, help="Adapt the prompts in flight to rate limits and latency, starting from --concurrency"
+    ),
+    max_concurrency: int = typer.Option(64, help="The highest number of prompts in flight with --adaptive"),
+    stream: bool = typer.Option(False, help="Print the response as it is generated"),
+    timing: bool = typer.Option(False, help="Print the time to first token, total latency and output tokens/sec"),
+    record: Path = typer.Option(None, help="A usage ledger file to record the token usage of the response in"),
 ):
-    llm = load(model=model, temperature=temperature, api_key=api_key, max_tokens=max_tokens, endpoint=endpoint)
-    result = llm.invoke(prompt)
+    """Runs a prompt, or a file of prompts, through a model."""
+    from langchain_core.output_parsers import StrOutputParser
 
     console = Console()
+    if (prompt is None) == (input is None):
+        raise typer.BadParameter("Give either a prompt or an --input file of prompts")
+    if input is not None and output is None:
+        raise typer.BadParameter("--output is required with --input")
+    if input is not None:
+        from llmloader.batch import validate_prompts
+
+        try:
+            validate_prompts(input)
+        except (OSError, ValueError) as e:
+            raise typer.BadParameter(str(e))
+
+    llm = load(model=model, temperature=temperature, api_key=api_key, max_tokens=max_tokens, endpoint=endpoint)
+
+    if input is not None:
+        from llmloader.batch import run_batch
+
+        controller = None
+        if adaptive:
+            from llmloader.concurrency import AdaptiveConcurrency
+
+            controller = AdaptiveConcurrency(
+                initial=min(concurrency, max_concurrency), max_limit=max(concurrency, max_concurrency)
+            )
+        summary = run_batch(llm, input, output, concurrency=controller or concurrency, count=count)
+        console.print(
+            f"{summary.completed} completed, {summary.failed} failed, "
+            f"{summary.skipped} skipped (already in {output})"
+        )
+        if controller is not None:
+            info = controller.info()
+            console.print(
+                f"Concurrency limit: {info.limit} at the end, {info.rate_limited} rate limited, "
+                f"{info.decreases} decreases"
+            )
+        if summary.failed:
+            raise typer.Exit(code=1)
+        return
 
     parser = StrOutputParser()
-    console.print(parser.invoke(result))
+    start = time.perf_counter()
+    first_token = None
+    if stream:
+        result = None
+        for chunk in llm.stream(prompt):
+            text = parser.invoke(chunk)
+            if text and first_token is None:
+                first_token = time.perf_counter()
+            console.print(text, end="", markup=False, highlight=False)
+            result = chunk if result is None else result + chunk
+        console.print()
+    else:
+        result = llm.invoke(prompt)
+        console.print(parser.invoke(result), markup=False, highlight=False)
+    end = time.perf_counter()
+
+    if timing:
+        from llmloader.bench import output_tokens
+
+        print_timing(console, start, first_token or end, end, output_tokens(result))
+
+    if record and hasattr(result, "response_metadata"):
+        from llmloader.usage import get_ledger
+        from llmloader.wrappers import LLMWrapper
+
+        LLMWrapper.get_token_count(result, record=record)
+        get_ledger(record).flush()
 
     if count:
+        from llmloader.wrappers import LLMWrapper
+
         console.print(LLMWrapper.get_token_count(result.response_metadata))
 
     if all_results:
         console.print(result)
+
+
+@app.command()
+def usage(
+    record: Path = typer.Argument(help="The usage ledger file"),
+    by: list[str] = typer.Option(["model"], help="Group the totals by model, provider and/or period"),
+    period: str = typer.Option("day", help="The length of each period when grouping by period: hour or day"),
+    since: str = typer.Option(None, help="Only include usage from this date or time onwards (ISO 8601, UTC)"),
+    until: str = typer.Option(None, help="Only include usage before this date or time (ISO 8601, UTC)"),
+    model: str = typer.Option(None, help="Only include this model"),
+    provider: str = typer.Option(None, help="Only include this provider"),
+    json_output: bool = typer.Option(False, "--json", help="Print the totals as JSON"),
+):
+    """Prints the token usage totals recorded in a usage ledger."""
+    from rich.table import Table
+
+    from llmloader.usage import COUNTS, get_ledger
+
+    if not record.exists():
+        raise typer.BadParameter(f"There is no usage ledger at {record}")
+
+    try:
+        totals = get_ledger(record).totals(
+            by=by, since=since, until=until, model=model, provider=provider, period=period
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    console = Console()
+    if json_output:
+        console.print_json(data=totals)
+        return
+
+    table = Table(title=f"Token usage: {record}")
+    for column in [*by, *COUNTS]:
+        table.add_column(column, justify="right" if column in COUNTS else "left")
+    for row in totals:
+        table.add_row(*(str(row[column]) for column in [*by, *COUNTS]))
+    console.print(table)
+
+
+@app.command()
+def bench(
+    model: str = typer.Option("dummy", help="Model Name"),
+    api_key: str = typer.Option("", help="API Key for the model"),
+    endpoint: str = typer.Option("", help="Endpoint for the model, e.g. a local OpenAI compatible server"),
+    max_tokens: int = typer.Option(None, help="Max number of tokens to generate"),
+    duration: float = typer.Option(10.0, help="The number of seconds to send requests for"),
+    concurrency: int = typer.Option(4, help="The number of requests in flight"),
+    rate: float = typer.Option(None, help="Send this many requests per second regardless of responses instead"),
+    prompt_tokens: list[int] = typer.Option([100], help="An approximate prompt size in tokens, repeat for a mix"),
+    image_fraction: float = typer.Option(0.0, help="The fraction of requests with an image"),
+    image_size: int = typer.Option(512, help="The width and height of the images in pixels"),
+    stream_fraction: float = typer.Option(0.0, help="The fraction of requests which stream the response"),
+    seed: int = typer.Option(0, help="The seed of the random request mix"),
+    json_output: bool = typer.Option(False, "--json", help="Print the results as JSON"),
+):
+    """Sends a mix of requests to a model for a fixed duration and reports latency, throughput and errors."""
+    from rich.table import Table
+
+    from llmloader.bench import PERCENTILES, RequestMix, run_bench
+
+    if rate is not None and rate <= 0:
+        raise typer.BadParameter("--rate must be positive")
+
+    llm = load(model=model, api_key=api_key, max_tokens=max_tokens, endpoint=endpoint)
+    mix = RequestMix(tuple(prompt_tokens), image_fraction, image_size, stream_fraction)
+    summary = run_bench(llm, duration, concurrency=concurrency, rate=rate, mix=mix, seed=seed)
+
+    console = Console()
+    if json_output:
+        console.print_json(data=summary)
+        return
+
+    def seconds(value: float | None) -> str:
+        return "-" if value is None else f"{value * 1000:.1f} ms"
+
+    load_description = f"{rate:g} requests/sec" if rate is not None else f"concurrency {concurrency}"
+    table = Table(title=f"{model}: {summary['requests']} requests in {summary['duration']:.1f} s at {load_description}")
+    table.add_column("metric")
+    table.add_column("value", justify="right")
+    table.add_row("requests/sec", f"{summary['requests_per_second']:.1f}")
+    for q in PERCENTILES:
+        table.add_row(f"latency p{q}", seconds(summary[f"latency_p{q}"]))
+    for q in PERCENTILES:
+        table.add_row(f"time to first token p{q}", seconds(summary[f"ttft_p{q}"]))
+    table.add_row("output tokens/sec", f"{summary['output_tokens_per_second']:.1f}")
+    stream_rate = summary["stream_tokens_per_second"]
+    table.add_row("stream tokens/sec (median)", "-" if stream_rate is None else f"{stream_rate:.1f}")
+    table.add_row("error rate", f"{summary['error_rate']:.2%}")
+    table.add_row("429 rate", f"{summary['rate_limit_rate']:.2%}")
+    console.print(table)
+    for error, count in summary["errors"].items():
+        console.print(f"{count} x {error}")
@@ -0,0 +1,251 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# The upper bounds in seconds of the histogram buckets, from a fast cached answer to a long generation
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Counts observations in cumulative buckets like a Prometheus histogram."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Returns the `le` label and cumulative count of each bucket, ending with "+Inf"."""
+        total = 0
+        result = []
+        for bound, count in zip([*map(_format_number, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def snapshot(self) -> dict:
+        return dict(count=self.count, sum=self.sum, buckets=dict(self.cumulative()))
+
+
+class ModelMetrics:
+    """The metrics of the calls to one model of one provider."""
+
+    __slots__ = ("requests", "errors", "input_tokens", "output_tokens", "latency", "time_to_first_token")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.requests = 0
+        self.errors: dict[str, int] = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = Histogram(buckets)
+        self.time_to_first_token = Histogram(buckets)
+
+
+class Metrics:
+    """Collects the latency, time to first token, token usage and errors of model calls, labeled by provider and model.
+
+    Calls are recorded by a `MetricsCallback`, which `llmloader.load(..., metrics=True)` attaches to the model.
+    Read them with `snapshot` or expose them to Prometheus with `prometheus`.
+    Recording a call takes a lock and a few dictionary updates, so it can be left on in production.
+
+    Args:
+        buckets: The upper bounds in seconds of the latency and time to first token histogram buckets.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._models: dict[tuple[str, str], ModelMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, provider: str, model: str) -> ModelMetrics:
+        metrics = self._models.get((provider, model))
+        if metrics is None:
+            metrics = self._models[(provider, model)] = ModelMetrics(self.buckets)
+        return metrics
+
+    def record(
+        self,
+        provider: str,
+        model: str,
+        latency: float,
+        time_to_first_token: float | None = None,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+    ) -> None:
+        """Records a successful call. The time to first token is only known for streams."""
+        with self._lock:
+            metrics = self._get(provider, model)
+            metrics.requests += 1
+            metrics.input_tokens += input_tokens
+            metrics.output_tokens += output_tokens
+            metrics.latency.observe(latency)
+            if time_to_first_token is not None:
+                metrics.time_to_first_token.observe(time_to_first_token)
+
+    def record_error(self, provider: str, model: str, error: BaseException) -> None:
+        """Records a failed call by the class name of its error."""
+        name = type(error).__name__
+        with self._lock:
+            metrics = self._get(provider, model)
+            metrics.requests += 1
+            metrics.errors[name] = metrics.errors.get(name, 0) + 1
+
+    def snapshot(self) -> list[dict]:
+        """Returns the metrics of each provider and model as plain dictionaries, e.g. to log or return as JSON."""
+        with self._lock:
+            return [
+                dict(
+                    provider=provider,
+                    model=model,
+                    requests=metrics.requests,
+                    errors=dict(metrics.errors),
+                    input_tokens=metrics.input_tokens,
+                    output_tokens=metrics.output_tokens,
+                    latency=metrics.latency.snapshot(),
+                    time_to_first_token=metrics.time_to_first_token.snapshot(),
+                )
+                for (provider, model), metrics in self._models.items()
+            ]
+
+    def prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format, to serve from a `/metrics` endpoint."""
+        lines = []
+
+        def family(name: str, kind: str, help: str) -> None:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, labels: str, histogram: Histogram) -> None:
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {_format_number(histogram.sum)}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        with self._lock:
+            models = [
+                (_labels(provider=provider, model=model), metrics)
+                for (provider, model), metrics in self._models.items()
+            ]
+
+            family("llmloader_requests_total", "counter", "Model calls, including failed ones.")
+            for labels, metrics in models:
+                lines.append(f"llmloader_requests_total{{{labels}}} {metrics.requests}")
+
+            family("llmloader_errors_total", "counter", "Failed model calls by error type.")
+            for labels, metrics in models:
+                for error, count in metrics.errors.items():
+                    lines.append(f"llmloader_errors_total{{{labels},{_labels(error=error)}}} {count}")
+
+            family("llmloader_tokens_total", "counter", "Tokens used by successful model calls.")
+            for labels, metrics in models:
+                lines.append(f'llmloader_tokens_total{{{labels},type="input"}} {metrics.input_tokens}')
+                lines.append(f'llmloader_tokens_total{{{labels},type="output"}} {metrics.output_tokens}')
+
+            family("llmloader_request_duration_seconds", "histogram", "Latency of successful model calls.")
+            for labels, metrics in models:
+                histogram("llmloader_request_duration_seconds", labels, metrics.latency)
+
+            family("llmloader_time_to_first_token_seconds", "histogram", "Time to the first token of streamed calls.")
+            for labels, metrics in models:
+                # models which were never streamed have no time to first token
+                if metrics.time_to_first_token.count:
+                    histogram("llmloader_time_to_first_token_seconds", labels, metrics.time_to_first_token)
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Forgets every recorded call."""
+        with self._lock:
+            self._models.clear()
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _labels(**labels: str) -> str:
+    escaped = {
+        name: value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for name, value in labels.items()
+    }
+    return ",".join(f'{name}="{value}"' for name, value in escaped.items())
+
+
+default_metrics = Metrics()
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """Records the latency, time to first token, token usage and errors of each call of a model in `Metrics`.
+
+    Args:
+        metrics: Where to record the calls.
+        provider: The provider label, e.g. the name of the loader of the model.
+        model: The model label.
+    """
+
+    # called directly in async code too, rather than in a thread, as it only updates counters
+    run_inline = True
+
+    def __init__(self, metrics: Metrics, provider: str, model: str):
+        self.metrics = metrics
+        self.provider = provider
+        self.model = model
+        self._starts: dict[UUID, float] = {}
+        self._first_tokens: dict[UUID, float] = {}
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if token and run_id not in self._first_tokens:
+            self._first_tokens[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        from .wrappers import LLMWrapper
+
+        end = time.perf_counter()
+        start = self._starts.pop(run_id, None)
+        first_token = self._first_tokens.pop(run_id, None)
+        if start is None:
+            return
+
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                usage = LLMWrapper.get_token_count(message.response_metadata)
+                if not usage["total_tokens"] and getattr(message, "usage_metadata", None):
+                    usage = message.usage_metadata
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+
+        self.metrics.record(
+            self.provider,
+            self.model,
+            end - start,
+            None if first_token is None else first_token - start,
+            input_tokens,
+            output_tokens,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts.pop(run_id, None)
+        self._first_tokens.pop(run_id, None)
+        self.metrics.record_error(self.provider, self.model, error)
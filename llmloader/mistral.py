@@ -1,9 +1,16 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class MistralLoader(Loader):
+    prefixes = ('mistral', 'pixtral', 'codestral', 'ministral', 'open-mistral')
+
     def __call__(
         self,
         model: str,
@@ -13,7 +20,7 @@ class MistralLoader(Loader):
         **kwargs,
     ) -> BaseChatModel | None:
 
-        if not model.startswith(('mistral', 'pixtral', 'codestral', 'ministral', 'open-mistral')):
+        if not model.startswith(self.prefixes):
             return None
 
         if self.has_endpoint(kwargs=kwargs):
@@ -1,9 +1,17 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class OpenAILoader(Loader):
+    prefixes = ('gpt', 'o1-')
+    supports_http_client = True
+
     def __call__(
         self,
         model: str,
@@ -13,7 +21,7 @@ class OpenAILoader(Loader):
         **kwargs,
     ) -> BaseChatModel | None:
 
-        if not model.startswith(('gpt', 'o1-')):
+        if not model.startswith(self.prefixes):
             return None
 
         from langchain_openai import ChatOpenAI
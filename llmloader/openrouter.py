@@ -1,9 +1,17 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class OpenRouterLoader(Loader):
+    uses_endpoint = True
+    supports_http_client = True
+
     def __call__(
         self,
         model: str,
@@ -0,0 +1,102 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any, NamedTuple
+
+
+class PrefixCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+
+def cache_nbytes(past_key_values: Any) -> int:
+    """Returns the number of bytes of tensors held by a transformers cache or a legacy tuple of tensors."""
+    if hasattr(past_key_values, "nbytes") and hasattr(past_key_values, "element_size"):
+        return past_key_values.element_size() * past_key_values.nelement()
+    if isinstance(past_key_values, (list, tuple)):
+        return sum(cache_nbytes(item) for item in past_key_values)
+    if hasattr(past_key_values, "layers"):  # transformers >= 4.56
+        return sum(cache_nbytes((layer.keys, layer.values)) for layer in past_key_values.layers)
+    if hasattr(past_key_values, "key_cache"):
+        return cache_nbytes(past_key_values.key_cache) + cache_nbytes(past_key_values.value_cache)
+    return 0
+
+
+def token_hash(token_ids: Sequence[int], namespace: str = "") -> str:
+    """Returns a hash of a sequence of token ids within a namespace, e.g. the model they are run through."""
+    text = namespace + "\0" + ",".join(map(str, token_ids))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PrefixCache:
+    """An LRU cache of the attention keys and values (`past_key_values`) computed for prompt prefixes.
+
+    Entries are keyed by a hash of the token ids of the prefix and the model which computed them, and evicted, least recently used first,
+    when the total size of the cached tensors exceeds `max_bytes`.
+
+    Args:
+        max_bytes: The maximum number of bytes of cached tensors.
+    """
+
+    def __init__(self, max_bytes: int = 2**30):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, token_ids: Sequence[int], model: str = "") -> Any | None:
+        """Returns a copy of the cached keys and values for a prefix, or None if it is not cached.
+
+        A copy is returned because generation extends the cache in place.
+
+        Args:
+            token_ids: The token ids of the prefix.
+            model: The identity of the model, so that a cache shared by several models never mixes their entries.
+        """
+        key = token_hash(token_ids, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            past_key_values = entry[0]
+        return copy.deepcopy(past_key_values)
+
+    def put(self, token_ids: Sequence[int], past_key_values: Any, model: str = "") -> None:
+        """Stores the keys and values a model computed for a prefix, evicting older entries to stay within the budget."""
+        key = token_hash(token_ids, model)
+        size = cache_nbytes(past_key_values)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (past_key_values, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self) -> None:
+        """Removes all cached prefixes."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self) -> PrefixCacheInfo:
+        """Returns the hit and miss statistics and the size of the cache."""
+        with self._lock:
+            return PrefixCacheInfo(self.hits, self.misses, len(self._entries), self._bytes, self.max_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
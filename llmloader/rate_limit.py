@@ -0,0 +1,302 @@
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, NamedTuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from .sqlite import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    seen REAL NOT NULL
+);
+"""
+
+DEFAULT_PATH = Path(tempfile.gettempdir()) / "llmloader-rate-limits.sqlite"
+# A waiter which has not polled for this many seconds is assumed to be gone, e.g. because its process was killed
+STALE_AFTER = 10.0
+# The longest a waiter sleeps between polls, so that it is never mistaken for a stale one
+MAX_SLEEP = 1.0
+
+# The model run which is about to take a request, set by `RateLimitCallback` when the run starts. LangChain takes the
+# request in the same thread or task without passing the run, and skips it for cached responses.
+_starting_run: ContextVar[UUID | None] = ContextVar("llmloader_starting_run", default=None)
+
+
+class RateLimitInfo(NamedTuple):
+    requests: float
+    tokens: float
+    waiting: int
+
+
+class RateLimiter(BaseRateLimiter):
+    """A token bucket rate limiter for requests and tokens per minute, shared by every thread and process on the host.
+
+    The buckets are kept in a SQLite file, so all processes which use a limiter with the same `name` and `path`
+    draw from the same budget. Callers wait in a first come, first served queue in the same file.
+
+    Each request takes one request and reserves `estimated_tokens` tokens. When the response arrives, its actual
+    token usage is settled by `RateLimitCallback`: unused tokens are returned to the bucket and extra tokens are
+    taken from it, which can leave it in debt so that later requests wait.
+
+    Use it with `llmloader.load(..., rate_limit=...)`, or set it as the `rate_limiter` of a LangChain chat model and
+    add `RateLimitCallback(limiter)` to its callbacks.
+
+    Args:
+        requests_per_minute: The maximum number of requests per minute. If None then requests are not limited.
+        tokens_per_minute: The maximum number of tokens per minute. If None then tokens are not limited.
+        name: The name of the budget in the file, e.g. the model and API key it applies to.
+        path: The path of the SQLite file. The default is shared by every process of the user.
+        estimated_tokens: The number of tokens reserved by each request until its usage is known.
+        poll_interval: The number of seconds between checks while waiting behind other callers.
+        timeout: The number of seconds to wait for another process to finish updating the file.
+        clock: The wall clock, which is shared between processes. Replaceable for testing.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        name: str = "default",
+        path: Path | str = DEFAULT_PATH,
+        estimated_tokens: int = 500,
+        poll_interval: float = 0.05,
+        timeout: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        if requests_per_minute is None and tokens_per_minute is None:
+            raise ValueError("Give requests_per_minute, tokens_per_minute or both")
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.name = name
+        self.path = Path(path)
+        self.estimated_tokens = estimated_tokens
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.clock = clock
+        self._connection = SQLiteConnections(self.path, timeout)
+        self._reserved: set[UUID] = set()
+        self._reserved_lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    @property
+    def _reservation(self) -> float:
+        # a request larger than the whole budget could never start, so it waits for a full bucket at most
+        if self.tokens_per_minute is None:
+            return 0.0
+        return min(self.estimated_tokens, self.tokens_per_minute)
+
+    def _refill(self, connection: sqlite3.Connection, now: float) -> tuple[float, float]:
+        """Returns the requests and tokens in the buckets after refilling them for the time since the last update."""
+        row = connection.execute(
+            "SELECT requests, tokens, updated FROM buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is None:
+            return float(self.requests_per_minute or 0), float(self.tokens_per_minute or 0)
+        requests, tokens, updated = row
+        elapsed = max(now - updated, 0.0)
+        if self.requests_per_minute is not None:
+            requests = min(self.requests_per_minute, requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute is not None:
+            tokens = min(self.tokens_per_minute, tokens + elapsed * self.tokens_per_minute / 60)
+        return requests, tokens
+
+    def _store(self, connection: sqlite3.Connection, requests: float, tokens: float, now: float) -> None:
+        connection.execute(
+            "INSERT INTO buckets (name, requests, tokens, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET requests = excluded.requests, tokens = excluded.tokens, "
+            "updated = excluded.updated",
+            (self.name, requests, tokens, now),
+        )
+
+    def _wait_time(self, requests: float, tokens: float) -> float:
+        wait = 0.0
+        if self.requests_per_minute is not None and requests < 1:
+            wait = max(wait, (1 - requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute is not None and tokens < self._reservation:
+            wait = max(wait, (self._reservation - tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+    def _attempt(self, ticket: int | None) -> float:
+        """Takes a request and reserves tokens if the caller is first in the queue and the buckets allow it.
+
+        Args:
+            ticket: The caller's place in the queue, or None to only succeed if nobody is waiting.
+
+        Returns:
+            float: 0 if the request was taken, otherwise the number of seconds to wait before trying again.
+        """
+        now = self.clock()
+        with self._connection.transaction() as connection:
+            if ticket is not None:
+                updated = connection.execute("UPDATE waiters SET seen = ? WHERE ticket = ?", (now, ticket)).rowcount
+                if not updated:
+                    # another process removed this waiter as stale after a long pause, so it takes its place back
+                    connection.execute(
+                        "INSERT INTO waiters (ticket, name, seen) VALUES (?, ?, ?)", (ticket, self.name, now)
+                    )
+            connection.execute("DELETE FROM waiters WHERE seen < ?", (now - STALE_AFTER,))
+            head = connection.execute("SELECT MIN(ticket) FROM waiters WHERE name = ?", (self.name,)).fetchone()[0]
+            requests, tokens = self._refill(connection, now)
+
+            if head != ticket:
+                wait = self.poll_interval
+            else:
+                wait = self._wait_time(requests, tokens)
+                if wait == 0:
+                    if self.requests_per_minute is not None:
+                        requests -= 1
+                    tokens -= self._reservation
+                    self._store(connection, requests, tokens, now)
+                    if ticket is not None:
+                        connection.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+        return wait
+
+    def _record_reservation(self) -> None:
+        run_id = _starting_run.get()
+        if run_id is not None:
+            _starting_run.set(None)
+            with self._reserved_lock:
+                self._reserved.add(run_id)
+
+    def _pop_reservation(self, run_id: UUID) -> bool:
+        """Returns whether the run took a request from this limiter, so that it has tokens to settle."""
+        with self._reserved_lock:
+            if run_id in self._reserved:
+                self._reserved.remove(run_id)
+                return True
+            return False
+
+    def _enqueue(self) -> int:
+        cursor = self._connection().execute("INSERT INTO waiters (name, seen) VALUES (?, ?)", (self.name, self.clock()))
+        return cursor.lastrowid
+
+    def _leave(self, ticket: int) -> None:
+        self._connection().execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        """Takes a request from the budget, waiting in the queue until it is available if `blocking`.
+
+        Returns:
+            bool: Whether the request was taken.
+        """
+        if not blocking:
+            taken = self._attempt(None) == 0
+            if taken:
+                self._record_reservation()
+            return taken
+
+        ticket = self._enqueue()
+        try:
+            while (wait := self._attempt(ticket)) > 0:
+                time.sleep(min(wait, MAX_SLEEP))
+        except BaseException:
+            self._leave(ticket)
+            raise
+        self._record_reservation()
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        """Takes a request from the budget without blocking the event loop. See `acquire`."""
+        if not blocking:
+            taken = self._attempt(None) == 0
+            if taken:
+                self._record_reservation()
+            return taken
+
+        ticket = self._enqueue()
+        try:
+            while (wait := self._attempt(ticket)) > 0:
+                await asyncio.sleep(min(wait, MAX_SLEEP))
+        except BaseException:
+            self._leave(ticket)
+            raise
+        self._record_reservation()
+        return True
+
+    def settle(self, tokens: int) -> None:
+        """Replaces the tokens reserved by a request with the number it actually used."""
+        if self.tokens_per_minute is None:
+            return
+        difference = self._reservation - tokens
+        if difference == 0:
+            return
+
+        now = self.clock()
+        with self._connection.transaction() as connection:
+            requests, available = self._refill(connection, now)
+            self._store(connection, requests, min(available + difference, self.tokens_per_minute), now)
+
+    def info(self) -> RateLimitInfo:
+        """Returns the requests and tokens available now and the number of callers waiting."""
+        connection = self._connection()
+        requests, tokens = self._refill(connection, self.clock())
+        waiting = connection.execute("SELECT COUNT(*) FROM waiters WHERE name = ?", (self.name,)).fetchone()[0]
+        return RateLimitInfo(requests, tokens, waiting)
+
+
+class RateLimitCallback(BaseCallbackHandler):
+    """Settles the token usage of each response with a `RateLimiter`.
+
+    Only runs which took a request from the limiter are settled: cached responses, which skip the limiter, are not
+    charged, and calls which fail before taking a request do not refund tokens. Failed requests return their reserved
+    tokens, as providers do not count tokens for them.
+    """
+
+    # called in the thread or task of the model call, so that the limiter sees which run takes a request
+    run_inline = True
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        _starting_run.set(run_id)
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        _starting_run.set(run_id)
+
+    def _end(self, run_id: UUID) -> bool:
+        if _starting_run.get() == run_id:
+            _starting_run.set(None)
+        return self.limiter._pop_reservation(run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        from .wrappers import LLMWrapper
+
+        if not self._end(run_id):
+            return
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                tokens = LLMWrapper.get_token_count(message.response_metadata)["total_tokens"]
+                usage = getattr(message, "usage_metadata", None)
+                if not tokens and usage:
+                    tokens = usage.get("total_tokens", 0)
+                # without reported usage the reservation stands
+                if tokens:
+                    self.limiter.settle(tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        if self._end(run_id):
+            self.limiter.settle(0)
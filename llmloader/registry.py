@@ -0,0 +1,167 @@
+import os
+import threading
+import warnings
+from collections.abc import Iterable, Iterator
+
+from .loader import Loader
+
+ENTRY_POINT_GROUP = "llmloader.loaders"
+
+
+class PrefixTrie:
+    """A character trie mapping model name prefixes to the loaders which claim them."""
+
+    def __init__(self):
+        self.root: dict = {}
+
+    def insert(self, prefix: str, value) -> None:
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(value)
+
+    def matches(self, text: str) -> list:
+        """Returns the values of every prefix of `text`, longest prefix first."""
+        found = []
+        node = self.root
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                found.append(node[None])
+        return [value for values in reversed(found) for value in values]
+
+
+class LoaderRegistry:
+    """An index of loaders used by `llmloader.load` to pick the loaders to try for a model name.
+
+    Loaders declare the model name prefixes they handle with `Loader.prefixes` and are found with a prefix trie.
+    Loaders without prefixes are fallbacks which are tried, in list order, after any matching loaders.
+    `register` puts a new fallback ahead of the existing ones, so it is tried before catch-alls such as Azure AI.
+    Loaders can narrow the names they handle further with `Loader.accepts`.
+    Loaders which declare `uses_endpoint = False` are skipped when a custom endpoint is set.
+
+    Third-party loaders can be registered with the `llmloader.loaders` entry point group.
+    Each entry point should refer to a Loader subclass or instance. They are discovered once on first use.
+
+    Args:
+        loaders: The loaders to register initially. A list is used as is, so changes to it take effect on the next
+            lookup and registered loaders are added to it.
+        entry_point_group: The entry point group to discover third-party loaders from. If empty, no discovery is done.
+        max_cached_names: The maximum number of resolved model names to remember.
+    """
+
+    def __init__(
+        self,
+        loaders: Iterable[Loader] = (),
+        entry_point_group: str = ENTRY_POINT_GROUP,
+        max_cached_names: int = 4096,
+    ):
+        self.entry_point_group = entry_point_group
+        self.max_cached_names = max_cached_names
+        self._loaders: list[Loader] = loaders if isinstance(loaders, list) else []
+        self._indexed: tuple[Loader, ...] = ()
+        self._trie = PrefixTrie()
+        self._fallbacks: list[Loader] = []
+        self._matches: dict[str, tuple[Loader, ...]] = {}
+        self._discovered = not entry_point_group
+        self._lock = threading.RLock()
+        if loaders is self._loaders:
+            self._rebuild()
+        else:
+            for loader in loaders:
+                self.register(loader)
+
+    def register(self, loader: Loader | type[Loader]) -> Loader:
+        """Adds a loader to the registry. A Loader subclass is instantiated first."""
+        if isinstance(loader, type):
+            loader = loader()
+        if not isinstance(loader, Loader):
+            raise TypeError(f"Cannot register {loader!r} as it is not a llmloader Loader.")
+
+        with self._lock:
+            if loader.prefixes:
+                self._loaders.append(loader)
+            else:
+                fallbacks = [i for i, other in enumerate(self._loaders) if not other.prefixes]
+                self._loaders.insert(fallbacks[0] if fallbacks else len(self._loaders), loader)
+            self._rebuild()
+        return loader
+
+    def unregister(self, loader: Loader) -> None:
+        """Removes a loader from the registry."""
+        with self._lock:
+            self._loaders.remove(loader)
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._indexed = tuple(self._loaders)
+        self._trie = PrefixTrie()
+        self._fallbacks = []
+        self._matches.clear()
+        for loader in self._indexed:
+            if loader.prefixes:
+                for prefix in loader.prefixes:
+                    self._trie.insert(prefix, loader)
+            else:
+                self._fallbacks.append(loader)
+
+    def discover(self) -> None:
+        """Registers the loaders advertised through entry points. This only happens once."""
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+
+            from importlib.metadata import entry_points
+
+            for entry_point in entry_points(group=self.entry_point_group):
+                try:
+                    self.register(entry_point.load())
+                except Exception as e:
+                    warnings.warn(f"Could not register loader from entry point '{entry_point.name}': {e}", UserWarning)
+
+    def _matching(self, model: str) -> tuple[Loader, ...]:
+        # The loader list may have been edited in place since it was indexed
+        if tuple(self._loaders) != self._indexed:
+            with self._lock:
+                self._rebuild()
+        # Remember the result for each name, including names which no loader claims
+        matches = self._matches.get(model)
+        if matches is None:
+            self.discover()
+            with self._lock:
+                loaders = list(dict.fromkeys(self._trie.matches(model))) + self._fallbacks
+                matches = tuple(loader for loader in loaders if loader.accepts(model))
+                if len(self._matches) >= self.max_cached_names:
+                    self._matches.clear()
+                self._matches[model] = matches
+        return matches
+
+    def candidates(self, model: str, endpoint: str | bool = False) -> list[Loader]:
+        """Returns the loaders to try for a model name in order.
+
+        Args:
+            model: The name of the model.
+            endpoint: The custom endpoint (or whether one is set).
+        """
+        loaders = list(self._matching(model))
+        if endpoint:
+            loaders = [loader for loader in loaders if loader.uses_endpoint is not False]
+        return loaders
+
+    def resolve(self, model: str, endpoint: str = "") -> Loader | None:
+        """Returns the loader which would be tried first for a model without constructing anything.
+
+        If no endpoint is given, the `CUSTOM_ENDPOINT` environment variable is used.
+        """
+        endpoint = endpoint or os.getenv("CUSTOM_ENDPOINT", "")
+        candidates = self.candidates(model, endpoint=endpoint)
+        return candidates[0] if candidates else None
+
+    def __iter__(self) -> Iterator[Loader]:
+        return iter(list(self._loaders))
+
+    def __len__(self) -> int:
+        return len(self._loaders)
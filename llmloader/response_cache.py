@@ -0,0 +1,164 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from .sqlite import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes';
+END;
+"""
+
+
+class ResponseCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+    max_bytes: int
+
+
+def serialize(generations: RETURN_VAL_TYPE) -> bytes:
+    """Serializes the generations of a response to compressed JSON."""
+    items = []
+    for generation in generations:
+        item = dict(text=generation.text, generation_info=generation.generation_info)
+        if isinstance(generation, ChatGeneration):
+            item["message"] = message_to_dict(generation.message)
+        items.append(item)
+    return zlib.compress(json.dumps(items).encode("utf-8"))
+
+
+def deserialize(value: bytes) -> list[Generation]:
+    """Restores the generations of a response serialized with `serialize`."""
+    generations = []
+    for item in json.loads(zlib.decompress(value)):
+        if "message" in item:
+            (message,) = messages_from_dict([item["message"]])
+            generations.append(ChatGeneration(message=message, generation_info=item["generation_info"]))
+        else:
+            generations.append(Generation(text=item["text"], generation_info=item["generation_info"]))
+    return generations
+
+
+def response_key(prompt: str, llm_string: str) -> str:
+    """Returns the content address of a response: a hash of the model configuration and the serialized messages.
+
+    LangChain serializes the model name and generation parameters into `llm_string` and the messages,
+    including any base64 encoded images, into `prompt`.
+    """
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache(BaseCache):
+    """A persistent cache of model responses in a single SQLite file.
+
+    Set it as the `cache` of a LangChain model, or use `llmloader.load(..., cache="path")`, so that repeated
+    calls with the same model configuration and messages are answered from disk.
+    Responses are stored as zlib compressed JSON. When the compressed responses exceed `max_bytes`,
+    the least recently used are evicted. Several threads and processes can share the same file.
+
+    Args:
+        path: The path of the SQLite database file. It is created if it does not exist.
+        max_bytes: The maximum number of bytes of compressed responses to keep.
+        timeout: The number of seconds to wait for another process to finish writing.
+    """
+
+    def __init__(self, path: Path | str, max_bytes: int = 2**30, timeout: float = 30.0):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._connection = SQLiteConnections(self.path, timeout)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        """Returns the cached generations for the messages and model configuration, or None."""
+        key = response_key(prompt, llm_string)
+        connection = self._connection()
+        row = connection.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            self.hits += 1
+        return deserialize(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Stores the generations for the messages and model configuration and evicts old responses if needed."""
+        key = response_key(prompt, llm_string)
+        value = serialize(return_val)
+        if len(value) > self.max_bytes:
+            return
+
+        # an immediate transaction takes the write lock so that concurrent processes evict consistently
+        with self._connection.transaction() as connection:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            connection.execute(
+                "INSERT INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        excess = self._bytes(connection) - self.max_bytes
+        if excess <= 0:
+            return
+
+        keys = []
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    @staticmethod
+    def _bytes(connection: sqlite3.Connection) -> int:
+        return connection.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+    def clear(self, **kwargs: Any) -> None:
+        """Removes all cached responses."""
+        self._connection().execute("DELETE FROM responses")
+
+    def info(self) -> ResponseCacheInfo:
+        """Returns the hit and miss counts of this process and the size of the cache."""
+        connection = self._connection()
+        entries = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return ResponseCacheInfo(self.hits, self.misses, entries, self._bytes(connection), self.max_bytes)
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
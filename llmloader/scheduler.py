@@ -0,0 +1,104 @@
+import asyncio
+import weakref
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+
+class BatchScheduler:
+    """Gathers concurrent asynchronous requests into batches which are processed together on a worker thread.
+
+    A batch is started as soon as `max_batch_size` requests are waiting or the first request in the batch
+    has waited for `max_wait` seconds. Batches are processed one at a time on a single worker thread
+    so that the event loop is never blocked by the model. Each event loop has its own queue, so requests from
+    different loops, e.g. a synchronous `batch` running next to async calls, are never mixed up.
+
+    Args:
+        process: A function which takes a list of requests and returns a list of results in the same order.
+        max_batch_size: The maximum number of requests in a batch.
+        max_wait: The maximum number of seconds to wait for more requests before starting a batch.
+    """
+
+    def __init__(self, process: Callable[[list], list], max_batch_size: int = 8, max_wait: float = 0.01):
+        self.process = process
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self.last_batch_size = 0
+        self.last_wait = 0.0
+        self.total_wait = 0.0
+        self._queues: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Queue] = weakref.WeakKeyDictionary()
+        self._workers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task] = weakref.WeakKeyDictionary()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="BatchScheduler")
+
+    async def submit(self, request: Any) -> Any:
+        """Adds a request to the queue and waits for its result."""
+        loop = asyncio.get_running_loop()
+        # The queue belongs to the event loop it was created in
+        queue = self._queues.get(loop)
+        if queue is None:
+            queue = self._queues[loop] = asyncio.Queue()
+
+        future = loop.create_future()
+        queue.put_nowait((request, future, loop.time()))
+        worker = self._workers.get(loop)
+        if worker is None or worker.done():
+            self._workers[loop] = loop.create_task(self._run(queue))
+        return await future
+
+    async def _next_batch(self, queue: asyncio.Queue) -> list[tuple[Any, asyncio.Future, float]]:
+        loop = asyncio.get_running_loop()
+        batch = [queue.get_nowait()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        # The worker stops when the queue is empty and is started again by the next request
+        loop = asyncio.get_running_loop()
+        while not queue.empty():
+            batch = [item for item in await self._next_batch(queue) if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            started = loop.time()
+            self.batches += 1
+            self.requests += len(batch)
+            self.last_batch_size = len(batch)
+            self.last_wait = started - batch[0][2]
+            self.total_wait += sum(started - enqueued for _, _, enqueued in batch)
+
+            try:
+                results = await loop.run_in_executor(self._executor, self.process, [item[0] for item in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def metrics(self) -> dict:
+        """Returns a snapshot of the queue depth, batch sizes and waiting times (in seconds)."""
+        return {
+            "queue_depth": sum(queue.qsize() for queue in list(self._queues.values())),
+            "batches": self.batches,
+            "requests": self.requests,
+            "last_batch_size": self.last_batch_size,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "last_wait": self.last_wait,
+            "mean_wait": self.total_wait / self.requests if self.requests else 0.0,
+        }
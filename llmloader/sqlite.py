@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class SQLiteConnections:
+    """The connections to a SQLite database file shared by the threads and processes of a machine.
+
+    SQLite connections cannot be shared between threads or across a fork, so each thread of each process opens its
+    own when it first calls this object. The connections are in autocommit mode and use write-ahead logging, so
+    readers do not block the writer. Group writes with `transaction`.
+
+    Args:
+        path: The path of the database file.
+        timeout: The number of seconds to wait for another process to finish writing.
+    """
+
+    def __init__(self, path: Path | str, timeout: float = 30.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Runs the statements of the block in an immediate transaction, which is rolled back if the block fails.
+
+        An immediate transaction takes the write lock at once, so concurrent processes see consistent reads.
+        """
+        connection = self()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
@@ -0,0 +1,232 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .sqlite import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    bucket INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    PRIMARY KEY (bucket, model, provider)
+);
+"""
+
+UPSERT = """
+INSERT INTO usage (bucket, model, provider, requests, input_tokens, output_tokens, total_tokens)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (bucket, model, provider) DO UPDATE SET
+    requests = requests + excluded.requests,
+    input_tokens = input_tokens + excluded.input_tokens,
+    output_tokens = output_tokens + excluded.output_tokens,
+    total_tokens = total_tokens + excluded.total_tokens
+"""
+
+BUCKET_SECONDS = 3600
+PERIODS = {"hour": 3600, "day": 86400}
+GROUPS = ("model", "provider", "period")
+COUNTS = ("requests", "input_tokens", "output_tokens", "total_tokens")
+
+
+def to_timestamp(value: datetime | str | float | None) -> float | None:
+    """Converts a datetime, an ISO 8601 string or a Unix timestamp to a Unix timestamp. Naive datetimes are UTC."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class UsageLedger:
+    """Accumulates token usage in memory and adds it to a SQLite database in batches.
+
+    Usage is totalled per model, per provider and per hour. Recording only updates in-memory totals,
+    so it is cheap and safe to call from many threads and from async code. The totals are added to the database
+    on a background thread once `flush_size` records are pending or `flush_interval` seconds have passed,
+    and when the process exits. Several processes can record to the same database.
+
+    Args:
+        path: The path of the SQLite database file. It is created if it does not exist.
+        flush_size: The number of pending records which triggers a flush.
+        flush_interval: The number of seconds after which pending records are flushed by the next record.
+        timeout: The number of seconds to wait for another process to finish writing.
+    """
+
+    def __init__(self, path: Path | str, flush_size: int = 100, flush_interval: float = 5.0, timeout: float = 30.0):
+        self.path = Path(path)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._pending: defaultdict[tuple[int, str, str], list[int]] = defaultdict(lambda: [0, 0, 0, 0])
+        self._pending_records = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="UsageLedger")
+
+        self._connection = SQLiteConnections(self.path, timeout)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+        atexit.register(self.flush)
+
+    def record(
+        self,
+        model: str,
+        provider: str = "",
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        total_tokens: int = 0,
+        when: float | None = None,
+    ) -> None:
+        """Adds the token usage of one request.
+
+        Args:
+            model: The name of the model.
+            provider: The model provider, e.g. "openai".
+            input_tokens: The number of input tokens.
+            output_tokens: The number of output tokens.
+            total_tokens: The total number of tokens. If 0 then it is the sum of the input and output tokens.
+            when: The Unix timestamp of the request. If None then the current time is used.
+        """
+        now = time.time() if when is None else when
+        bucket = int(now // BUCKET_SECONDS * BUCKET_SECONDS)
+        total_tokens = total_tokens or input_tokens + output_tokens
+
+        with self._lock:
+            counts = self._pending[(bucket, model or "", provider or "")]
+            counts[0] += 1
+            counts[1] += input_tokens
+            counts[2] += output_tokens
+            counts[3] += total_tokens
+            self._pending_records += 1
+            due = self._pending_records >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush(wait=False)
+
+    def flush(self, wait: bool = True) -> Future:
+        """Adds the pending usage to the database on the background thread.
+
+        Args:
+            wait: Whether to wait until the usage has been written.
+
+        Returns:
+            Future: Completes when the usage has been written.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = defaultdict(lambda: [0, 0, 0, 0])
+            self._pending_records = 0
+            self._last_flush = time.monotonic()
+
+        try:
+            future = self._executor.submit(self._write, pending)
+        except RuntimeError:
+            # the executor no longer accepts work while the interpreter shuts down
+            future = Future()
+            future.set_result(self._write(pending))
+        if wait:
+            future.result()
+        return future
+
+    def _write(self, pending: dict[tuple[int, str, str], list[int]]) -> None:
+        if not pending:
+            return
+        rows = [(*key, *counts) for key, counts in pending.items()]
+        with self._write_lock, self._connection.transaction() as connection:
+            connection.executemany(UPSERT, rows)
+
+    def totals(
+        self,
+        by: tuple[str, ...] | list[str] = ("model",),
+        since: datetime | str | float | None = None,
+        until: datetime | str | float | None = None,
+        model: str | None = None,
+        provider: str | None = None,
+        period: str = "day",
+    ) -> list[dict]:
+        """Returns the token usage totals, summed in the database.
+
+        Args:
+            by: The columns to group by: any of "model", "provider" and "period". If empty, a single total is returned.
+            since: Only include usage from this time onwards (as a datetime, ISO 8601 string or Unix timestamp).
+                Usage is stored per hour so times are compared with the start of each hour.
+            until: Only include usage before this time.
+            model: Only include this model.
+            provider: Only include this provider.
+            period: The length of each period when grouping by "period": "hour" or "day" (UTC).
+
+        Returns:
+            list[dict]: One dictionary for each group with the group columns, "requests", "input_tokens",
+                "output_tokens" and "total_tokens". When grouping by period, its start is an ISO 8601 string.
+        """
+        unknown = set(by) - set(GROUPS)
+        if unknown:
+            raise ValueError(f"Cannot group usage by {', '.join(sorted(unknown))}. Choose from: {', '.join(GROUPS)}")
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}'. Choose from: {', '.join(PERIODS)}")
+
+        self.flush()
+
+        columns = {
+            "model": "model",
+            "provider": "provider",
+            "period": f"bucket - bucket % {PERIODS[period]}",
+        }
+        conditions, parameters = [], []
+        for condition, value in (
+            ("bucket >= ?", to_timestamp(since)),
+            ("bucket < ?", to_timestamp(until)),
+            ("model = ?", model),
+            ("provider = ?", provider),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+
+        groups = [f"{columns[name]} AS {name}" for name in by]
+        sums = [f"SUM({name}) AS {name}" for name in COUNTS]
+        query = f"SELECT {', '.join(groups + sums)} FROM usage"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if by:
+            query += f" GROUP BY {', '.join(by)} ORDER BY {', '.join(by)}"
+
+        cursor = self._connection().cursor()
+        cursor.row_factory = sqlite3.Row
+        rows = [dict(row) for row in cursor.execute(query, parameters)]
+
+        results = []
+        for row in rows:
+            if row["requests"] is None:
+                continue  # no usage matches
+            if "period" in row:
+                row["period"] = datetime.fromtimestamp(row["period"], tz=timezone.utc).isoformat()
+            results.append(row)
+        return results
+
+
+_ledgers: dict[str, UsageLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_ledger(path: Path | str) -> UsageLedger:
+    """Returns the ledger for a database file, shared by every caller in the process."""
+    path = os.path.abspath(os.path.expanduser(path))
+    with _ledgers_lock:
+        if path not in _ledgers:
+            _ledgers[path] = UsageLedger(path)
+        return _ledgers[path]
@@ -0,0 +1,173 @@
+import gc
+import sys
+import threading
+import warnings
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, NamedTuple
+
+
+class WeightKey(NamedTuple):
+    model_name: str
+    dtype: str
+    quantization: str
+    device: str
+    options: tuple = ()
+
+
+class WeightEntry:
+    def __init__(self, model, tokenizer, size: int):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.size = size
+        self.references = 0
+
+
+def memory_footprint(model) -> int:
+    """Returns the number of bytes used by the parameters and buffers of a model."""
+    try:
+        return int(model.get_memory_footprint())
+    except Exception:
+        return 0
+
+
+def free_memory() -> None:
+    """Runs the garbage collector and returns cached GPU memory to the device if torch is in use."""
+    gc.collect()
+
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class WeightRegistry:
+    """A process-wide registry of loaded Hugging Face models and tokenizers.
+
+    Every load of the same (model name, dtype, quantization, device) shares one copy of the weights.
+    The registry counts the references held by loaded pipelines. By default, weights are freed as soon as the last
+    model using them is deleted. With a memory budget, weights which are no longer referenced stay available for
+    reuse until the budget is exceeded, then the least recently used are evicted.
+
+    Args:
+        memory_budget: The number of bytes of unused weights to keep. If 0 then unused weights are freed at once,
+            and if None then they are never evicted.
+    """
+
+    def __init__(self, memory_budget: int | None = 0):
+        self.memory_budget = memory_budget
+        self._entries: OrderedDict[WeightKey, WeightEntry] = OrderedDict()
+        self._pending: dict[WeightKey, threading.Lock] = {}
+        self._lock = threading.RLock()
+
+    def acquire(self, key: WeightKey, factory: Callable[[], tuple[Any, Any]]) -> tuple[Any, Any]:
+        """Returns the model and tokenizer for `key`, loading them with `factory` if necessary.
+
+        Each call adds a reference which should be given back with `release`.
+        Concurrent requests for the same missing key wait for a single load, and loads of other keys are not blocked.
+        """
+        with self._lock:
+            if key in self._entries:
+                return self._reference(key)
+            key_lock = self._pending.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._reference(key)
+
+            try:
+                model, tokenizer = factory()
+            except BaseException:
+                with self._lock:
+                    self._pending.pop(key, None)
+                raise
+
+            with self._lock:
+                self._pending.pop(key, None)
+                self._entries[key] = WeightEntry(model, tokenizer, memory_footprint(model))
+                return self._reference(key)
+
+    def _reference(self, key: WeightKey) -> tuple[Any, Any]:
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        entry.references += 1
+        self._evict()
+        return entry.model, entry.tokenizer
+
+    def release(self, key: WeightKey) -> None:
+        """Removes a reference to the weights for `key` and evicts unused weights if over the memory budget."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.references = max(entry.references - 1, 0)
+            evicted = self._evict()
+        if evicted:
+            free_memory()
+
+    def set_memory_budget(self, memory_budget: int | None) -> None:
+        """Changes the memory budget and evicts unused weights beyond it."""
+        with self._lock:
+            self.memory_budget = memory_budget
+            evicted = self._evict()
+        if evicted:
+            free_memory()
+
+    def _evict(self) -> int:
+        if self.memory_budget is None:
+            return 0
+
+        evicted = 0
+        for key in list(self._entries):
+            # a budget of 0 keeps no unused weights, including those whose size is not known
+            if self.memory_budget and self.total_size() <= self.memory_budget:
+                break
+            if self._entries[key].references == 0:
+                del self._entries[key]
+                evicted += 1
+        return evicted
+
+    def unload(self, model_name: str | None = None) -> int:
+        """Removes weights from the registry and frees their memory.
+
+        Args:
+            model_name: The model to unload. If None then all models are unloaded.
+
+        Returns:
+            The number of registry entries removed.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if model_name is None or key.model_name == model_name]
+            in_use = [key.model_name for key in keys if self._entries[key].references]
+            for key in keys:
+                entry = self._entries.pop(key)
+                entry.model = None
+                entry.tokenizer = None
+
+        if in_use:
+            warnings.warn(
+                f"Unloaded weights which are still used by loaded models: {', '.join(in_use)}. "
+                "Their memory is freed once those models are deleted.",
+                UserWarning,
+                stacklevel=2,
+            )
+        free_memory()
+        return len(keys)
+
+    def total_size(self) -> int:
+        """Returns the number of bytes of weights held by the registry."""
+        return sum(entry.size for entry in self._entries.values())
+
+    def references(self, key: WeightKey) -> int:
+        """Returns the number of loaded pipelines using the weights for `key`."""
+        entry = self._entries.get(key)
+        return entry.references if entry else 0
+
+    def __contains__(self, key: WeightKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+default_weight_registry = WeightRegistry()
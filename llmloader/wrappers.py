@@ -1,9 +1,16 @@
+from __future__ import annotations
+
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import yaml
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import AIMessage
 
+from .images import ImageLimits
+
+if TYPE_CHECKING:
+    from .images import ImageSource
+
 __all__ = ["LLMWrapper"]
 
 
@@ -32,14 +39,28 @@ class LLMWrapper:
         "image": IMAGE_FORMATTERS,
     }
 
+    # The largest images each provider uses, from their documentation: (long side, short side, bytes).
+    # Providers downscale larger images themselves, so the extra pixels only cost bandwidth and latency.
+    IMAGE_LIMITS = {
+        "ChatOpenAI": ImageLimits(2048, 768, 20 * 2**20),
+        "AzureAIChatCompletionsModel": ImageLimits(2048, 768, 20 * 2**20),
+        "ChatAnthropic": ImageLimits(1568, None, 5 * 2**20),
+        "ChatGoogleGenerativeAI": ImageLimits(3072, None, 20 * 2**20),
+        "ChatMistralAI": ImageLimits(1024, None, 10 * 2**20),
+        "ChatXAI": ImageLimits(2048, None, 10 * 2**20),
+        "default": ImageLimits(2048, None, 20 * 2**20),
+    }
+
     @staticmethod
-    def format(llm: BaseChatModel, data_type: str, data: dict) -> dict:
+    def format(llm: BaseChatModel, data_type: str, data: dict, resize: bool = False) -> dict:
         """Format data according to the specific LLM's requirements.
 
         Args:
             llm: The language model instance to format data for.
             data_type: The type of data to format (e.g., "image").
             data: The data dictionary containing the information to format.
+            resize: Whether to downscale and recompress images larger than the LLM's limits in `IMAGE_LIMITS`.
+                The bytes saved are counted in `llmloader.images.default_resize_stats`.
 
         Returns:
             A formatted dictionary compatible with the specified LLM.
@@ -54,22 +75,91 @@ class LLMWrapper:
         formatter = formatters.get(llm_class_name, None)
         if formatter is None:
             formatter = LLMWrapper.IMAGE_FORMATTERS["default"]
+        if resize and data_type == "image":
+            data = LLMWrapper.resize_image(llm, data)
         return formatter(data)
 
+    @staticmethod
+    def image_limits(llm: BaseChatModel) -> ImageLimits:
+        """Returns the largest image the LLM uses, from `IMAGE_LIMITS`."""
+        return LLMWrapper.IMAGE_LIMITS.get(llm.__class__.__name__, LLMWrapper.IMAGE_LIMITS["default"])
+
+    @staticmethod
+    def resize_image(llm: BaseChatModel, data: dict) -> dict:
+        """Downscale and recompress a base64 encoded image which is larger than the LLM's limits.
+
+        Args:
+            llm: The language model instance the image is for.
+            data: The image as a dictionary with base64 encoded "data" and "mime_type".
+
+        Returns:
+            The image dictionary, resized if it was larger than the limits.
+        """
+        import base64
+
+        from .images import downscale, encode_base64
+
+        original = base64.b64decode(data.get("data", ""))
+        resized, mime_type = downscale(original, LLMWrapper.image_limits(llm))
+        if mime_type is None:
+            return data
+        return dict(data, data=encode_base64(resized), mime_type=mime_type)
+
+    @staticmethod
+    def format_image(
+        llm: BaseChatModel,
+        image: ImageSource | list[ImageSource],
+        max_workers: int | None = None,
+        resize: bool = False,
+    ) -> dict | list[dict]:
+        """Encode and format one image or a list of images for the specific LLM.
+
+        Images can be given as file paths or bytes. The MIME type is detected from the image data.
+        Files are memory mapped and base64 encoded in chunks rather than read into memory whole,
+        and encodings are cached by the digest of the image so that repeated images are only encoded once.
+
+        Args:
+            llm: The language model instance to format the images for.
+            image: The path to an image file or the bytes of an image, or a list of them.
+            max_workers: The number of threads used to encode a list of images in parallel.
+                If None then the default of `concurrent.futures.ThreadPoolExecutor` is used.
+            resize: Whether to downscale and recompress images larger than the LLM's limits in `IMAGE_LIMITS`
+                before they are encoded. This needs Pillow. The bytes saved are counted in
+                `llmloader.images.default_resize_stats`.
+
+        Returns:
+            A formatted dictionary compatible with the specified LLM, or a list of them for a list of images.
+        """
+        from functools import partial
+
+        from .images import encode_image
+
+        encode = partial(encode_image, limits=LLMWrapper.image_limits(llm) if resize else None)
+        if not isinstance(image, list):
+            return LLMWrapper.format(llm, "image", encode(image))
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="format_image") as executor:
+            encoded = list(executor.map(encode, image))
+        return [LLMWrapper.format(llm, "image", data) for data in encoded]
+
     @staticmethod
     def get_token_count(response_metadata: AIMessage | dict, record: Path | str = "") -> dict:
-        """Track and accumulate token usage to a YAML file.
+        """Extract token usage from a response and optionally add it to a usage ledger.
 
-        Extracts token usage information from response metadata and optionally
-        accumulates it to a persistent YAML record file. If a record file path
-        is provided, reads existing token counts, adds the new usage, and writes
-        the updated totals back to the file.
+        Extracts token usage information from response metadata. If a record file path
+        is provided, the usage is added to the `llmloader.usage.UsageLedger` in that
+        SQLite file, totalled per model, per provider and per hour. Recording is cheap:
+        usage is accumulated in memory and written to the file in batches.
+        Query the totals with `llmloader.usage.get_ledger(record).totals()` or
+        `llmloader usage <path>` on the command line.
 
         Args:
             response_metadata: Dictionary containing token usage information
                 with a "token_usage" key that includes "input_tokens",
                 "output_tokens", and "total_tokens".
-            record: Optional path to the YAML file where token counts are stored.
+            record: Optional path to the SQLite file where token usage is recorded.
                 If empty string or not provided, no file persistence occurs.
                 Defaults to "".
 
@@ -86,4 +176,11 @@ class LLMWrapper:
             "output_tokens": token_usage.get("output_tokens", 0) or token_usage.get("completion_tokens", 0),
             "total_tokens": token_usage.get("total_tokens", 0) or token_usage.get("all_tokens", 0),
         }
+
+        if record:
+            from .usage import get_ledger
+
+            model = response_metadata.get("model_name") or response_metadata.get("model", "")
+            get_ledger(record).record(model, response_metadata.get("model_provider", ""), **new_record)
+
         return new_record
@@ -1,9 +1,17 @@
-from langchain_core.language_models.chat_models import BaseChatModel
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from .loader import Loader
 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
 
 class XAILoader(Loader):
+    prefixes = ('grok',)
+    supports_http_client = True
+
     def __call__(
         self,
         model: str,
@@ -13,10 +21,10 @@ class XAILoader(Loader):
         **kwargs,
     ) -> BaseChatModel | None:
 
-        if not model.startswith('grok'):
+        if not model.startswith(self.prefixes):
             return None
 
-        if self.has_endpoint(**kwargs):
+        if self.has_endpoint(kwargs=kwargs):
             return None
 
         api_key = self.get_api_key(api_key, "XAI_API_KEY")
@@ -1,8 +1,14 @@
 import contextlib
+import threading
+from typing import Any
 from unittest.mock import MagicMock, patch
 
+import httpx
+import openai
 import pytest
-from langchain_core.messages import AIMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 
 
 @contextlib.contextmanager
@@ -212,3 +218,186 @@ def openrouter_mock_setup(prompt):
     """
     with patch_llm_fn("langchain_openai.ChatOpenAI", prompt=prompt) as (mock, prompt):
         yield mock, prompt
+
+
+@pytest.fixture()
+def huggingface_mock_setup():
+    """Pytest fixture providing mocked `torch` and `transformers` modules for the HuggingFaceLoader.
+
+    Every call to `AutoModelForCausalLM.from_pretrained` returns a new mock model which reports
+    a memory footprint of 1000 bytes.
+
+    Yields:
+        tuple: A tuple containing (transformers_mock, torch_mock).
+    """
+    import sys
+
+    transformers_mock = MagicMock()
+    torch_mock = MagicMock()
+    torch_mock.cuda.is_available.return_value = False
+
+    def from_pretrained(*args, **kwargs):
+        model = MagicMock()
+        model.get_memory_footprint.return_value = 1000
+        return model
+
+    class FakePipeline:
+        # A plain object rather than a MagicMock so that the shared model does not keep a reference to it
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    transformers_mock.AutoModelForCausalLM.from_pretrained.side_effect = from_pretrained
+    transformers_mock.pipeline.side_effect = FakePipeline
+
+    with patch.dict(sys.modules, {"transformers": transformers_mock, "torch": torch_mock}):
+        yield transformers_mock, torch_mock
+
+
+def tiny_llama(hidden_size: int = 64, num_hidden_layers: int = 2, max_position_embeddings: int = 512, seed: int = 0):
+    """Builds a tiny, randomly initialised Llama model with a character-level tokenizer and a Llama 3 chat template.
+
+    It is used by the tests and, saved to disk, by the local model benchmarks, so that no files need to be downloaded.
+
+    Args:
+        hidden_size (int): The hidden size of the model.
+        num_hidden_layers (int): The number of transformer layers.
+        max_position_embeddings (int): The longest sequence the model takes.
+        seed (int): The random seed used to initialise the weights.
+
+    Returns:
+        tuple: The model, in evaluation mode, and its tokenizer.
+    """
+    import tokenizers
+    import torch
+    import transformers
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<|eot_id|>": 3, "<unk>": 4}
+    vocab.update({chr(i): len(vocab) + j for j, i in enumerate(range(32, 127))})
+    tokenizer_object = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer_object.pre_tokenizer = tokenizers.pre_tokenizers.Split(pattern="", behavior="isolated")
+    tokenizer_object.decoder = tokenizers.decoders.Fuse()
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer_object,
+        bos_token="<s>",
+        eos_token="</s>",
+        pad_token="<pad>",
+        unk_token="<unk>",
+        additional_special_tokens=["<|eot_id|>"],
+    )
+    tokenizer.chat_template = (
+        "{% for m in messages %}<s>{{ m['role'] }}: {{ m['content'] }}<|eot_id|>{% endfor %}"
+        "{% if add_generation_prompt %}<s>assistant: {% endif %}"
+    )
+
+    config = transformers.LlamaConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_hidden_layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=max_position_embeddings,
+        pad_token_id=0,
+        bos_token_id=1,
+        eos_token_id=2,
+    )
+    torch.manual_seed(seed)
+    return transformers.LlamaForCausalLM(config).eval(), tokenizer
+
+
+@pytest.fixture(scope="session")
+def tiny_llama_pipeline():
+    """Pytest fixture providing a real text generation pipeline with the `tiny_llama` model.
+
+    Sampling uses `top_k=1` so that the outputs are deterministic.
+    The tests using this fixture are skipped if `torch` or `transformers` are not installed.
+
+    Returns:
+        transformers.Pipeline: The text generation pipeline.
+    """
+    pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    pytest.importorskip("tokenizers")
+
+    model, tokenizer = tiny_llama()
+    return transformers.pipeline(
+        task="text-generation",
+        model=model,
+        tokenizer=tokenizer,
+        return_full_text=True,
+        max_new_tokens=16,
+        top_k=1,
+    )
+
+
+_scripted_lock = threading.Lock()
+
+
+class ScriptedChatModel(BaseChatModel):
+    """A chat model which answers or fails according to a script, for testing failover and load balancing.
+
+    Each call takes the next outcome from `outcomes`: an exception is raised and anything else is
+    returned as the content of the message. The last outcome is repeated once the script runs out.
+    """
+
+    model_name: str = "scripted"
+    base_url: str = ""
+    outcomes: list[Any] = ["ok"]
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _next(self) -> str:
+        # batch calls the model from several threads, which must not take the same outcome
+        with _scripted_lock:
+            outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+            self.calls += 1
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return str(outcome)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = AIMessage(content=self._next(), response_metadata={"model_name": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self._next().split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+@pytest.fixture()
+def scripted_model():
+    """Pytest fixture providing the `ScriptedChatModel` class.
+
+    Returns:
+        type: The class, to be constructed with a model name, base URL and script of outcomes.
+    """
+    return ScriptedChatModel
+
+
+class Clock:
+    """A manually advanced clock, for code which takes a `clock` function.
+
+    Args:
+        now (float): The time to start at.
+    """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def api_error(error_class, status: int, headers: dict | None = None, message: str = "error"):
+    """Builds an OpenAI SDK error for an HTTP response with the given status and headers."""
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.example.com"))
+    return error_class(message, response=response, body=None)
+
+
+def rate_limit(retry_after: str | None = None):
+    """Builds an OpenAI SDK rate limit error, optionally with a Retry-After header."""
+    headers = {"retry-after": retry_after} if retry_after else None
+    return api_error(openai.RateLimitError, 429, headers, message="rate limited")
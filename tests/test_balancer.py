@@ -0,0 +1,185 @@
+import asyncio
+import os
+import threading
+
+import openai
+import pytest
+from mocks.models import Clock, rate_limit
+
+import llmloader
+from llmloader.balancer import BalancedChatModel
+from llmloader.dummy_model import DummyChatModel
+
+
+def members(scripted_model, *outcomes):
+    """Builds a scripted member per list of outcomes, each with its own endpoint."""
+    return [
+        scripted_model(model_name="model", base_url=f"https://{name}.example.com", outcomes=list(script))
+        for name, script in zip("abcdef", outcomes)
+    ]
+
+
+def test_weighted_round_robin(scripted_model):
+    """Test that weighted round robin shares the calls in proportion to the weights, interleaved."""
+    llm = BalancedChatModel(
+        members=members(scripted_model, ["ok"], ["ok"]), weights=[2, 1], strategy="weighted_round_robin"
+    )
+
+    served = [llm.invoke("hi").response_metadata["balancer"]["member"] for _ in range(6)]
+
+    assert served == [0, 1, 0, 0, 1, 0]
+    assert [info.requests for info in llm.info()] == [4, 2]
+
+
+def test_least_outstanding(scripted_model):
+    """Test that calls go to the member with the fewest requests in flight."""
+    llm = BalancedChatModel(members=members(scripted_model, ["ok"], ["ok"], ["ok"]))
+    first, _ = llm._acquire()
+    second, _ = llm._acquire()
+    llm._release(first)
+
+    assert {first, second} == {0, 1}
+    assert llm.invoke("hi").response_metadata["balancer"]["member"] == 2
+    assert llm.invoke("hi").response_metadata["balancer"]["member"] == first
+    assert [info.outstanding for info in llm.info()] == [1 if i == second else 0 for i in range(3)]
+
+
+def test_rate_limited_member_leaves_rotation(scripted_model):
+    """Test that a rate limited member is retried elsewhere and skipped until its Retry-After has passed."""
+    clock = Clock()
+    scripted = members(scripted_model, [rate_limit("5"), "ok"], ["ok"])
+    llm = BalancedChatModel(members=scripted, strategy="weighted_round_robin", clock=clock)
+
+    results = [llm.invoke("hi").response_metadata["balancer"] for _ in range(3)]
+
+    assert [result["member"] for result in results] == [1, 1, 1]
+    assert results[0]["endpoint"] == "b.example.com"
+    assert llm.info()[0].rate_limited == 1
+    assert llm.info()[0].cooling_for == 5
+
+    clock.now = 5
+    served = {llm.invoke("hi").response_metadata["balancer"]["member"] for _ in range(2)}
+    assert served == {0, 1}
+
+
+def test_every_member_rate_limited(scripted_model):
+    """Test that a call fails with the rate limit when every member is cooling down for longer than max_wait."""
+    llm = BalancedChatModel(members=members(scripted_model, [rate_limit()], [rate_limit()]), max_wait=1)
+
+    with pytest.raises(openai.RateLimitError):
+        llm.invoke("hi")
+    assert [info.rate_limited for info in llm.info()] == [1, 1]
+    assert all(info.outstanding == 0 for info in llm.info())
+
+
+def test_waits_for_cooldown(scripted_model):
+    """Test that a call waits for a member to return from a short cooldown."""
+    llm = BalancedChatModel(members=members(scripted_model, [rate_limit("0.05"), "ok"]))
+
+    assert llm.invoke("hi").content == "ok"
+    assert llm.info()[0].requests == 2
+
+
+def test_other_errors_are_raised(scripted_model):
+    """Test that errors other than rate limits are raised without trying another member."""
+    scripted = members(scripted_model, [ConnectionError("down")], ["ok"])
+    llm = BalancedChatModel(members=scripted, strategy="weighted_round_robin")
+
+    with pytest.raises(ConnectionError):
+        llm.invoke("hi")
+    assert scripted[1].calls == 0
+
+
+def test_stream_holds_member_until_done(scripted_model):
+    """Test that a stream counts as in flight until it is consumed and records the member on the first chunk."""
+    llm = BalancedChatModel(members=members(scripted_model, ["one two"]))
+
+    stream = llm.stream("hi")
+    first = next(stream)
+    assert llm.info()[0].outstanding == 1
+    assert first.response_metadata["balancer"]["member"] == 0
+    assert "".join(chunk.content for chunk in stream) == "two"
+    assert llm.info()[0].outstanding == 0
+
+
+def test_async(scripted_model):
+    """Test that async calls are balanced and retried like synchronous ones."""
+    llm = BalancedChatModel(members=members(scripted_model, [rate_limit("60")], ["one two"]))
+
+    async def run():
+        result = await llm.ainvoke("hi")
+        chunks = [chunk async for chunk in llm.astream("hi")]
+        return result, chunks
+
+    result, chunks = asyncio.run(run())
+    assert result.response_metadata["balancer"]["member"] == 1
+    assert "".join(chunk.content for chunk in chunks) == "onetwo"
+
+
+def test_cancelled_calls_are_released():
+    """Test that cancelling a call or a stream waiting for its first chunk frees its member."""
+    llm = BalancedChatModel(members=[DummyChatModel(latency_ms=10_000), DummyChatModel(latency_ms=10_000)])
+
+    async def cancel(call):
+        task = asyncio.ensure_future(call)
+        await asyncio.sleep(0.05)
+        assert sum(info.outstanding for info in llm.info()) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    async def consume():
+        return [chunk async for chunk in llm.astream("hi")]
+
+    asyncio.run(cancel(llm.ainvoke("hi")))
+    asyncio.run(cancel(consume()))
+    assert [info.outstanding for info in llm.info()] == [0, 0]
+
+
+def test_concurrent_calls_spread(scripted_model):
+    """Test that concurrent calls are spread over the members and all are released."""
+    llm = BalancedChatModel(members=members(scripted_model, ["ok"], ["ok"], ["ok"], ["ok"]))
+    threads = [threading.Thread(target=lambda: [llm.invoke("hi") for _ in range(10)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    infos = llm.info()
+    assert sum(info.requests for info in infos) == 80
+    assert all(info.requests >= 10 for info in infos)
+    assert all(info.outstanding == 0 for info in infos)
+
+
+def test_invalid_weights(scripted_model):
+    """Test that the weights must match the members and be positive."""
+    with pytest.raises(ValueError, match="weight"):
+        BalancedChatModel(members=members(scripted_model, ["ok"], ["ok"]), weights=[1])
+
+
+def test_load_endpoints(monkeypatch):
+    """Test that `load(..., endpoints=...)` loads a client per endpoint and key without leaking CUSTOM_ENDPOINT."""
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+
+    llm = llmloader.load(
+        "openai/gpt-4o",
+        api_key="default",
+        endpoints=[("https://a.example.com/v1", "key-a", 3), ("https://b.example.com/v1", "")],
+        balance="weighted_round_robin",
+    )
+
+    assert isinstance(llm, BalancedChatModel)
+    assert llm.weights == [3.0, 1.0]
+    assert [info.endpoint for info in llm.info()] == ["a.example.com", "b.example.com"]
+    assert [member.openai_api_key.get_secret_value() for member in llm.members] == ["key-a", "default"]
+    assert "CUSTOM_ENDPOINT" not in os.environ
+
+
+def test_load_keys_without_endpoints(monkeypatch):
+    """Test that pairs without an endpoint use the provider's default endpoint with each key."""
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+
+    llm = llmloader.load("gpt-4o", endpoints=[("", "key-1"), ("", "key-2")])
+
+    assert [type(member).__name__ for member in llm.members] == ["ChatOpenAI", "ChatOpenAI"]
+    assert [member.openai_api_key.get_secret_value() for member in llm.members] == ["key-1", "key-2"]
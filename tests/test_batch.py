@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from llmloader import load
+from llmloader.batch import arun_batch, completed_ids, read_prompts, run_batch
+
+
+def write_jsonl(path, items):
+    """Test helper which writes each item as a line of JSON."""
+    path.write_text("".join(json.dumps(item) + "\n" for item in items))
+
+
+def read_jsonl(path):
+    """Test helper which reads a JSON Lines file."""
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_read_prompts(tmp_path):
+    """Test reading prompts given as strings or objects, with and without ids."""
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('"first"\n\n{"id": "b", "prompt": "second"}\n{"prompt": "third"}\n')
+
+    assert list(read_prompts(path)) == [("1", "first"), ("b", "second"), ("4", "third")]
+
+
+@pytest.mark.parametrize(
+    "content", ['{"text": "no prompt"}\n', '{"id": 1, "prompt": "a"}\n{"id": 1, "prompt": "b"}\n', '"a"\n{"prompt\n']
+)
+def test_read_prompts_invalid(content, tmp_path):
+    """Test that lines which are not JSON, have no prompt or repeat an id raise an error."""
+    path = tmp_path / "prompts.jsonl"
+    path.write_text(content)
+
+    with pytest.raises(ValueError):
+        list(read_prompts(path))
+
+
+def test_completed_ids(tmp_path):
+    """Test that only responses count as completed and that a truncated line is ignored."""
+    path = tmp_path / "results.jsonl"
+    assert completed_ids(path) == set()
+
+    path.write_text('{"id": "1", "response": "a"}\n{"id": "2", "error": "ValueError: b"}\n{"id": "3", "resp')
+    assert completed_ids(path) == {"1"}
+
+
+def test_run_batch(tmp_path):
+    """Test running every prompt through the dummy model."""
+    prompts = [dict(id=str(i), prompt=f"prompt {i}") for i in range(20)]
+    write_jsonl(tmp_path / "prompts.jsonl", prompts)
+
+    summary = run_batch(load("dummy"), tmp_path / "prompts.jsonl", tmp_path / "results.jsonl", concurrency=4)
+
+    assert summary == (20, 0, 0)
+    results = {result["id"]: result["response"] for result in read_jsonl(tmp_path / "results.jsonl")}
+    assert results == {item["id"]: item["prompt"] for item in prompts}
+
+
+def test_run_batch_resume(tmp_path):
+    """Test that a restarted run skips completed prompts and retries failed ones."""
+    write_jsonl(tmp_path / "prompts.jsonl", [f"prompt {i}" for i in range(10)])
+    output = tmp_path / "results.jsonl"
+    failing = {"prompt 3", "prompt 7"}
+
+    def respond(prompt):
+        if prompt in failing:
+            raise RuntimeError("unavailable")
+        return prompt.upper()
+
+    summary = run_batch(RunnableLambda(respond), tmp_path / "prompts.jsonl", output, concurrency=3)
+    assert summary == (8, 2, 0)
+    errors = [result for result in read_jsonl(output) if "error" in result]
+    assert sorted(result["id"] for result in errors) == ["4", "8"]
+    assert errors[0]["error"] == "RuntimeError: unavailable"
+
+    failing.clear()
+    summary = run_batch(RunnableLambda(respond), tmp_path / "prompts.jsonl", output, concurrency=3)
+    assert summary == (2, 0, 8)
+    assert completed_ids(output) == {str(i) for i in range(1, 11)}
+
+
+def test_run_batch_resume_after_truncated_line(tmp_path):
+    """Test that results appended after a line cut off by a crash start on their own line."""
+    write_jsonl(tmp_path / "prompts.jsonl", ["first", "second"])
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"id": "1", "response": "first"}\n{"id": "2", "resp')
+
+    summary = run_batch(load("dummy"), tmp_path / "prompts.jsonl", output)
+
+    assert summary == (1, 0, 1)
+    assert output.read_text().splitlines()[1:] == ['{"id": "2", "resp', '{"id": "2", "response": "second"}']
+    assert completed_ids(output) == {"1", "2"}
+
+
+def test_run_batch_invalid_input(tmp_path):
+    """Test that an invalid line fails the run before any prompt is sent."""
+    (tmp_path / "prompts.jsonl").write_text('"first"\n"second"\n{"id": "2", "prompt": "again"}\n')
+    calls = []
+
+    with pytest.raises(ValueError, match="repeats the id '2'"):
+        run_batch(RunnableLambda(calls.append), tmp_path / "prompts.jsonl", tmp_path / "results.jsonl")
+    assert calls == []
+
+
+def test_run_batch_concurrency(tmp_path):
+    """Test that no more than `concurrency` prompts are in flight at once."""
+    write_jsonl(tmp_path / "prompts.jsonl", [f"prompt {i}" for i in range(12)])
+    running = 0
+    most = 0
+
+    async def respond(prompt):
+        nonlocal running, most
+        running += 1
+        most = max(most, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return prompt
+
+    summary = asyncio.run(
+        arun_batch(RunnableLambda(respond), tmp_path / "prompts.jsonl", tmp_path / "results.jsonl", concurrency=3)
+    )
+
+    assert summary.completed == 12
+    assert most == 3
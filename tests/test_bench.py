@@ -0,0 +1,114 @@
+import asyncio
+import json
+import struct
+import zlib
+
+import pytest
+from mocks.models import rate_limit
+from typer.testing import CliRunner
+
+from llmloader.bench import (
+    LoadGenerator,
+    RequestMix,
+    Sample,
+    noise_png,
+    percentile,
+    run_bench,
+    summarize,
+)
+from llmloader.main import app
+
+runner = CliRunner()
+
+
+def test_percentile():
+    """Test that percentiles interpolate between the sorted values."""
+    assert percentile([], 50) is None
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile(list(range(101)), 95) == 95
+
+
+def test_noise_png():
+    """Test that the generated image is a valid PNG of the requested size."""
+    data = noise_png(16)
+
+    assert data.startswith(b"\x89PNG\r\n\x1a\n")
+    assert struct.unpack(">II", data[16:24]) == (16, 16)
+    length = struct.unpack(">I", data[33:37])[0]
+    assert len(zlib.decompress(data[41 : 41 + length])) == 16 * (1 + 16 * 3)
+
+
+def test_summarize():
+    """Test the rates and percentiles of a run, with time to first token only from streams."""
+    samples = [
+        Sample(1.0, 1.0, 10, False),
+        Sample(2.0, 0.5, 30, True),
+        Sample(0.1, 0.1, 0, False, "RateLimitError: slow down", True),
+        Sample(0.2, 0.2, 0, False, "TimeoutError: ", False),
+    ]
+
+    summary = summarize(samples, 2.0)
+
+    assert summary["requests_per_second"] == 2.0
+    assert summary["error_rate"] == 0.5
+    assert summary["rate_limit_rate"] == 0.25
+    assert summary["output_tokens_per_second"] == 20.0
+    assert summary["stream_tokens_per_second"] == 20.0
+    assert summary["latency_p50"] == 1.5
+    assert summary["ttft_p99"] == 0.5
+    assert summary["errors"] == {"RateLimitError": 1, "TimeoutError": 1}
+
+
+def test_request_mix(scripted_model):
+    """Test that requests follow the mix of prompt sizes, images and streaming."""
+    generator = LoadGenerator(
+        scripted_model(), RequestMix(prompt_tokens=(5, 50), image_fraction=0.5, image_size=8, stream_fraction=0.5)
+    )
+
+    requests = [generator.request() for _ in range(200)]
+
+    texts = [input if isinstance(input, str) else input[0].content[0]["text"] for input, _ in requests]
+    assert {len(text.split(": ", 1)[1].split()) for text in texts} == {5, 50}
+    assert 60 < sum(not isinstance(input, str) for input, _ in requests) < 140
+    assert 60 < sum(stream for _, stream in requests) < 140
+    image = next(input for input, _ in requests if not isinstance(input, str))[0].content[1]
+    assert image["mime_type"] == "image/png"
+
+
+def test_run_counts_rate_limits(scripted_model):
+    """Test that a closed loop run records failed requests and rate limits."""
+    llm = scripted_model(outcomes=[rate_limit(), "one two three"])
+
+    summary = run_bench(llm, 0.05, concurrency=2, mix=RequestMix(stream_fraction=1.0))
+
+    assert summary["requests"] > 1
+    assert summary["errors"] == {"RateLimitError": 1}
+    assert summary["rate_limit_rate"] == pytest.approx(1 / summary["requests"])
+    assert summary["ttft_p50"] is not None
+
+
+def test_open_loop_rate(scripted_model):
+    """Test that an open loop run sends requests at the target rate."""
+    samples = asyncio.run(LoadGenerator(scripted_model()).run(0.2, rate=100))
+
+    assert 18 <= len(samples) <= 21
+
+
+def test_bench_command():
+    """Test that `llmloader bench` runs against the dummy model and prints JSON results."""
+    result = runner.invoke(app, ["bench", "--duration", "0.1", "--stream-fraction", "0.5", "--json"])
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    summary = json.loads(result.stdout)
+    assert summary["requests"] > 0
+    assert summary["error_rate"] == 0
+
+
+def test_bench_command_table():
+    """Test that `llmloader bench` prints a table of the results."""
+    result = runner.invoke(app, ["bench", "--duration", "0.1", "--rate", "20"])
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert "latency p95" in result.stdout
+    assert "429 rate" in result.stdout
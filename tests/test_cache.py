@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+
+import llmloader
+from llmloader.cache import ClientCache
+
+
+@pytest.fixture(autouse=True)
+def clear_default_cache():
+    """Pytest fixture that empties the default client cache before and after each test."""
+    llmloader.clear_cache()
+    yield
+    llmloader.clear_cache()
+
+
+def test_get_or_create_hit():
+    """Test that a second request for the same key returns the cached client without building it again."""
+    cache = ClientCache()
+    built = []
+
+    def factory():
+        built.append(object())
+        return built[-1]
+
+    first = cache.get_or_create(("a",), factory)
+    second = cache.get_or_create(("a",), factory)
+
+    assert first is second
+    assert len(built) == 1
+    assert cache.info().hits == 1
+    assert cache.info().misses == 1
+
+
+def test_lru_eviction():
+    """Test that the least recently used client is evicted when the cache is full."""
+    cache = ClientCache(maxsize=2)
+    cache.get_or_create(("a",), object)
+    cache.get_or_create(("b",), object)
+    cache.get_or_create(("a",), object)
+    cache.get_or_create(("c",), object)
+
+    assert len(cache) == 2
+    assert ("a",) in cache._entries
+    assert ("b",) not in cache._entries
+
+
+def test_ttl_expiry(monkeypatch):
+    """Test that clients are rebuilt once they are older than the time-to-live.
+
+    Args:
+        monkeypatch: Pytest fixture for patching the clock.
+    """
+    now = [1000.0]
+    monkeypatch.setattr("llmloader.cache.time.monotonic", lambda: now[0])
+    cache = ClientCache(ttl=10)
+
+    first = cache.get_or_create(("a",), object)
+    now[0] += 5
+    assert cache.get_or_create(("a",), object) is first
+    now[0] += 10
+    assert cache.get_or_create(("a",), object) is not first
+
+
+def test_factory_error_not_cached():
+    """Test that a failed construction is not stored and can be retried."""
+    cache = ClientCache()
+
+    def factory():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_create(("a",), factory)
+
+    assert cache.get_or_create(("a",), lambda: "ok") == "ok"
+    assert len(cache) == 1
+
+
+def test_concurrent_misses_build_once():
+    """Test that threads requesting the same missing key share a single construction."""
+    cache = ClientCache()
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_create(("a",), factory))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_make_key_fingerprints_api_key():
+    """Test that the API key is not stored in the key and that different keys give different entries."""
+    key1 = ClientCache.make_key("gpt-4o", 0.1, "secret-one", None, {})
+    key2 = ClientCache.make_key("gpt-4o", 0.1, "secret-two", None, {})
+
+    assert key1 != key2
+    assert "secret-one" not in repr(key1)
+
+
+def test_make_key_unhashable_kwargs():
+    """Test that keyword arguments with nested and unhashable values can still form a key."""
+    key = ClientCache.make_key("gpt-4o", None, "k", None, {"model_kwargs": {"top_p": [0.1, 0.2]}})
+    hash(key)
+
+
+def test_load_client_cache(openai_mock_setup, credentials):
+    """Test that `load` returns the same client for repeated loads with the same configuration.
+
+    Args:
+        openai_mock_setup (tuple): Fixture providing mocked OpenAI setup.
+        credentials (dict): Fixture providing test credentials for all models.
+    """
+    mock, _ = openai_mock_setup
+
+    first = llmloader.load(**credentials["openai"], client_cache=True)
+    second = llmloader.load(**credentials["openai"], client_cache=True)
+    third = llmloader.load(**{**credentials["openai"], "temperature": 0.2}, client_cache=True)
+
+    assert first is second
+    assert mock.call_count == 2
+    assert third is not None
+    info = llmloader.cache_info()
+    assert info.hits == 1
+    assert info.misses == 2
+    assert info.currsize == 2
+
+    llmloader.clear_cache()
+    assert llmloader.cache_info().currsize == 0
+
+
+def test_load_without_client_cache(openai_mock_setup, credentials):
+    """Test that caching is opt-in and each `load` builds a new client by default.
+
+    Args:
+        openai_mock_setup (tuple): Fixture providing mocked OpenAI setup.
+        credentials (dict): Fixture providing test credentials for all models.
+    """
+    mock, _ = openai_mock_setup
+
+    llmloader.load(**credentials["openai"])
+    llmloader.load(**credentials["openai"])
+
+    assert mock.call_count == 2
+    assert llmloader.cache_info().currsize == 0
@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import time
+
+import openai
+import pytest
+from mocks.models import Clock, rate_limit
+
+import llmloader
+from llmloader.batch import run_batch
+from llmloader.concurrency import AdaptiveChatModel, AdaptiveConcurrency
+
+
+def succeed(controller: AdaptiveConcurrency, calls: int, latency: float = 1.0) -> None:
+    """Runs calls one at a time which succeed with the given latency."""
+    for _ in range(calls):
+        controller.acquire()
+        controller.release(latency)
+
+
+def test_additive_increase():
+    """Test that the limit grows by about one for each round of successful calls, up to the maximum."""
+    controller = AdaptiveConcurrency(initial=2, max_limit=5, clock=Clock())
+
+    succeed(controller, 2)
+    assert controller.info().limit == 2
+    succeed(controller, 1)
+    assert controller.info().limit == 3
+    succeed(controller, 100)
+    assert controller.info().limit == 5
+    assert [limit for _, limit in controller.history] == [2, 3, 4, 5]
+
+
+def test_rate_limit_decreases_and_pauses():
+    """Test that a rate limit halves the limit and pauses new calls for its Retry-After."""
+    clock = Clock()
+    controller = AdaptiveConcurrency(initial=8, clock=clock)
+
+    controller.acquire()
+    controller.release(1.0, rate_limit("5"))
+
+    info = controller.info()
+    assert (info.limit, info.rate_limited, info.decreases, info.paused_for) == (4, 1, 1, 5)
+    assert controller._take() == 5
+    clock.now = 5
+    assert controller._take() == 0
+
+
+def test_burst_of_rate_limits_is_one_signal():
+    """Test that the calls which fail together in a burst cut the limit once per usual latency."""
+    clock = Clock()
+    controller = AdaptiveConcurrency(initial=8, clock=clock)
+    succeed(controller, 1, latency=2.0)
+    for _ in range(4):
+        controller.acquire()
+
+    for _ in range(4):
+        controller.release(2.0, rate_limit())
+    assert (controller.info().limit, controller.info().decreases) == (4, 1)
+
+    clock.now = 2
+    controller.acquire()
+    controller.release(2.0, rate_limit())
+    assert (controller.info().limit, controller.info().decreases) == (2, 2)
+
+
+def test_latency_spike_decreases():
+    """Test that a call much slower than usual cuts the limit without raising the usual latency."""
+    clock = Clock()
+    controller = AdaptiveConcurrency(initial=8, clock=clock)
+    succeed(controller, 5, latency=1.0)
+    clock.now = 10
+
+    controller.acquire()
+    controller.release(3.0)
+
+    assert controller.info().limit == 4
+    assert controller.info().latency == pytest.approx(1.0)
+
+
+def test_other_errors_keep_the_limit():
+    """Test that errors other than rate limits neither raise nor lower the limit."""
+    controller = AdaptiveConcurrency(initial=4, clock=Clock())
+
+    with pytest.raises(ConnectionError):
+        with controller.slot():
+            raise ConnectionError("down")
+
+    info = controller.info()
+    assert (info.limit, info.in_flight, info.successes, info.decreases) == (4, 0, 0, 0)
+
+
+def test_lower_bound():
+    """Test that the limit never falls below the minimum."""
+    clock = Clock()
+    controller = AdaptiveConcurrency(initial=2, min_limit=2, clock=clock)
+
+    for _ in range(3):
+        clock.now += 10
+        controller.acquire()
+        controller.release(1.0, rate_limit())
+
+    assert controller.info().limit == 2
+
+
+def test_threads_wait_for_a_slot():
+    """Test that a thread waits while the limit is reached and takes the slot freed by another."""
+    controller = AdaptiveConcurrency(initial=1, latency_tolerance=None)
+    controller.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (controller.acquire(), acquired.set()))
+    thread.start()
+
+    assert not acquired.wait(0.05)
+    controller.release(0.01)
+    assert acquired.wait(1)
+    thread.join()
+    assert controller.info().in_flight == 1
+
+
+def test_async_calls_stay_within_limit():
+    """Test that async calls never exceed the limit in flight while it grows."""
+    controller = AdaptiveConcurrency(initial=2, max_limit=6, latency_tolerance=None)
+    running = most = 0
+
+    async def call():
+        nonlocal running, most
+        async with controller.aslot():
+            running += 1
+            most = max(most, running)
+            assert running <= controller.info().limit
+            await asyncio.sleep(0.005)
+            running -= 1
+
+    async def run():
+        await asyncio.gather(*(call() for _ in range(40)))
+
+    asyncio.run(run())
+    assert controller.info().successes == 40
+    assert 2 < most <= 6
+
+
+def test_adaptive_model_batch(scripted_model):
+    """Test that `batch` through an adaptive model takes a slot for each call and backs off on rate limits."""
+    model = scripted_model(outcomes=[rate_limit(), "ok"])
+    llm = AdaptiveChatModel(model=model, controller=AdaptiveConcurrency(initial=4, latency_tolerance=None))
+
+    results = llm.batch(["hi"] * 5, return_exceptions=True)
+
+    assert sum(isinstance(result, openai.RateLimitError) for result in results) == 1
+    info = llm.controller.info()
+    assert (info.rate_limited, info.successes, info.in_flight) == (1, 4, 0)
+
+
+def test_adaptive_model_stream(scripted_model):
+    """Test that a stream holds its slot until it has been consumed."""
+    llm = AdaptiveChatModel(model=scripted_model(outcomes=["one two"]), controller=AdaptiveConcurrency())
+
+    stream = llm.stream("hi")
+    assert next(stream).content == "one"
+    assert llm.controller.info().in_flight == 1
+    assert "".join(chunk.content for chunk in stream) == "two"
+    assert llm.controller.info().in_flight == 0
+
+
+def test_run_batch_retries_rate_limits(scripted_model, tmp_path):
+    """Test that a batch with a controller tries a rate limited prompt again after backing off."""
+    (tmp_path / "prompts.jsonl").write_text('"first"\n"second"\n')
+    controller = AdaptiveConcurrency(initial=2)
+    llm = scripted_model(outcomes=[rate_limit("0.05"), "ok"])
+
+    start = time.perf_counter()
+    summary = run_batch(llm, tmp_path / "prompts.jsonl", tmp_path / "results.jsonl", concurrency=controller)
+
+    assert (summary.completed, summary.failed) == (2, 0)
+    assert controller.info().rate_limited == 1
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_load_concurrency(monkeypatch, tmp_path):
+    """Test that `load(..., concurrency=...)` wraps the model and keeps the response cache outside the slots."""
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+    controller = AdaptiveConcurrency()
+
+    llm = llmloader.load("openai/gpt-4o", api_key="key", concurrency=controller, cache=tmp_path / "responses.sqlite")
+
+    assert isinstance(llm, AdaptiveChatModel)
+    assert llm.controller is controller
+    assert llm.cache is not None and llm.model.cache is None
+
+
+def test_cache_hits_skip_the_slot(scripted_model):
+    """Test that a cached response of an adaptive model is answered without taking a slot."""
+    from langchain_core.caches import InMemoryCache
+
+    controller = AdaptiveConcurrency()
+    llm = AdaptiveChatModel(model=scripted_model(), controller=controller, cache=InMemoryCache())
+
+    llm.invoke("hi")
+    llm.invoke("hi")
+
+    assert controller.info().successes == 1
+
+
+def test_invalid_limits():
+    """Test that the initial limit must lie between the minimum and maximum."""
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency(initial=10, max_limit=5)
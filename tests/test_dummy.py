@@ -1,7 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
 import llmloader
+from llmloader.dummy_model import DummyChatModel, RateLimitError
+from llmloader.errors import is_rate_limit, retry_after
+from llmloader.wrappers import LLMWrapper
 
 
 def test_dummy():
     llm = llmloader.load("dummy")
     result = llm.invoke("Write me a haiku about love")
     assert result == "Write me a haiku about love"
+
+
+def test_dummy_parameters():
+    """Test that the parameters in a "dummy?..." name configure a simulated chat model."""
+    llm = llmloader.load("dummy?latency_ms=200&tps=50&error_rate=0.01&output_tokens=8", max_tokens=5)
+
+    assert isinstance(llm, DummyChatModel)
+    assert (llm.latency_ms, llm.tps, llm.error_rate, llm.output_tokens, llm.max_tokens) == (200, 50, 0.01, 8, 5)
+
+
+def test_dummy_unknown_parameter(monkeypatch):
+    """Test that an unknown parameter is reported."""
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(ValueError, match="Unknown dummy model parameter 'speed'"):
+        llmloader.load("dummy?speed=1")
+
+
+def test_dummy_chat_usage():
+    """Test that the simulated model echoes the last message and reports usage that `get_token_count` reads."""
+    result = llmloader.load("dummy?").invoke("Write me a haiku")
+
+    assert result.content == "Write me a haiku"
+    usage = dict(input_tokens=4, output_tokens=4, total_tokens=8)
+    assert LLMWrapper.get_token_count(result) == usage
+    assert result.usage_metadata == usage
+
+
+def test_dummy_chat_stream():
+    """Test that a stream yields a chunk per token after the prefill latency and ends with the usage."""
+    llm = DummyChatModel(latency_ms=50, tps=100, output_tokens=6)
+
+    start = time.perf_counter()
+    chunks = []
+    for chunk in llm.stream("hi"):
+        chunks.append((time.perf_counter() - start, chunk))
+    message = sum((chunk for _, chunk in chunks[1:]), chunks[0][1])
+
+    assert 0.05 <= chunks[0][0] < 0.1
+    assert 0.1 <= chunks[-1][0] < 0.2
+    assert message.content == "token0 token1 token2 token3 token4 token5"
+    assert LLMWrapper.get_token_count(message)["output_tokens"] == 6
+
+
+def test_dummy_chat_async():
+    """Test that async calls wait without blocking the event loop."""
+    llm = DummyChatModel(latency_ms=100)
+
+    async def run():
+        return await asyncio.gather(*(llm.ainvoke("hi") for _ in range(10)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    assert time.perf_counter() - start < 0.5
+    assert [result.content for result in results] == ["hi"] * 10
+
+
+def test_dummy_chat_async_stream():
+    """Test that an async stream yields the tokens of the response."""
+    llm = DummyChatModel(output_tokens=3)
+
+    async def run():
+        return [chunk.content async for chunk in llm.astream("hi")]
+
+    assert "".join(asyncio.run(run())) == "token0 token1 token2"
+
+
+def test_dummy_chat_rate_limits():
+    """Test that simulated 429s are seeded and look like provider rate limits with a Retry-After."""
+    llm = DummyChatModel(error_rate=0.5, retry_after=2, seed=1)
+    other = DummyChatModel(error_rate=0.5, retry_after=2, seed=1)
+
+    def outcomes(model):
+        results = []
+        for _ in range(20):
+            try:
+                model.invoke("hi")
+                results.append(True)
+            except RateLimitError as e:
+                assert is_rate_limit(e) and retry_after(e) == 2
+                results.append(False)
+        return results
+
+    results = outcomes(llm)
+    assert results == outcomes(other)
+    assert 0 < sum(results) < 20
@@ -0,0 +1,43 @@
+import httpx
+import openai
+import pytest
+from mocks.models import api_error
+
+from llmloader.errors import is_rate_limit, is_request_error, retry_after, status_code
+
+
+def test_status_code():
+    """Test that the status code is found on SDK errors, on their responses and as a `code` attribute."""
+
+    class GoogleError(Exception):
+        code = 503
+
+    assert status_code(api_error(openai.InternalServerError, 500)) == 500
+    assert status_code(GoogleError()) == 503
+    assert status_code(httpx.HTTPStatusError("", request=None, response=httpx.Response(502))) == 502
+    assert status_code(TimeoutError()) is None
+
+
+def test_classification():
+    """Test that rate limits and request errors are told apart from other failures."""
+    assert is_rate_limit(api_error(openai.RateLimitError, 429))
+    assert is_rate_limit(api_error(openai.InternalServerError, 529))
+    assert not is_rate_limit(api_error(openai.InternalServerError, 500))
+    assert is_request_error(api_error(openai.BadRequestError, 400))
+    assert not is_request_error(api_error(openai.AuthenticationError, 401))
+    assert not is_request_error(ConnectionError())
+
+
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        ({"retry-after": "2"}, 2.0),
+        ({"retry-after-ms": "1500", "retry-after": "2"}, 1.5),
+        ({"retry-after": "Thu, 01 Jan 1970 00:00:00 GMT"}, 0.0),
+        ({"retry-after": "soon"}, None),
+        ({}, None),
+    ],
+)
+def test_retry_after(headers, expected):
+    """Test that Retry-After is read in seconds, milliseconds or as an HTTP date."""
+    assert retry_after(api_error(openai.RateLimitError, 429, headers)) == expected
@@ -0,0 +1,226 @@
+import asyncio
+
+import openai
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from mocks.models import Clock, api_error
+
+import llmloader
+from llmloader.failover import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    FailoverChatModel,
+    FailoverError,
+    breaker_info,
+    get_breaker,
+    reset_breakers,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_breakers():
+    """Pytest fixture that forgets the providers' circuit breakers before and after each test."""
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+def test_breaker_opens_and_recovers():
+    """Test that the breaker opens after the threshold, lets one probe through when half open and closes on success."""
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.info().retry_in == 10
+
+    clock.now = 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+    assert breaker.info() == (CLOSED, 0, 1, 0.0)
+
+
+def test_breaker_failed_probe_reopens():
+    """Test that a failed probe opens the breaker again and that an abandoned probe is eventually replaced."""
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=5, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+
+    clock.now = 10
+    assert breaker.allow()
+    clock.now = 15
+    assert breaker.allow()
+
+
+def test_breaker_open_for():
+    """Test that a Retry-After opens the breaker at once for that long."""
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=5, recovery_time=30, clock=clock)
+
+    breaker.record_failure(open_for=2)
+    assert not breaker.allow()
+    clock.now = 2
+    assert breaker.allow()
+
+
+def test_failover_to_next_model(scripted_model):
+    """Test that a failing model is followed by the next one and that the serving model is recorded."""
+    primary = scripted_model(model_name="primary", base_url="https://a.example.com", outcomes=[ConnectionError()])
+    backup = scripted_model(model_name="backup", base_url="https://b.example.com", outcomes=["hello"])
+    llm = FailoverChatModel(models=[primary, backup])
+
+    result = llm.invoke("hi")
+
+    assert result.content == "hello"
+    assert result.response_metadata["failover"] == {"model": "backup", "provider": "b.example.com", "index": 1}
+    assert result.response_metadata["model_name"] == "backup"
+    assert get_breaker("a.example.com").failures == 1
+    assert primary.calls == backup.calls == 1
+
+
+def test_open_breaker_skips_provider(scripted_model):
+    """Test that a provider whose breaker is open is skipped without being called."""
+    primary = scripted_model(model_name="primary", base_url="https://a.example.com", outcomes=[TimeoutError()])
+    backup = scripted_model(model_name="backup", base_url="https://b.example.com")
+    llm = FailoverChatModel(models=[primary, backup])
+
+    for _ in range(5):
+        assert llm.invoke("hi").response_metadata["failover"]["index"] == 1
+
+    assert primary.calls == 3  # the default threshold
+    assert breaker_info()["a.example.com"].state == OPEN
+
+
+def test_rate_limit_opens_breaker(scripted_model):
+    """Test that a rate limit with a Retry-After skips the model at once, but not the other models of its provider."""
+    error = api_error(openai.RateLimitError, 429, {"retry-after": "60"})
+    primary = scripted_model(model_name="primary", base_url="https://a.example.com", outcomes=[error])
+    sibling = scripted_model(model_name="sibling", base_url="https://a.example.com")
+    llm = FailoverChatModel(models=[primary, sibling])
+
+    assert llm.invoke("hi").response_metadata["failover"]["index"] == 1
+    assert llm.invoke("hi").response_metadata["failover"]["index"] == 1
+
+    assert primary.calls == 1
+    assert sibling.calls == 2
+    assert get_breaker("a.example.com", "primary").info().retry_in > 50
+    assert get_breaker("a.example.com").state == CLOSED
+
+
+def test_rate_limited_dummy_models(monkeypatch):
+    """Test that a rate limited model does not skip another model of the same provider.
+
+    Args:
+        monkeypatch: Pytest fixture for removing any custom endpoint.
+    """
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+    llm = llmloader.load(["dummy?error_rate=1", "dummy?latency_ms=1"])
+
+    assert llm.invoke("hello").response_metadata["failover"]["index"] == 1
+
+
+def test_child_runs(scripted_model):
+    """Test that the call to the serving model is reported to callbacks as a child run of the chain's run."""
+
+    class Recorder(BaseCallbackHandler):
+        def __init__(self):
+            self.runs = []
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+            self.runs.append((run_id, parent_run_id))
+
+    recorder = Recorder()
+    llm = FailoverChatModel(models=[scripted_model(model_name="only", base_url="https://a.example.com")])
+
+    llm.invoke("hi", config={"callbacks": [recorder]})
+    asyncio.run(llm.ainvoke("hi", config={"callbacks": [recorder]}))
+
+    (chain, _), (child, parent) = recorder.runs[:2]
+    assert parent == chain
+    assert recorder.runs[3][1] == recorder.runs[2][0]
+
+
+def test_request_error_is_raised(scripted_model):
+    """Test that an error caused by the request is raised without falling over or tripping the breaker."""
+    error = api_error(openai.BadRequestError, 400)
+    primary = scripted_model(model_name="primary", base_url="https://a.example.com", outcomes=[error])
+    backup = scripted_model(model_name="backup", base_url="https://b.example.com")
+    llm = FailoverChatModel(models=[primary, backup])
+
+    with pytest.raises(openai.BadRequestError):
+        llm.invoke("hi")
+    assert backup.calls == 0
+    assert get_breaker("a.example.com").failures == 0
+
+
+def test_all_models_fail(scripted_model):
+    """Test that a FailoverError lists the error of every model when none of them answer."""
+    first = scripted_model(model_name="first", base_url="https://a.example.com", outcomes=[ConnectionError("down")])
+    second = scripted_model(model_name="second", base_url="https://b.example.com", outcomes=[TimeoutError("slow")])
+    llm = FailoverChatModel(models=[first, second])
+
+    with pytest.raises(FailoverError, match="first: ConnectionError: down") as error:
+        llm.invoke("hi")
+    assert set(error.value.errors) == {"first", "second"}
+
+    get_breaker("a.example.com").record_failure(open_for=60)
+    with pytest.raises(FailoverError) as error:
+        llm.invoke("hi")
+    assert error.value.skipped == ["first"]
+
+
+def test_stream_fails_over_before_first_chunk(scripted_model):
+    """Test that a stream falls over when the first model fails and records the serving model on the first chunk."""
+    primary = scripted_model(model_name="primary", base_url="https://a.example.com", outcomes=[ConnectionError()])
+    backup = scripted_model(model_name="backup", base_url="https://b.example.com", outcomes=["one two"])
+    llm = FailoverChatModel(models=[primary, backup])
+
+    chunks = list(llm.stream("hi"))
+
+    assert "".join(chunk.content for chunk in chunks) == "onetwo"
+    assert chunks[0].response_metadata["failover"]["model"] == "backup"
+
+
+def test_async_failover(scripted_model):
+    """Test that `ainvoke` and `astream` fall over like their synchronous versions."""
+    primary = scripted_model(model_name="primary", base_url="https://a.example.com", outcomes=[ConnectionError()])
+    backup = scripted_model(model_name="backup", base_url="https://b.example.com", outcomes=["one two"])
+    llm = FailoverChatModel(models=[primary, backup])
+
+    async def run():
+        result = await llm.ainvoke("hi")
+        chunks = [chunk async for chunk in llm.astream("hi")]
+        return result, chunks
+
+    result, chunks = asyncio.run(run())
+    assert result.response_metadata["failover"]["model"] == "backup"
+    assert chunks[0].response_metadata["failover"]["model"] == "backup"
+    assert primary.calls == 2
+
+
+def test_load_list(monkeypatch):
+    """Test that `load` with a list of model names returns a failover chain of the loaded models."""
+    for name in ("CUSTOM_ENDPOINT", "ANTHROPIC_BASE_URL", "ANTHROPIC_API_URL"):
+        monkeypatch.delenv(name, raising=False)
+
+    llm = llmloader.load(["claude-sonnet-4-5", "gpt-4o"], api_key="key123", temperature=0)
+
+    assert isinstance(llm, FailoverChatModel)
+    assert [type(model).__name__ for model in llm.models] == ["ChatAnthropic", "ChatOpenAI"]
+    assert llm._identifying_params["models"] == ["api.anthropic.com/claude-sonnet-4-5", "openai-chat/gpt-4o"]
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llmloader
+from llmloader.http_pool import HttpPool
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub/model",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(COMPLETION).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_server():
+    """Pytest fixture that serves OpenAI compatible chat completions on localhost with keep-alive.
+
+    Yields:
+        str: The base URL of the server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_client_reuses_connection(stub_server):
+    """Test that consecutive requests through the pool reuse a single connection and are counted."""
+    pool = HttpPool()
+    for _ in range(3):
+        assert pool.client.post(f"{stub_server}/chat/completions", json={}).status_code == 200
+
+    info = pool.info()
+    assert info.requests == 3
+    assert info.connections == 1
+    assert info.reused == 2
+    assert info.reuse_ratio == pytest.approx(2 / 3)
+    pool.close()
+
+
+def test_async_client_reuses_connection(stub_server):
+    """Test that the asynchronous client counts requests and connections too."""
+    pool = HttpPool()
+
+    async def run():
+        for _ in range(2):
+            await pool.async_client.post(f"{stub_server}/chat/completions", json={})
+        await pool.aclose()
+
+    asyncio.run(run())
+    assert pool.info()[:3] == (2, 1, 1)
+
+
+def test_pool_options():
+    """Test that the limits and timeouts are passed to the clients, which are created once."""
+    pool = HttpPool(max_connections=7, max_keepalive_connections=3, keepalive_expiry=5, timeout=20, connect_timeout=2)
+    client = pool.client
+
+    assert pool.client is client
+    assert client.timeout.read == 20
+    assert client.timeout.connect == 2
+    assert pool.info().reuse_ratio == 0.0
+    pool.close()
+
+
+def test_http2_without_h2_warns(monkeypatch):
+    """Test that HTTP/2 falls back to HTTP/1.1 with a warning when h2 is not installed."""
+    import sys
+
+    monkeypatch.setitem(sys.modules, "h2", None)
+    pool = HttpPool(http2=True)
+    with pytest.warns(UserWarning, match="h2"):
+        pool.client
+    pool.close()
+
+
+def test_load_injects_shared_clients(openai_mock_setup, credentials):
+    """Test that `load(..., http_pool=True)` passes the default pool's clients to models which support them.
+
+    Args:
+        openai_mock_setup (tuple): Fixture providing mocked OpenAI setup.
+        credentials (dict): Fixture providing test credentials for all models.
+    """
+    mock, _ = openai_mock_setup
+
+    llmloader.load(**credentials["openai"], http_pool=True)
+
+    kwargs = mock.call_args.kwargs
+    assert kwargs["http_client"] is llmloader.default_http_pool.client
+    assert kwargs["http_async_client"] is llmloader.default_http_pool.async_client
+
+
+def test_load_keeps_given_client(openai_mock_setup, credentials):
+    """Test that an explicit `http_client` is not replaced and that pools are opt-in.
+
+    Args:
+        openai_mock_setup (tuple): Fixture providing mocked OpenAI setup.
+        credentials (dict): Fixture providing test credentials for all models.
+    """
+    mock, _ = openai_mock_setup
+    client = object()
+
+    llmloader.load(**credentials["openai"], http_client=client, http_pool=HttpPool())
+    assert mock.call_args.kwargs["http_client"] is client
+    assert "http_async_client" not in mock.call_args.kwargs
+
+    llmloader.load(**credentials["openai"])
+    assert "http_client" not in mock.call_args.kwargs
+
+
+def test_load_skips_unsupported_providers(anthropic_mock_setup, credentials):
+    """Test that models which do not accept shared clients are loaded without them.
+
+    Args:
+        anthropic_mock_setup (tuple): Fixture providing mocked Anthropic setup.
+        credentials (dict): Fixture providing test credentials for all models.
+    """
+    mock, _ = anthropic_mock_setup
+
+    llmloader.load(**credentials["anthropic"], http_pool=True)
+
+    mock.assert_called_once_with(**credentials["anthropic"])
+
+
+def test_loaded_models_share_connections(stub_server, monkeypatch):
+    """Test that two models loaded with the same pool send their requests over one connection."""
+    # loading with an endpoint sets CUSTOM_ENDPOINT, which must not leak into other tests
+    monkeypatch.setenv("CUSTOM_ENDPOINT", stub_server)
+    pool = HttpPool()
+    first = llmloader.load("stub/first", api_key="key", endpoint=stub_server, http_pool=pool)
+    second = llmloader.load("stub/second", api_key="key", endpoint=stub_server, http_pool=pool)
+
+    assert first.invoke("ping").content == "pong"
+    assert second.invoke("ping").content == "pong"
+    assert pool.info()[:3] == (2, 1, 1)
+    pool.close()
@@ -0,0 +1,261 @@
+import pytest
+
+from llmloader.huggingface import HuggingFaceLoader
+from llmloader.weights import WeightRegistry
+
+
+def test_cpu_mode_when_cuda_unavailable(huggingface_mock_setup):
+    """Test that CPU mode is chosen without CUDA and that every CUDA-only step is skipped.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    transformers_mock, torch_mock = huggingface_mock_setup
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+
+    loader(model="meta-llama/Llama-3-8B", api_key="hf", num_threads=4)
+
+    transformers_mock.BitsAndBytesConfig.assert_not_called()
+    torch_mock.cuda.empty_cache.assert_not_called()
+    torch_mock.set_num_threads.assert_called_once_with(4)
+    kwargs = transformers_mock.AutoModelForCausalLM.from_pretrained.call_args.kwargs
+    assert "quantization_config" not in kwargs
+    assert "device_map" not in kwargs
+    assert kwargs["torch_dtype"] is torch_mock.float32
+
+
+def test_cpu_int8(huggingface_mock_setup):
+    """Test that int8 on CPU dynamically quantizes the linear layers of a float32 model.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    transformers_mock, torch_mock = huggingface_mock_setup
+    registry = WeightRegistry()
+    loader = HuggingFaceLoader(weight_registry=registry)
+
+    llm = loader(model="meta-llama/Llama-3-8B", device="cpu", dtype="int8")
+
+    torch_mock.ao.quantization.quantize_dynamic.assert_called_once()
+    assert llm.pipeline.model is torch_mock.ao.quantization.quantize_dynamic.return_value
+    (key,) = list(registry._entries)
+    assert key.quantization == "int8-dynamic"
+    assert key.device == "cpu"
+
+
+def test_cpu_bfloat16(huggingface_mock_setup):
+    """Test that bfloat16 weights can be requested for CPU inference.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    transformers_mock, torch_mock = huggingface_mock_setup
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+
+    loader(model="meta-llama/Llama-3-8B", device="cpu", dtype="bfloat16")
+
+    kwargs = transformers_mock.AutoModelForCausalLM.from_pretrained.call_args.kwargs
+    assert kwargs["torch_dtype"] is torch_mock.bfloat16
+
+
+def test_cpu_invalid_dtype(huggingface_mock_setup):
+    """Test that an unsupported CPU dtype raises an error.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+    with pytest.raises(ValueError, match="Unsupported dtype"):
+        loader(model="meta-llama/Llama-3-8B", device="cpu", dtype="float8")
+
+
+def test_cuda_mode(huggingface_mock_setup):
+    """Test that the 4-bit quantized GPU configuration is used when CUDA is available.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    transformers_mock, torch_mock = huggingface_mock_setup
+    torch_mock.cuda.is_available.return_value = True
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+
+    llm = loader(model="meta-llama/Llama-3-8B")
+
+    assert llm is not None
+    transformers_mock.BitsAndBytesConfig.assert_called_once()
+    torch_mock.cuda.empty_cache.assert_called_once()
+    kwargs = transformers_mock.AutoModelForCausalLM.from_pretrained.call_args.kwargs
+    assert kwargs["device_map"] == "auto"
+
+
+@pytest.mark.parametrize("dtype", ["float32", "bfloat16", "int8"])
+def test_cpu_tiny_model(dtype, tiny_llama_pipeline, tmp_path):
+    """Test loading and generating with a real tiny model saved to disk for each CPU dtype.
+
+    Args:
+        dtype (str): The CPU dtype.
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    from llmloader.llama_model import ChatLlama3
+
+    tiny_llama_pipeline.model.save_pretrained(tmp_path)
+    tiny_llama_pipeline.tokenizer.save_pretrained(tmp_path)
+
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+    llm = loader(model=str(tmp_path), device="cpu", dtype=dtype, max_tokens=8, temperature=1.0)
+    result = ChatLlama3(llm=llm).invoke("Hello")
+
+    assert isinstance(result.content, str)
+
+
+class WarmUpPipeline:
+    """A pipeline which fails while generating with the options listed in `failing`."""
+
+    def __init__(self, failing=()):
+        import transformers
+
+        self.generation_config = transformers.GenerationConfig(
+            cache_implementation="static", compile_config=transformers.CompileConfig()
+        )
+        self.failing = failing
+        self.calls = []
+
+    def __call__(self, prompt, **kwargs):
+        self.calls.append(prompt)
+        if "compile" in self.failing and self.generation_config.compile_config is not None:
+            raise RuntimeError("compile failed")
+        if "static" in self.failing and self.generation_config.cache_implementation == "static":
+            raise RuntimeError("static cache failed")
+        return [{"generated_text": ""}]
+
+
+@pytest.mark.parametrize("compile", [False, True])
+def test_static_cache_options(compile, huggingface_mock_setup, monkeypatch):
+    """Test that the static cache option selects SDPA attention, a static cache and optionally compilation.
+
+    Args:
+        compile (bool): Whether to compile the decode step.
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+        monkeypatch: Pytest fixture for patching attributes.
+    """
+    transformers_mock, _ = huggingface_mock_setup
+    warm_ups = []
+    monkeypatch.setattr(HuggingFaceLoader, "warm_up", lambda self, pipeline: warm_ups.append(pipeline))
+    registry = WeightRegistry()
+    loader = HuggingFaceLoader(weight_registry=registry)
+
+    llm = loader(model="meta-llama/Llama-3-8B", device="cpu", static_cache=not compile, compile=compile)
+
+    kwargs = transformers_mock.AutoModelForCausalLM.from_pretrained.call_args.kwargs
+    assert kwargs["attn_implementation"] == "sdpa"
+    assert llm.pipeline.cache_implementation == "static"
+    assert hasattr(llm.pipeline, "compile_config") == compile
+    assert warm_ups == [llm.pipeline]
+    (key,) = list(registry._entries)
+    assert ("attn_implementation", "sdpa") in key.options
+
+
+def test_compile_without_cpu_support(monkeypatch):
+    """Test that compilation on the CPU is skipped with a warning if transformers cannot compile on every device.
+
+    Args:
+        monkeypatch: Pytest fixture for replacing the compile config class.
+    """
+    transformers = pytest.importorskip("transformers")
+
+    class CompileConfig:
+        # a compile config without the flag which enables compilation on the CPU
+        def __init__(self, mode: str = "reduce-overhead"):
+            self.mode = mode
+
+    monkeypatch.setattr(transformers, "CompileConfig", CompileConfig)
+    loader = HuggingFaceLoader()
+
+    with pytest.warns(UserWarning, match="cannot compile generation on cpu"):
+        assert loader.static_cache_options("cpu", compile=True) == {"cache_implementation": "static"}
+    assert loader.static_cache_options("cuda", compile=True)["compile_config"].mode == "reduce-overhead"
+
+
+def test_warm_up():
+    """Test that warming up generates with both prompts and keeps the options which work."""
+    pytest.importorskip("transformers")
+    pipeline = WarmUpPipeline()
+
+    HuggingFaceLoader().warm_up(pipeline)
+
+    assert len(pipeline.calls) == 2
+    assert pipeline.generation_config.compile_config is not None
+    assert pipeline.generation_config.cache_implementation == "static"
+
+
+def test_warm_up_compile_fallback():
+    """Test that compilation is disabled with a warning when it fails during the warm up."""
+    pytest.importorskip("transformers")
+    pipeline = WarmUpPipeline(failing=("compile",))
+
+    with pytest.warns(UserWarning, match="Compilation failed"):
+        HuggingFaceLoader().warm_up(pipeline)
+
+    assert pipeline.generation_config.compile_config is None
+    assert pipeline.generation_config.disable_compile
+    assert pipeline.generation_config.cache_implementation == "static"
+
+
+def test_warm_up_static_cache_fallback():
+    """Test that the dynamic cache is used with a warning when the static cache fails during the warm up."""
+    pytest.importorskip("transformers")
+    pipeline = WarmUpPipeline(failing=("compile", "static"))
+
+    with pytest.warns(UserWarning) as record:
+        HuggingFaceLoader().warm_up(pipeline)
+
+    assert [str(warning.message).split(",")[0] for warning in record] == [
+        "Compilation failed",
+        "Generation with a static cache failed",
+    ]
+    assert pipeline.generation_config.cache_implementation is None
+
+
+def test_static_cache_tiny_model(tiny_llama_pipeline, tmp_path):
+    """Test generating with a static cache and a real tiny model, with and without a prefix cache.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from llmloader.llama_model import ChatLlama3
+    from llmloader.prefix_cache import PrefixCache
+
+    tiny_llama_pipeline.model.save_pretrained(tmp_path)
+    tiny_llama_pipeline.tokenizer.save_pretrained(tmp_path)
+
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+    llm = loader(model=str(tmp_path), device="cpu", static_cache=True, max_tokens=8, temperature=1.0)
+    assert llm.pipeline.generation_config.cache_implementation == "static"
+
+    messages = [SystemMessage(content="Be brief."), HumanMessage(content="Hello")]
+    assert isinstance(ChatLlama3(llm=llm).invoke(messages).content, str)
+    assert isinstance(ChatLlama3(llm=llm, prefix_cache=PrefixCache()).invoke(messages).content, str)
+
+
+@pytest.mark.manual
+def test_compile_tiny_model(tiny_llama_pipeline, tmp_path):
+    """Test compiling the decode step of a real tiny model. This takes about a minute on a CPU.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    from llmloader.llama_model import ChatLlama3
+
+    tiny_llama_pipeline.model.save_pretrained(tmp_path)
+    tiny_llama_pipeline.tokenizer.save_pretrained(tmp_path)
+
+    loader = HuggingFaceLoader(weight_registry=WeightRegistry())
+    llm = loader(model=str(tmp_path), device="cpu", compile=True, max_tokens=8, temperature=1.0)
+
+    assert llm.pipeline.generation_config.compile_config is not None
+    assert isinstance(ChatLlama3(llm=llm).invoke("Hello").content, str)
@@ -0,0 +1,225 @@
+import base64
+
+import pytest
+
+from llmloader.images import (
+    ImageCache,
+    ImageLimits,
+    ResizeStats,
+    detect_mime_type,
+    digest,
+    downscale,
+    encode_base64,
+    encode_image,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 10
+
+
+@pytest.mark.parametrize(
+    "data,mime_type",
+    [
+        (PNG, "image/png"),
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+        (b"GIF89a\x01\x00", "image/gif"),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"%PDF-1.7", "application/pdf"),
+        (b"\x00\x00\x00\x1cftypavif", "image/avif"),
+        (b"unknown", "application/octet-stream"),
+    ],
+)
+def test_detect_mime_type(data, mime_type):
+    """Test detecting the MIME type from the signature of the data."""
+    assert detect_mime_type(data) == mime_type
+
+
+def test_detect_mime_type_from_extension():
+    """Test falling back to the file extension when the signature is unknown."""
+    assert detect_mime_type(b"unknown", "scan.png") == "image/png"
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 10, 11, 12, 1000])
+@pytest.mark.parametrize("chunk_size", [3, 5, 12, 1024])
+def test_encode_base64(size, chunk_size):
+    """Test that chunked encoding matches encoding all at once for any chunk size."""
+    data = bytes(i % 251 for i in range(size))
+
+    assert encode_base64(data, chunk_size=max(chunk_size, 3)) == base64.b64encode(data).decode("ascii")
+
+
+def test_digest_chunks():
+    """Test that the digest does not depend on the chunk size."""
+    assert digest(PNG, chunk_size=7) == digest(PNG)
+
+
+def test_encode_image_path_and_bytes(tmp_path):
+    """Test encoding an image from a file and from bytes."""
+    path = tmp_path / "image.png"
+    path.write_bytes(PNG)
+
+    expected = dict(data=base64.b64encode(PNG).decode("ascii"), mime_type="image/png")
+    assert encode_image(path, cache=None) == expected
+    assert encode_image(str(path), cache=None) == expected
+    assert encode_image(PNG, cache=None) == expected
+    assert encode_image(memoryview(PNG), cache=None) == expected
+
+
+def test_encode_empty_file(tmp_path):
+    """Test encoding an empty file, which cannot be memory mapped."""
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+
+    assert encode_image(path, cache=None) == dict(data="", mime_type="application/octet-stream")
+
+
+def test_encode_image_cache(tmp_path):
+    """Test that images with the same contents are encoded once."""
+    cache = ImageCache()
+    first = tmp_path / "first.png"
+    second = tmp_path / "second.png"
+    first.write_bytes(PNG)
+    second.write_bytes(PNG)
+
+    encoded = encode_image(first, cache=cache)
+    assert encode_image(second, cache=cache) == encoded
+    assert encode_image(PNG, cache=cache) == encoded
+    assert cache.info()[:3] == (2, 1, 1)
+
+    # the cached entry cannot be modified through a result
+    encoded["data"] = ""
+    assert encode_image(first, cache=cache)["data"] != ""
+
+
+def test_image_cache_eviction():
+    """Test that the least recently used encodings are evicted beyond the size limit."""
+    cache = ImageCache(max_bytes=10)
+    cache.put("a", dict(data="aaaa", mime_type="image/png"))
+    cache.put("b", dict(data="bbbb", mime_type="image/png"))
+    assert cache.get("a") is not None
+
+    cache.put("c", dict(data="cccc", mime_type="image/png"))
+    cache.put("d", dict(data="d" * 11, mime_type="image/png"))  # larger than the cache
+
+    assert cache.get("b") is None
+    assert cache.get("d") is None
+    assert len(cache) == 2
+    assert cache.info().bytes == 8
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def make_image(width: int, height: int, mode: str = "RGB", format: str = "PNG") -> bytes:
+    """Test helper which returns a noisy image, which compresses poorly like a photo or a scan."""
+    import io
+    import random
+
+    from PIL import Image
+
+    random.seed(0)
+    image = Image.frombytes(mode, (width, height), random.randbytes(width * height * len(mode)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def image_size(data: bytes) -> tuple[int, int]:
+    """Test helper which returns the width and height of an image."""
+    import io
+
+    from PIL import Image
+
+    return Image.open(io.BytesIO(data)).size
+
+
+def test_image_limits_scale():
+    """Test the scale needed to fit the long and short side limits, which never enlarges an image."""
+    limits = ImageLimits(2048, 768)
+
+    assert limits.scale(4096, 3072) == 0.25
+    assert limits.scale(1536, 1024) == 0.75
+    assert limits.scale(4096, 100) == 0.5
+    assert limits.scale(100, 100) == 1.0
+    assert ImageLimits().scale(10000, 10000) == 1.0
+
+
+def test_downscale_dimensions():
+    """Test that an image larger than the dimension limits is resized and the bytes saved are counted."""
+    pytest.importorskip("PIL")
+    data = make_image(1600, 1200)
+    stats = ResizeStats()
+
+    resized, mime_type = downscale(data, ImageLimits(800, 300), stats=stats)
+
+    assert mime_type == "image/jpeg"
+    assert image_size(resized) == (400, 300)
+    info = stats.info()
+    assert (info.images, info.resized, info.original_bytes) == (1, 1, len(data))
+    assert info.bytes_saved == len(data) - len(resized) > 0
+
+
+def test_downscale_bytes():
+    """Test that an image within the dimension limits but over the byte limit is recompressed to fit."""
+    pytest.importorskip("PIL")
+    data = make_image(300, 200)
+
+    resized, mime_type = downscale(data, ImageLimits(max_bytes=20_000), stats=None)
+
+    assert mime_type == "image/jpeg"
+    assert len(resized) <= 20_000
+
+
+def test_downscale_keeps_transparency():
+    """Test that images with transparency stay PNG."""
+    pytest.importorskip("PIL")
+    data = make_image(400, 100, mode="RGBA")
+
+    resized, mime_type = downscale(data, ImageLimits(200), stats=None)
+
+    assert mime_type == "image/png"
+    assert image_size(resized) == (200, 50)
+
+
+@pytest.mark.parametrize("data", [b"plain text", b"%PDF-1.7 not an image"])
+def test_downscale_unchanged(data):
+    """Test that data Pillow cannot read is returned unchanged."""
+    pytest.importorskip("PIL")
+    stats = ResizeStats()
+
+    assert downscale(data, ImageLimits(1, 1, 1), stats=stats) == (data, None)
+    assert stats.info().resized == 0
+
+
+def test_downscale_within_limits():
+    """Test that an image within the limits is returned unchanged."""
+    pytest.importorskip("PIL")
+    data = make_image(100, 100)
+
+    assert downscale(data, ImageLimits(2048, 768, 2**20), stats=None) == (data, None)
+
+
+def test_downscale_without_pillow(monkeypatch):
+    """Test that images are returned unchanged with a warning if Pillow is not installed."""
+    import sys
+
+    monkeypatch.setitem(sys.modules, "PIL", None)
+
+    with pytest.warns(UserWarning, match="Pillow is not installed"):
+        assert downscale(PNG, ImageLimits(1, 1, 1), stats=None) == (PNG, None)
+
+
+def test_encode_image_resized(tmp_path):
+    """Test that encodings are cached separately with and without limits."""
+    pytest.importorskip("PIL")
+    path = tmp_path / "scan.png"
+    path.write_bytes(make_image(1000, 500))
+    cache = ImageCache()
+
+    original = encode_image(path, cache=cache)
+    resized = encode_image(path, cache=cache, limits=ImageLimits(500))
+
+    assert original["mime_type"] == "image/png"
+    assert resized["mime_type"] == "image/jpeg"
+    assert image_size(base64.b64decode(resized["data"])) == (500, 250)
+    assert encode_image(path, cache=cache, limits=ImageLimits(500)) == resized
+    assert cache.info()[:3] == (1, 2, 2)
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+
+# The cumulative time allowed for `import llmloader` in milliseconds.
+IMPORT_BUDGET_MS = float(os.getenv("LLMLOADER_IMPORT_BUDGET_MS", "100"))
+
+
+def run_python(code: str, *args: str) -> subprocess.CompletedProcess:
+    """Test helper to run code in a fresh Python interpreter.
+
+    Args:
+        code: The code to run.
+        *args: Extra arguments to pass to the interpreter before the code.
+
+    Returns:
+        subprocess.CompletedProcess: The completed process with captured output.
+    """
+    return subprocess.run([sys.executable, *args, "-c", code], capture_output=True, text=True, check=True)
+
+
+def import_time_ms(module: str = "llmloader") -> float:
+    """Test helper which measures the cumulative import time of a module with `python -X importtime`.
+
+    The best of several runs is used to reduce noise.
+
+    Args:
+        module: The name of the module to import.
+
+    Returns:
+        float: The cumulative import time in milliseconds.
+    """
+    timings = []
+    for _ in range(3):
+        result = run_python(f"import {module}", "-X", "importtime")
+        for line in result.stderr.splitlines():
+            # Lines are in the format: "import time: self [us] | cumulative | imported package"
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == module:
+                timings.append(int(fields[1]) / 1000)
+    assert timings, f"Could not find '{module}' in the importtime output"
+    return min(timings)
+
+
+def test_import_does_not_load_providers():
+    """Test that importing llmloader does not import langchain, provider SDKs or yaml."""
+    result = run_python("import sys, llmloader; print('\\n'.join(sys.modules))")
+    modules = set(result.stdout.split())
+
+    for heavy in ["langchain_core", "langchain_openai", "langchain_anthropic", "transformers", "torch", "yaml"]:
+        assert heavy not in modules, f"'import llmloader' should not import {heavy}"
+
+
+def test_lazy_attributes():
+    """Test that lazily imported attributes are still available from the package."""
+    import llmloader
+    from llmloader.wrappers import LLMWrapper
+
+    assert llmloader.LLMWrapper is LLMWrapper
+    assert "LLMWrapper" in dir(llmloader)
+
+
+def test_import_time_budget():
+    """Test that `import llmloader` stays within the import time budget."""
+    elapsed = import_time_ms()
+    assert elapsed < IMPORT_BUDGET_MS, f"'import llmloader' took {elapsed:.1f} ms (budget {IMPORT_BUDGET_MS} ms)"
+
+
+def test_loading_resolves_only_one_provider():
+    """Test that loading the dummy model does not import the SDKs of other providers."""
+    result = run_python("import sys, llmloader; llmloader.load('dummy'); print('\\n'.join(sys.modules))")
+    modules = set(result.stdout.split())
+
+    assert "llmloader.dummy_model" in modules
+    assert "langchain_openai" not in modules
+    assert "langchain_anthropic" not in modules
+
+
+def test_star_import():
+    """Test that `from llmloader import *` exports the public names, including the lazily imported ones."""
+    result = run_python("from llmloader import *; print(load.__name__, LLMWrapper.__name__, DummyLoader.__name__)")
+    assert result.stdout.split() == ["load", "LLMWrapper", "DummyLoader"]
+
+    import llmloader
+
+    assert all(hasattr(llmloader, name) for name in llmloader.__all__)
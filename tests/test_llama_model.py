@@ -0,0 +1,490 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from langchain_core.caches import InMemoryCache
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import llmloader
+from llmloader.llama_model import ChatLlama3
+from llmloader.prefix_cache import PrefixCache
+
+
+def echo_pipeline() -> MagicMock:
+    """Test helper returning a mock pipeline which answers each prompt with the prompt itself.
+
+    Returns:
+        MagicMock: A mock pipeline with a mock tokenizer. The calls made to it are recorded.
+    """
+    pipeline = MagicMock()
+    pipeline.tokenizer.apply_chat_template.side_effect = lambda messages, **kwargs: messages[-1]["content"]
+    pipeline.tokenizer.pad_token_id = 0
+    pipeline.side_effect = lambda prompts, **kwargs: [[{"generated_text": prompt.upper()}] for prompt in prompts]
+    return pipeline
+
+
+def chat_llama(pipeline, **kwargs) -> ChatLlama3:
+    """Test helper to wrap a pipeline in a ChatLlama3 model.
+
+    Args:
+        pipeline: The text generation pipeline (or a mock of it).
+        **kwargs: Extra fields for ChatLlama3.
+
+    Returns:
+        ChatLlama3: The chat model.
+    """
+    llm = MagicMock()
+    llm.pipeline = pipeline
+    return ChatLlama3.model_construct(llm=llm, **kwargs)
+
+
+def test_convert_messages():
+    """Test that LangChain messages are converted to Llama chat roles."""
+    messages = [SystemMessage("be brief"), HumanMessage("hi"), AIMessage("hello")]
+    assert ChatLlama3.convert_messages(messages) == [
+        {"role": "system", "content": "be brief"},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+
+
+def test_invoke():
+    """Test that a single conversation is generated through the pipeline."""
+    llm = chat_llama(echo_pipeline())
+    result = llm.invoke("hello")
+    assert isinstance(result, AIMessage)
+    assert result.content == "HELLO"
+
+
+def test_batch_micro_batches_and_order():
+    """Test that batch splits inputs into micro-batches sorted by length and keeps the original order.
+
+    The tokenizer is left-padded while generating and its padding side is restored afterwards.
+    """
+    pipeline = echo_pipeline()
+    pipeline.tokenizer.padding_side = "right"
+    padding_sides = []
+    generate = pipeline.side_effect
+
+    def record_padding_side(prompts, **kwargs):
+        padding_sides.append(pipeline.tokenizer.padding_side)
+        return generate(prompts, **kwargs)
+
+    pipeline.side_effect = record_padding_side
+    llm = chat_llama(pipeline, batch_size=2, max_batch_wait=0.05)
+    prompts = ["ccc", "a", "bbbb", "dd", "e"]
+
+    results = llm.batch(prompts)
+
+    assert [result.content for result in results] == [prompt.upper() for prompt in prompts]
+    assert [call.args[0] for call in pipeline.call_args_list] == [["a", "ccc"], ["dd", "bbbb"], ["e"]]
+    assert padding_sides == ["left"] * 3
+    assert pipeline.tokenizer.padding_side == "right"
+    assert pipeline.tokenizer.pad_token_id == 0
+
+
+def test_batch_in_running_event_loop():
+    """Test that batch can be called from code already running in an event loop."""
+    import asyncio
+
+    pipeline = echo_pipeline()
+    llm = chat_llama(pipeline)
+
+    async def run():
+        return llm.batch(["a", "b"])
+
+    assert [result.content for result in asyncio.run(run())] == ["A", "B"]
+    assert pipeline.call_count == 1
+
+
+def test_batch_callbacks():
+    """Test that batch reports the start and end of a run for each input to callbacks."""
+
+    class Recorder(BaseCallbackHandler):
+        def __init__(self):
+            self.started = 0
+            self.ended = 0
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.started += len(messages)
+
+        def on_llm_end(self, response, **kwargs):
+            self.ended += 1
+
+    recorder = Recorder()
+    llm = chat_llama(echo_pipeline())
+    llm.batch(["a", "b", "c"], config={"callbacks": [recorder]})
+
+    assert recorder.started == 3
+    assert recorder.ended == 3
+
+
+def test_batch_return_exceptions():
+    """Test that errors are returned for every input when return_exceptions is set."""
+    pipeline = echo_pipeline()
+    pipeline.side_effect = RuntimeError("out of memory")
+    llm = chat_llama(pipeline)
+
+    results = llm.batch(["a", "b"], return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    with pytest.raises(RuntimeError):
+        llm.batch(["a", "b"])
+
+
+def test_batch_tiny_model_matches_serial(tiny_llama_pipeline):
+    """Test that batched generation with a real model gives the same outputs as serial generation in one call.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+
+    class CountingPipeline:
+        # records the batch size of each call, passing everything else through to the real pipeline
+        def __init__(self, pipeline):
+            self.pipeline = pipeline
+            self.batch_sizes = []
+
+        def __getattr__(self, name):
+            return getattr(self.pipeline, name)
+
+        def __call__(self, prompts, **kwargs):
+            self.batch_sizes.append(kwargs["batch_size"])
+            return self.pipeline(prompts, **kwargs)
+
+    pipeline = CountingPipeline(tiny_llama_pipeline)
+    llm = chat_llama(pipeline, batch_size=16)
+    prompts = [f"Tell me about the number {i}. " * (1 + i % 4) for i in range(16)]
+
+    serial = [llm.invoke(prompt).content for prompt in prompts]
+    pipeline.batch_sizes.clear()
+    batched = [result.content for result in llm.batch(prompts)]
+
+    assert batched == serial
+    assert pipeline.batch_sizes == [16]
+
+
+def test_batch_per_input_config_and_stop():
+    """Test that batch gives each input the callbacks of its own config and cuts every response at the stop sequences."""
+
+    class Recorder(BaseCallbackHandler):
+        def __init__(self):
+            self.runs = []
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self.runs.append(run_id)
+
+    first, second = Recorder(), Recorder()
+    pipeline = echo_pipeline()
+    llm = chat_llama(pipeline)
+
+    results = llm.batch(
+        ["one stop two", "three"], config=[{"callbacks": [first]}, {"callbacks": [second]}], stop=["STOP"]
+    )
+
+    assert [result.content for result in results] == ["ONE ", "THREE"]
+    assert len(first.runs) == len(second.runs) == 1
+    assert first.runs != second.runs
+    assert pipeline.call_count == 1
+
+
+def test_batch_cache_and_rate_limiter():
+    """Test that batch answers cached inputs from the cache and only takes rate limiter requests for the others."""
+    pipeline = echo_pipeline()
+    rate_limiter = MagicMock()
+    rate_limiter.aacquire = AsyncMock()
+    llm = chat_llama(pipeline, cache=InMemoryCache(), rate_limiter=rate_limiter)
+
+    assert llm.invoke("a").content == "A"
+    results = llm.batch(["a", "b", "c"])
+
+    assert [result.content for result in results] == ["A", "B", "C"]
+    assert [call.args[0] for call in pipeline.call_args_list] == [["a"], ["b", "c"]]
+    assert rate_limiter.acquire.call_count == 1
+    assert rate_limiter.aacquire.call_count == 2
+    assert llm.batch(["c"])[0].content == "C"
+    assert pipeline.call_count == 2
+
+
+def test_batch_return_exceptions_keeps_cached_results():
+    """Test that a failed generation only fails the inputs which were not answered from the cache."""
+    pipeline = echo_pipeline()
+    llm = chat_llama(pipeline, cache=InMemoryCache())
+    llm.invoke("a")
+    pipeline.side_effect = RuntimeError("out of memory")
+
+    results = llm.batch(["a", "b"], return_exceptions=True)
+
+    assert results[0].content == "A"
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_stream_tiny_model(tiny_llama_pipeline):
+    """Test that streaming yields several chunks which join to the full response.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    llm = chat_llama(tiny_llama_pipeline)
+    expected = llm.invoke("Hello there").content
+
+    chunks = [chunk.content for chunk in llm.stream("Hello there")]
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == expected
+
+
+@pytest.mark.parametrize("options", [dict(stop="middle"), dict(max_new_tokens=3)])
+def test_stream_options_match_invoke(options, tiny_llama_pipeline):
+    """Test that streams honour stop sequences and generation options like invoke.
+
+    Args:
+        options: The call options. A stop of "middle" is replaced by two characters from the middle of the response.
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    import asyncio
+
+    llm = chat_llama(tiny_llama_pipeline)
+    if options.get("stop") == "middle":
+        full = llm.invoke("Hello there").content
+        options = dict(stop=[full[5:7]])
+    expected = llm.invoke("Hello there", **options).content
+
+    async def collect():
+        return "".join([chunk.content async for chunk in llm.astream("Hello there", **options)])
+
+    assert "".join(chunk.content for chunk in llm.stream("Hello there", **options)) == expected
+    assert asyncio.run(collect()) == expected
+    assert len(expected) == (5 if "stop" in options else 3)
+
+
+def test_stream_stop_across_chunks():
+    """Test that text which could start a stop sequence is held back until the next chunk shows whether it does."""
+    pytest.importorskip("transformers")
+    pipeline = echo_pipeline()
+    pipeline.tokenizer.decode.return_value = ""
+
+    def generate(prompt, streamer, stopping_criteria, **kwargs):
+        for text in ["one S", "T", "OP two"]:
+            streamer.on_finalized_text(text)
+        streamer.end()
+
+    pipeline.side_effect = generate
+    llm = chat_llama(pipeline)
+
+    def chunks(stop):
+        # LangChain ends every stream with an empty chunk
+        return [chunk.content for chunk in llm.stream("hi", stop=stop) if chunk.content]
+
+    assert chunks(["STOP"]) == ["one "]
+    assert chunks(["SX"]) == ["one ", "ST", "OP two"]
+
+
+def test_stream_stops_early(tiny_llama_pipeline):
+    """Test that stopping the stream early stops generation and joins the background thread.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    import threading
+
+    llm = chat_llama(tiny_llama_pipeline)
+    stream = llm.stream("Hello there")
+    next(stream)
+    stream.close()
+
+    assert not any(thread.name == "ChatLlama3-stream" for thread in threading.enumerate())
+
+
+def test_astream_tiny_model(tiny_llama_pipeline):
+    """Test that asynchronous streaming yields the same response as the synchronous stream.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    import asyncio
+
+    llm = chat_llama(tiny_llama_pipeline)
+    expected = "".join(chunk.content for chunk in llm.stream("Hello there"))
+
+    async def collect():
+        return [chunk.content async for chunk in llm.astream("Hello there")]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    assert "".join(chunks) == expected
+
+
+def test_astream_cancelled_while_reading():
+    """Test that cancelling an async stream while a chunk is being read stops generation and joins the thread."""
+    import asyncio
+    import threading
+    import time
+
+    pytest.importorskip("transformers")
+    pipeline = echo_pipeline()
+    pipeline.tokenizer.decode.return_value = ""
+
+    def generate(prompt, streamer, stopping_criteria, **kwargs):
+        # one token, then nothing until generation is stopped, so the next read is in flight when the task is cancelled
+        streamer.on_finalized_text("hello")
+        while not stopping_criteria[0](None, None):
+            time.sleep(0.01)
+        streamer.end()
+
+    pipeline.side_effect = generate
+    llm = chat_llama(pipeline)
+
+    async def run():
+        received = asyncio.Event()
+
+        async def consume():
+            async for _ in llm.astream("hi"):
+                received.set()
+
+        task = asyncio.ensure_future(consume())
+        await received.wait()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not any(thread.name == "ChatLlama3-stream" for thread in threading.enumerate())
+
+
+def test_stream_error_is_raised():
+    """Test that an error in the generation thread is raised to the consumer rather than hanging."""
+    pytest.importorskip("transformers")
+    pipeline = echo_pipeline()
+    pipeline.tokenizer.decode.return_value = ""
+    pipeline.side_effect = RuntimeError("generation failed")
+    llm = chat_llama(pipeline)
+
+    with pytest.raises(RuntimeError, match="generation failed"):
+        list(llm.stream("hello"))
+
+
+def test_agenerate_batches_concurrent_requests():
+    """Test that concurrent async calls are gathered into batches and each caller gets its own result."""
+    import asyncio
+
+    pipeline = echo_pipeline()
+    llm = chat_llama(pipeline, batch_size=4, max_batch_wait=0.05)
+    prompts = [f"prompt {i}" for i in range(10)]
+
+    async def run():
+        return await asyncio.gather(*(llm.ainvoke(prompt) for prompt in prompts))
+
+    results = asyncio.run(run())
+
+    assert [result.content for result in results] == [prompt.upper() for prompt in prompts]
+    assert [len(call.args[0]) for call in pipeline.call_args_list] == [4, 4, 2]
+    metrics = llm.scheduler.metrics()
+    assert metrics["batches"] == 3
+    assert metrics["requests"] == 10
+    assert metrics["mean_batch_size"] == pytest.approx(10 / 3)
+    assert metrics["queue_depth"] == 0
+
+
+def test_agenerate_stop_and_options():
+    """Test that async calls honour stop sequences and generation options, batching only calls which share them."""
+    import asyncio
+
+    pipeline = echo_pipeline()
+    llm = chat_llama(pipeline, batch_size=4, max_batch_wait=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            llm.ainvoke("one stop two", stop=["STOP"]),
+            llm.ainvoke("three stop four", stop=["STOP"]),
+            llm.ainvoke("five", max_new_tokens=3),
+        )
+
+    results = asyncio.run(run())
+
+    assert [result.content for result in results] == ["ONE ", "THREE ", "FIVE"]
+    assert [call.args[0] for call in pipeline.call_args_list] == [["one stop two", "three stop four"], ["five"]]
+    assert "max_new_tokens" not in pipeline.call_args_list[0].kwargs
+    assert pipeline.call_args_list[1].kwargs["max_new_tokens"] == 3
+
+
+def test_agenerate_error_reaches_every_caller():
+    """Test that an error while generating a batch is raised by every call in the batch."""
+    import asyncio
+
+    pipeline = echo_pipeline()
+    pipeline.side_effect = RuntimeError("out of memory")
+    llm = chat_llama(pipeline)
+
+    async def run():
+        return await asyncio.gather(*(llm.ainvoke(str(i)) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_scheduler_max_wait():
+    """Test that a lone request is not held for longer than the maximum wait."""
+    import asyncio
+    import time
+
+    from llmloader.scheduler import BatchScheduler
+
+    scheduler = BatchScheduler(lambda requests: requests, max_batch_size=8, max_wait=0.02)
+
+    async def run():
+        start = time.perf_counter()
+        result = await scheduler.submit("a")
+        return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result == "a"
+    assert elapsed < 1.0
+    assert scheduler.metrics()["last_batch_size"] == 1
+
+    # a new event loop gets a new queue
+    assert asyncio.run(scheduler.submit("b")) == "b"
+
+
+def test_load_prefix_cache(tiny_llama_pipeline, monkeypatch):
+    """Test that `load` gives a Llama model the prefix cache passed to it, or a new one for True.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+        monkeypatch: Pytest fixture for removing any custom endpoint.
+    """
+    from langchain_community.llms import HuggingFacePipeline
+
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+    cache = PrefixCache()
+    with patch("llmloader.llama.HuggingFaceLoader.__call__") as huggingface:
+        huggingface.return_value = HuggingFacePipeline(pipeline=tiny_llama_pipeline)
+
+        assert llmloader.load("meta-llama/Llama-3-8B").prefix_cache is None
+        assert llmloader.load("meta-llama/Llama-3-8B", prefix_cache=cache).prefix_cache is cache
+        assert isinstance(llmloader.load("meta-llama/Llama-3-8B", prefix_cache=True).prefix_cache, PrefixCache)
+
+    assert all("prefix_cache" not in call.kwargs for call in huggingface.call_args_list)
+
+
+def test_load_batch_options(tiny_llama_pipeline, monkeypatch):
+    """Test that `load` sets the batch size and wait of a Llama model, keeping the defaults when they are not given.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+        monkeypatch: Pytest fixture for removing any custom endpoint.
+    """
+    from langchain_community.llms import HuggingFacePipeline
+
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+    with patch("llmloader.llama.HuggingFaceLoader.__call__") as huggingface:
+        huggingface.return_value = HuggingFacePipeline(pipeline=tiny_llama_pipeline)
+
+        llm = llmloader.load("meta-llama/Llama-3-8B", batch_size=32, max_batch_wait=0.1)
+        default = llmloader.load("meta-llama/Llama-3-8B")
+
+    assert (llm.batch_size, llm.max_batch_wait) == (32, 0.1)
+    assert (llm.scheduler.max_batch_size, llm.scheduler.max_wait) == (32, 0.1)
+    assert (default.batch_size, default.max_batch_wait) == (8, 0.01)
+    assert all("batch_size" not in call.kwargs for call in huggingface.call_args_list)
@@ -1,3 +1,10 @@
+import json
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
 from typer.testing import CliRunner
 
 from llmloader.main import app
@@ -5,6 +12,28 @@ from llmloader.main import app
 runner = CliRunner()
 
 
+class UsageChatModel(BaseChatModel):
+    """A chat model which responds with a fixed text, word by word when streaming, and reports its token usage."""
+
+    text: str = "Roses are red [not blue]"
+
+    @property
+    def _llm_type(self) -> str:
+        return "usage"
+
+    def usage(self) -> dict:
+        return dict(input_tokens=5, output_tokens=len(self.text.split()), total_tokens=5 + len(self.text.split()))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = AIMessage(content=self.text, usage_metadata=self.usage())
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in self.text.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self.usage()))
+
+
 def call(model_name: str, prompt: str = "Write me a haiku about love"):
     """Test helper function to invoke the CLI app with a model and prompt.
 
@@ -45,3 +74,134 @@ def test_call_providers(providers, monkeypatch):
         for env_var in env_vars:
             monkeypatch.setenv(env_var, "dummyenv")
         call(name, prompt)
+
+
+def test_batch_file(tmp_path):
+    """Test running the prompts in a file with the dummy model and restarting the run."""
+    input = tmp_path / "prompts.jsonl"
+    output = tmp_path / "results.jsonl"
+    input.write_text('"first"\n{"id": "x", "prompt": "second"}\n')
+    output.write_text('{"id": "1", "response": "first"}\n')
+
+    result = runner.invoke(app, ["--model", "dummy", "--input", str(input), "--output", str(output)])
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert "1 completed, 0 failed, 1 skipped" in result.stdout
+    assert output.read_text().splitlines()[-1] == '{"id": "x", "response": "second"}'
+
+
+def test_batch_file_adaptive(tmp_path):
+    """Test that --adaptive runs the prompts under an adaptive concurrency limit and reports it."""
+    input = tmp_path / "prompts.jsonl"
+    output = tmp_path / "results.jsonl"
+    input.write_text("".join(f'"prompt {i}"\n' for i in range(5)))
+
+    result = runner.invoke(
+        app, ["--model", "dummy", "--input", str(input), "--output", str(output), "--adaptive", "--concurrency", "2"]
+    )
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert "5 completed, 0 failed" in result.stdout
+    assert "Concurrency limit: " in result.stdout
+
+
+def test_batch_file_requires_output(tmp_path):
+    """Test that an output file is required with an input file."""
+    input = tmp_path / "prompts.jsonl"
+    input.write_text('"first"\n')
+
+    result = runner.invoke(app, ["--model", "dummy", "--input", str(input)])
+
+    assert result.exit_code != 0
+
+
+def test_batch_file_invalid(tmp_path):
+    """Test that an invalid input file is reported as a bad parameter before the model is called."""
+    input = tmp_path / "prompts.jsonl"
+    output = tmp_path / "results.jsonl"
+    input.write_text('"first"\nnot json\n')
+
+    result = runner.invoke(app, ["--model", "dummy", "--input", str(input), "--output", str(output)])
+
+    assert result.exit_code == 2
+    assert "Line 2" in result.output
+    assert not output.exists()
+
+
+def test_stream_dummy():
+    """Test streaming the response of the dummy model."""
+    result = runner.invoke(app, ["Write me a haiku about love", "--model", "dummy", "--stream"])
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert result.stdout.strip() == "Write me a haiku about love"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_timing(stream, monkeypatch):
+    """Test that the timing report uses the token usage of the response.
+
+    Args:
+        stream (bool): Whether to stream the response.
+        monkeypatch: Pytest fixture for patching attributes.
+    """
+    monkeypatch.setattr("llmloader.main.load", lambda **kwargs: UsageChatModel())
+
+    args = ["Write me a poem", "--timing"] + (["--stream"] if stream else [])
+    result = runner.invoke(app, args)
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    lines = result.stdout.splitlines()
+    assert lines[0].strip() == "Roses are red [not blue]"
+    assert lines[1].startswith("Time to first token: ")
+    assert lines[2].startswith("Total latency: ")
+    assert lines[3].startswith("Output tokens: 5 (")
+    assert lines[3].endswith(" tokens/sec)")
+
+
+def test_timing_without_usage():
+    """Test the timing report for a model which does not report token usage."""
+    result = runner.invoke(app, ["Hello", "--model", "dummy", "--timing"])
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert "Output tokens: not reported by the model" in result.stdout
+
+
+def test_record_and_usage(tmp_path, monkeypatch):
+    """Test recording the usage of a prompt and printing the totals from the ledger.
+
+    Args:
+        tmp_path: Pytest fixture providing a temporary directory.
+        monkeypatch: Pytest fixture for patching attributes.
+    """
+    record = tmp_path / "usage.sqlite"
+    response = AIMessage(
+        content="Roses are red",
+        response_metadata=dict(
+            model_name="gpt-4o",
+            model_provider="openai",
+            token_usage=dict(input_tokens=5, output_tokens=3, total_tokens=8),
+        ),
+    )
+    monkeypatch.setattr("llmloader.main.load", lambda **kwargs: RunnableLambda(lambda prompt: response))
+
+    for _ in range(2):
+        result = runner.invoke(app, ["Write me a poem", "--record", str(record)])
+        assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+
+    result = runner.invoke(app, ["usage", str(record), "--by", "model", "--by", "provider", "--json"])
+
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert json.loads(result.stdout) == [
+        dict(model="gpt-4o", provider="openai", requests=2, input_tokens=10, output_tokens=6, total_tokens=16)
+    ]
+
+    result = runner.invoke(app, ["usage", str(record)])
+    assert result.exit_code == 0, f"{result.stdout}, {result.exception}"
+    assert "gpt-4o" in result.stdout
+
+
+def test_usage_missing_ledger(tmp_path):
+    """Test that the usage command reports a missing ledger."""
+    result = runner.invoke(app, ["usage", str(tmp_path / "missing.sqlite")])
+
+    assert result.exit_code != 0
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+
+import llmloader
+from llmloader.metrics import Histogram, Metrics, MetricsCallback, default_metrics
+
+
+def test_histogram_buckets():
+    """Test that observations are counted in cumulative buckets, with a value on a bound in that bucket."""
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("0.1", 2), ("1", 3), ("+Inf", 4)]
+    assert histogram.snapshot()["sum"] == pytest.approx(2.65)
+
+
+def test_load_metrics():
+    """Test that `load(..., metrics=...)` records latency, token usage and errors labeled by loader and model."""
+    metrics = Metrics()
+    llm = llmloader.load("dummy?output_tokens=3", metrics=metrics)
+    failing = llmloader.load("dummy?error_rate=1", metrics=metrics)
+
+    assert isinstance(llm.callbacks[-1], MetricsCallback)
+    llm.invoke("one two")
+    asyncio.run(llm.ainvoke("one two"))
+    with pytest.raises(Exception):
+        failing.invoke("hi")
+
+    ok, failed = metrics.snapshot()
+    assert (ok["provider"], ok["model"]) == ("dummy", "dummy?output_tokens=3")
+    assert (ok["requests"], ok["input_tokens"], ok["output_tokens"]) == (2, 4, 6)
+    assert ok["latency"]["count"] == 2
+    assert ok["time_to_first_token"]["count"] == 0
+    assert (failed["requests"], failed["errors"]) == (1, {"RateLimitError": 1})
+    assert failed["latency"]["count"] == 0
+
+
+def test_stream_time_to_first_token():
+    """Test that streams record the time to their first token and the usage reported at the end."""
+    metrics = Metrics()
+    llm = llmloader.load("dummy?latency_ms=30&tps=100&output_tokens=4", metrics=metrics)
+
+    list(llm.stream("hi"))
+
+    (snapshot,) = metrics.snapshot()
+    ttft = snapshot["time_to_first_token"]
+    assert ttft["count"] == 1
+    assert 0.03 <= ttft["sum"] < snapshot["latency"]["sum"]
+    assert snapshot["output_tokens"] == 4
+
+
+def test_default_metrics():
+    """Test that `metrics=True` records in the default metrics."""
+    default_metrics.reset()
+    llmloader.load("dummy?", metrics=True).invoke("hi")
+
+    assert default_metrics.snapshot()[0]["requests"] == 1
+    default_metrics.reset()
+    assert default_metrics.snapshot() == []
+
+
+def test_prometheus():
+    """Test the Prometheus text format, including escaped label values and histograms only for streamed models."""
+    metrics = Metrics(buckets=(1.0,))
+    metrics.record("openai", 'gpt "4o"', 0.5, None, input_tokens=3, output_tokens=5)
+    metrics.record("anthropic", "claude", 2.0, 0.25)
+    metrics.record_error("anthropic", "claude", TimeoutError())
+
+    text = metrics.prometheus()
+
+    labels = 'provider="openai",model="gpt \\"4o\\""'
+    assert f"llmloader_requests_total{{{labels}}} 1\n" in text
+    assert f'llmloader_tokens_total{{{labels},type="output"}} 5\n' in text
+    assert f'llmloader_request_duration_seconds_bucket{{{labels},le="1"}} 1\n' in text
+    assert f"llmloader_request_duration_seconds_sum{{{labels}}} 0.5\n" in text
+    assert 'llmloader_errors_total{provider="anthropic",model="claude",error="TimeoutError"} 1\n' in text
+    assert 'llmloader_time_to_first_token_seconds_bucket{provider="anthropic",model="claude",le="+Inf"} 1\n' in text
+    assert f"llmloader_time_to_first_token_seconds_count{{{labels}}}" not in text
+    assert "# TYPE llmloader_request_duration_seconds histogram\n" in text
+
+
+def test_concurrent_calls():
+    """Test that calls from several threads are all recorded."""
+    metrics = Metrics()
+    llm = llmloader.load("dummy?", metrics=metrics)
+    threads = [threading.Thread(target=lambda: [llm.invoke("hi") for _ in range(25)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert metrics.snapshot()[0]["requests"] == 100
+    assert llm.callbacks[-1]._starts == {}
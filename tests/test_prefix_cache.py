@@ -0,0 +1,129 @@
+import pytest
+
+from llmloader.prefix_cache import PrefixCache, cache_nbytes
+
+
+def test_get_put():
+    """Test that a stored prefix is returned as a copy and that hits and misses are counted."""
+    cache = PrefixCache()
+    value = [[1, 2], [3, 4]]
+
+    assert cache.get([1, 2, 3]) is None
+    cache.put([1, 2, 3], value)
+    result = cache.get([1, 2, 3])
+
+    assert result == value
+    assert result is not value
+    info = cache.info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.entries == 1
+
+
+def test_models_do_not_share_entries():
+    """Test that the same prefix computed by another model is not a hit."""
+    cache = PrefixCache()
+    cache.put([1, 2, 3], [[1]], model="llama-8b")
+
+    assert cache.get([1, 2, 3], model="llama-70b") is None
+    assert cache.get([1, 2, 3], model="llama-8b") == [[1]]
+
+
+def test_byte_budget_eviction():
+    """Test that the least recently used prefixes are evicted when the byte budget is exceeded."""
+    torch = pytest.importorskip("torch")
+    tensor = torch.zeros(100, dtype=torch.float32)  # 400 bytes
+    cache = PrefixCache(max_bytes=1000)
+
+    cache.put([1], (tensor, tensor.clone()))
+    cache.put([2], (tensor.clone(), tensor.clone()))
+    assert len(cache) == 1
+
+    assert cache.get([1]) is None
+    assert cache.get([2]) is not None
+    assert cache.info().bytes == 800
+
+
+def test_too_large_not_stored():
+    """Test that a prefix larger than the whole budget is not stored."""
+    torch = pytest.importorskip("torch")
+    cache = PrefixCache(max_bytes=10)
+    cache.put([1], (torch.zeros(100),))
+    assert len(cache) == 0
+
+
+def test_cache_nbytes_dynamic_cache(tiny_llama_pipeline):
+    """Test that the size of a transformers cache is measured.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    import torch
+
+    with torch.no_grad():
+        past_key_values = tiny_llama_pipeline.model(torch.tensor([[1, 5, 6, 7]]), use_cache=True).past_key_values
+
+    # 2 layers x (keys + values) x 2 key value heads x 4 tokens x 16 dimensions x 4 bytes
+    assert cache_nbytes(past_key_values) == 2 * 2 * 2 * 4 * 16 * 4
+
+
+def test_chat_llama_prefix_cache(tiny_llama_pipeline):
+    """Test that ChatLlama3 gives the same response with the prefix cache and reuses the cached system prompt.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    from unittest.mock import MagicMock
+
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from llmloader.llama_model import ChatLlama3
+
+    llm = MagicMock()
+    llm.pipeline = tiny_llama_pipeline
+    system = SystemMessage("You are a helpful assistant who answers briefly. " * 8)
+
+    plain = ChatLlama3.model_construct(llm=llm)
+    cached = ChatLlama3.model_construct(llm=llm, prefix_cache=PrefixCache())
+
+    for question in ["What is one plus one?", "Name a colour."]:
+        messages = [system, HumanMessage(question)]
+        assert cached.invoke(messages).content == plain.invoke(messages).content
+
+    info = cached.prefix_cache.info()
+    assert info.misses == 1
+    assert info.hits == 1
+    assert info.bytes > 0
+
+
+def test_chat_llama_prefix_cache_shared_by_models(tiny_llama_pipeline):
+    """Test that two models sharing a prefix cache do not reuse each other's keys and values.
+
+    Args:
+        tiny_llama_pipeline: Fixture providing a pipeline with a tiny Llama model.
+    """
+    import copy
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from llmloader.llama_model import ChatLlama3
+
+    cache = PrefixCache()
+    messages = [SystemMessage("You are a helpful assistant who answers briefly. " * 8), HumanMessage("Hi")]
+    models = []
+    for model in (tiny_llama_pipeline.model, copy.deepcopy(tiny_llama_pipeline.model)):
+        llm = MagicMock()
+        llm.pipeline = SimpleNamespace(
+            model=model,
+            tokenizer=tiny_llama_pipeline.tokenizer,
+            generation_config=tiny_llama_pipeline.generation_config,
+        )
+        models.append(ChatLlama3.model_construct(llm=llm, prefix_cache=cache))
+
+    for model in models:
+        model.invoke(messages)
+
+    assert cache.info().misses == 2
+    assert cache.info().entries == 2
@@ -0,0 +1,228 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from functools import partial
+from uuid import uuid4
+
+import pytest
+from langchain_core.caches import InMemoryCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from mocks.models import Clock
+
+import llmloader
+from llmloader.rate_limit import RateLimitCallback, RateLimiter
+
+
+def test_requests_per_minute(tmp_path):
+    """Test that the request bucket empties and refills at the configured rate."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(requests_per_minute=3, path=tmp_path / "limits.sqlite", clock=clock)
+
+    assert [limiter.acquire(blocking=False) for _ in range(4)] == [True, True, True, False]
+    clock.now += 20
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+
+
+def test_tokens_per_minute_settled(tmp_path):
+    """Test that each request reserves tokens and that settling returns unused tokens or takes extra ones."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(tokens_per_minute=1000, estimated_tokens=400, path=tmp_path / "limits.sqlite", clock=clock)
+
+    assert limiter.acquire(blocking=False)
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+    assert limiter.info().tokens == 200
+
+    limiter.settle(100)
+    assert limiter.info().tokens == 500
+    assert limiter.acquire(blocking=False)
+
+    limiter.settle(1500)  # far more than reserved leaves the bucket in debt
+    assert limiter.info().tokens == -1000
+    assert limiter._wait_time(1, -1000) == pytest.approx(84)
+
+
+def test_limiters_share_budget_by_name(tmp_path):
+    """Test that limiters with the same name and file share a budget and that other names are independent."""
+    path = tmp_path / "limits.sqlite"
+    first = RateLimiter(requests_per_minute=1, name="gpt-4o", path=path)
+    second = RateLimiter(requests_per_minute=1, name="gpt-4o", path=path)
+    other = RateLimiter(requests_per_minute=1, name="claude", path=path)
+
+    assert first.acquire(blocking=False)
+    assert not second.acquire(blocking=False)
+    assert other.acquire(blocking=False)
+
+
+def test_waiters_are_served_in_order(tmp_path):
+    """Test that blocked callers are served first come, first served."""
+    limiter = RateLimiter(requests_per_minute=1200, path=tmp_path / "limits.sqlite", poll_interval=0.005)
+    limiter._store(limiter._connection(), 0, 0, time.time())
+    order = []
+
+    def wait(index: int) -> None:
+        limiter.acquire()
+        order.append(index)
+
+    threads = []
+    for index in range(4):
+        threads.append(threading.Thread(target=wait, args=(index,)))
+        threads[-1].start()
+        while limiter.info().waiting < index + 1 and not order:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+
+    assert order == [0, 1, 2, 3]
+    assert limiter.info().waiting == 0
+
+
+def test_stale_waiters_are_removed(tmp_path):
+    """Test that a waiter whose process stopped polling no longer blocks the queue."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(requests_per_minute=10, path=tmp_path / "limits.sqlite", clock=clock)
+    limiter._enqueue()
+
+    assert not limiter.acquire(blocking=False)
+    clock.now += 11
+    assert limiter.acquire(blocking=False)
+    assert limiter.info().waiting == 0
+
+
+def test_async_acquire(tmp_path):
+    """Test that `aacquire` waits for the bucket to refill."""
+    import asyncio
+
+    limiter = RateLimiter(requests_per_minute=600, path=tmp_path / "limits.sqlite")
+    limiter._store(limiter._connection(), 0, 0, time.time())
+
+    start = time.perf_counter()
+    assert asyncio.run(limiter.aacquire())
+    assert time.perf_counter() - start >= 0.05
+
+
+def take_requests(path: str, results) -> None:
+    """Takes as many requests as the shared budget allows, in another process."""
+    limiter = RateLimiter(requests_per_minute=10, path=path)
+    results.put(sum(limiter.acquire(blocking=False) for _ in range(10)))
+
+
+def test_processes_share_budget(tmp_path):
+    """Test that several processes draw from one budget in the shared file."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    path = str(tmp_path / "limits.sqlite")
+    RateLimiter(requests_per_minute=10, path=path)
+    processes = [context.Process(target=take_requests, args=(path, results)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    # the bucket refills by one request every 6 seconds while the processes run
+    assert sum(results.get() for _ in processes) in (10, 11)
+
+
+def test_callback_settles_usage(tmp_path):
+    """Test that the callback settles the reported usage, keeps the reservation without it and refunds errors."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(tokens_per_minute=1000, estimated_tokens=100, path=tmp_path / "limits.sqlite", clock=clock)
+    callback = RateLimitCallback(limiter)
+
+    def call(end) -> None:
+        run_id = uuid4()
+        callback.on_chat_model_start({}, [], run_id=run_id)
+        limiter.acquire()
+        end(run_id=run_id)
+
+    def result(message: AIMessage) -> LLMResult:
+        return LLMResult(generations=[[ChatGeneration(message=message)]])
+
+    usage = AIMessage(content="", response_metadata={"token_usage": {"total_tokens": 30}})
+    call(partial(callback.on_llm_end, result(usage)))
+    assert limiter.info().tokens == 970
+
+    call(partial(callback.on_llm_end, result(AIMessage(content=""))))
+    assert limiter.info().tokens == 870
+
+    call(partial(callback.on_llm_error, TimeoutError()))
+    assert limiter.info().tokens == 870
+
+
+def test_cached_responses_are_not_charged(tmp_path):
+    """Test that a response from the cache, which takes no request from the limiter, does not settle tokens."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(tokens_per_minute=1000, estimated_tokens=100, path=tmp_path / "limits.sqlite", clock=clock)
+    llm = llmloader.load("dummy?output_tokens=5", cache=InMemoryCache(), rate_limit=limiter)
+
+    llm.invoke("hi")
+    assert limiter.info().tokens == 994
+    llm.invoke("hi")
+    assert limiter.info().tokens == 994
+
+
+def test_errors_before_acquire_are_not_refunded(tmp_path):
+    """Test that a call cancelled while waiting for the limiter does not return tokens it never reserved."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(
+        requests_per_minute=1,
+        tokens_per_minute=1000,
+        estimated_tokens=100,
+        path=tmp_path / "limits.sqlite",
+        clock=clock,
+    )
+    llm = llmloader.load("dummy?output_tokens=5", rate_limit=limiter)
+
+    async def run():
+        await llm.ainvoke("hi")
+        task = asyncio.ensure_future(llm.ainvoke("hi"))
+        await asyncio.sleep(0.05)
+        assert limiter.info().waiting == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert limiter.info() == (0, 994, 0)
+    assert limiter._reserved == set()
+
+
+def test_load_rate_limit(openai_mock_setup, credentials, tmp_path):
+    """Test that `load(..., rate_limit=...)` sets a limiter named after the model and a callback that settles usage.
+
+    Args:
+        openai_mock_setup (tuple): Fixture providing mocked OpenAI setup.
+        credentials (dict): Fixture providing test credentials for all models.
+    """
+    llm = llmloader.load(
+        **credentials["openai"], rate_limit=dict(requests_per_minute=100, path=tmp_path / "limits.sqlite")
+    )
+
+    assert isinstance(llm.rate_limiter, RateLimiter)
+    assert llm.rate_limiter.name.startswith("gpt-5.1@")
+    assert isinstance(llm.callbacks[-1], RateLimitCallback)
+    assert llm.callbacks[-1].limiter is llm.rate_limiter
+
+    limiter = RateLimiter(requests_per_minute=100, path=tmp_path / "limits.sqlite")
+    assert llmloader.load(**credentials["openai"], rate_limit=limiter).rate_limiter is limiter
+
+
+def test_requires_a_limit(tmp_path):
+    """Test that a limiter needs a request or token limit."""
+    with pytest.raises(ValueError):
+        RateLimiter(path=tmp_path / "limits.sqlite")
+
+
+def test_chat_model_acquires(scripted_model, tmp_path):
+    """Test that a chat model takes a request from its limiter for each call."""
+    clock = Clock(1000.0)
+    limiter = RateLimiter(requests_per_minute=5, path=tmp_path / "limits.sqlite", clock=clock)
+    llm = scripted_model(rate_limiter=limiter)
+
+    llm.invoke("hi")
+    list(llm.stream("hi"))
+
+    assert limiter.info().requests == 3
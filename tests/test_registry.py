@@ -0,0 +1,211 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+import llmloader
+from llmloader.loader import Loader
+from llmloader.registry import LoaderRegistry, PrefixTrie
+
+
+class EchoLoader(Loader):
+    prefixes = ("echo",)
+
+    def __call__(self, model: str, *args, **kwargs):
+        if not model.startswith(self.prefixes):
+            return None
+        return f"loaded {model}"
+
+
+@pytest.fixture()
+def no_endpoint(monkeypatch):
+    """Pytest fixture ensuring that no custom endpoint is set in the environment.
+
+    Args:
+        monkeypatch: Pytest fixture for safely modifying environment variables.
+    """
+    monkeypatch.delenv("CUSTOM_ENDPOINT", raising=False)
+
+
+def test_prefix_trie_longest_first():
+    """Test that the trie returns every matching prefix with the longest first."""
+    trie = PrefixTrie()
+    trie.insert("meta", "short")
+    trie.insert("meta-llama/Llama", "long")
+    trie.insert("gpt", "other")
+
+    assert trie.matches("meta-llama/Llama-3-8B") == ["long", "short"]
+    assert trie.matches("gpt-4o") == ["other"]
+    assert trie.matches("unknown") == []
+
+
+@pytest.mark.parametrize(
+    "model,loader_name",
+    [
+        ("gpt-4o", "OpenAILoader"),
+        ("o1-mini", "OpenAILoader"),
+        ("claude-sonnet-4-5", "AnthropicLoader"),
+        ("gemini-2.5-flash", "GeminiLoader"),
+        ("gemma-3", "GeminiLoader"),
+        ("grok-4-latest", "XAILoader"),
+        ("mistral-small-latest", "MistralLoader"),
+        ("pixtral-large", "MistralLoader"),
+        ("meta-llama/Llama-3.3-70B-Instruct", "LlamaLoader"),
+        ("dummy", "DummyLoader"),
+        ("deployed_model_name", "AzureAILoader"),
+        ("openai/gpt-5-mini", "OpenRouterLoader"),
+    ],
+)
+def test_resolve(model, loader_name, no_endpoint, openai_mock_setup):
+    """Test that each model name resolves to the expected loader without constructing a client.
+
+    Args:
+        model (str): The model name to resolve.
+        loader_name (str): The class name of the expected loader.
+        no_endpoint: Fixture removing any custom endpoint.
+        openai_mock_setup (tuple): Fixture providing mocked OpenAI setup.
+    """
+    mock, _ = openai_mock_setup
+    loader = llmloader.resolve(model)
+    assert loader.__class__.__name__ == loader_name
+    mock.assert_not_called()
+
+
+def test_resolve_with_endpoint(no_endpoint):
+    """Test that loaders which do not serve custom endpoints are skipped when an endpoint is given.
+
+    Args:
+        no_endpoint: Fixture removing any custom endpoint.
+    """
+    assert llmloader.resolve("gpt-4o", endpoint="https://example.com/models").__class__.__name__ == "AzureAILoader"
+    assert llmloader.resolve("dummy", endpoint="https://example.com/models").__class__.__name__ == "DummyLoader"
+
+
+def test_candidates_only_try_matching_loaders(no_endpoint):
+    """Test that only prefix-matched loaders and fallbacks are tried for a model name."""
+    registry = llmloader.default_registry
+    names = [loader.__class__.__name__ for loader in registry.candidates("claude-3")]
+    assert names == ["AnthropicLoader", "AzureAILoader", "OpenRouterLoader"]
+
+    names = [loader.__class__.__name__ for loader in registry.candidates("unknown-model")]
+    assert names == ["AzureAILoader", "OpenRouterLoader"]
+
+
+def test_negative_cache():
+    """Test that names which no loader claims are remembered and forgotten when a loader is registered."""
+    registry = LoaderRegistry([EchoLoader()], entry_point_group="")
+    registry._trie = MagicMock(wraps=registry._trie)
+
+    assert registry.candidates("unknown") == []
+    assert registry.candidates("unknown") == []
+    assert registry._trie.matches.call_count == 1
+
+    registry.register(EchoLoader)
+    assert "unknown" not in registry._matches
+
+
+def test_register_and_unregister():
+    """Test that registered loaders can be resolved and removed again."""
+    registry = LoaderRegistry(entry_point_group="")
+    loader = registry.register(EchoLoader)
+
+    assert registry.resolve("echo-1") is loader
+    registry.unregister(loader)
+    assert registry.resolve("echo-1") is None
+
+
+class CatchAllLoader(Loader):
+    def __call__(self, model: str, *args, **kwargs):
+        return f"caught {model}"
+
+
+def test_registered_fallback_before_catch_alls(no_endpoint, monkeypatch):
+    """Test that a registered loader without prefixes is tried before the Azure AI and OpenRouter fallbacks.
+
+    Args:
+        no_endpoint: Fixture removing any custom endpoint.
+        monkeypatch: Pytest fixture for replacing the registry.
+    """
+    loaders = list(llmloader.loaders)
+    monkeypatch.setattr(llmloader, "loaders", loaders)
+    monkeypatch.setattr(llmloader, "default_registry", LoaderRegistry(loaders, entry_point_group=""))
+
+    loader = llmloader.register(CatchAllLoader)
+
+    names = [loader.__class__.__name__ for loader in llmloader.default_registry.candidates("unknown-model")]
+    assert names == ["CatchAllLoader", "AzureAILoader", "OpenRouterLoader"]
+    assert llmloader.load("unknown-model") == "caught unknown-model"
+    assert loader in llmloader.loaders
+
+
+def test_loaders_list_edits(no_endpoint, monkeypatch):
+    """Test that editing the `llmloader.loaders` list in place changes the loaders that are tried.
+
+    Args:
+        no_endpoint: Fixture removing any custom endpoint.
+        monkeypatch: Pytest fixture for replacing the registry.
+    """
+    loaders = list(llmloader.loaders)
+    monkeypatch.setattr(llmloader, "loaders", loaders)
+    monkeypatch.setattr(llmloader, "default_registry", LoaderRegistry(loaders, entry_point_group=""))
+    assert llmloader.resolve("echo-1").__class__.__name__ == "AzureAILoader"
+
+    llmloader.loaders.insert(0, EchoLoader())
+    assert llmloader.load("echo-1") == "loaded echo-1"
+
+    del llmloader.loaders[0]
+    assert llmloader.resolve("echo-1").__class__.__name__ == "AzureAILoader"
+
+
+def test_register_invalid():
+    """Test that objects which are not loaders cannot be registered."""
+    registry = LoaderRegistry(entry_point_group="")
+    with pytest.raises(TypeError):
+        registry.register(object())
+
+
+def test_entry_points_discovered_once(monkeypatch):
+    """Test that third-party loaders are discovered from entry points only once.
+
+    Args:
+        monkeypatch: Pytest fixture for patching entry point discovery.
+    """
+    entry_point = MagicMock()
+    entry_point.load.return_value = EchoLoader
+    discover = MagicMock(return_value=[entry_point])
+    monkeypatch.setattr("importlib.metadata.entry_points", discover)
+
+    registry = LoaderRegistry(entry_point_group="llmloader.loaders")
+    assert isinstance(registry.resolve("echo-1"), EchoLoader)
+    assert isinstance(registry.resolve("echo-2"), EchoLoader)
+
+    discover.assert_called_once_with(group="llmloader.loaders")
+
+
+def test_entry_point_error_warns(monkeypatch):
+    """Test that a broken entry point gives a warning rather than breaking resolution.
+
+    Args:
+        monkeypatch: Pytest fixture for patching entry point discovery.
+    """
+    entry_point = MagicMock()
+    entry_point.name = "broken"
+    entry_point.load.side_effect = ImportError("missing")
+    monkeypatch.setattr("importlib.metadata.entry_points", MagicMock(return_value=[entry_point]))
+
+    registry = LoaderRegistry(entry_point_group="llmloader.loaders")
+    with pytest.warns(UserWarning, match="broken"):
+        assert registry.resolve("echo-1") is None
+
+
+def test_load_unknown_model_error(no_endpoint, monkeypatch):
+    """Test that a model name which no registered loader claims raises an error.
+
+    Args:
+        no_endpoint: Fixture removing any custom endpoint.
+        monkeypatch: Pytest fixture for replacing the registry.
+    """
+    monkeypatch.setattr(llmloader, "default_registry", LoaderRegistry([EchoLoader()], entry_point_group=""))
+    with pytest.raises(ValueError, match="could not load a model"):
+        llmloader.load("unknown-model")
+
+    assert llmloader.load("echo-1") == "loaded echo-1"
@@ -0,0 +1,140 @@
+import multiprocessing
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+
+from llmloader import load
+from llmloader.response_cache import ResponseCache, response_key
+from llmloader.wrappers import LLMWrapper
+
+
+def fake_chat_model(cache, count: int = 10) -> GenericFakeChatModel:
+    """Test helper which returns a chat model responding with "response 0", "response 1", ... in turn."""
+    return GenericFakeChatModel(messages=iter(AIMessage(content=f"response {i}") for i in range(count)), cache=cache)
+
+
+def write_responses(path, worker: int) -> None:
+    """Test helper which stores responses from a separate process."""
+    cache = ResponseCache(path)
+    for i in range(50):
+        cache.update(f"prompt {worker} {i}", "model", [ChatGeneration(message=AIMessage(content=f"{worker} {i}"))])
+
+
+def test_hit_and_miss(tmp_path):
+    """Test that a repeated call is answered from the cache and that hits and misses are counted."""
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    llm = fake_chat_model(cache)
+
+    assert llm.invoke("Hello").content == "response 0"
+    assert llm.invoke("Hello").content == "response 0"
+    assert llm.invoke("Goodbye").content == "response 1"
+
+    info = cache.info()
+    assert (info.hits, info.misses, info.entries) == (1, 2, 2)
+    assert info.bytes > 0
+
+
+def test_persistent(tmp_path):
+    """Test that responses are read back from the file by a new cache."""
+    fake_chat_model(ResponseCache(tmp_path / "responses.sqlite")).invoke("Hello")
+
+    llm = fake_chat_model(ResponseCache(tmp_path / "responses.sqlite"))
+    assert llm.invoke("Hello").content == "response 0"
+    assert llm.invoke("Hello again").content == "response 0"
+
+
+def test_key_includes_images():
+    """Test that the key depends on the base64 image data in the messages."""
+    llm = load("dummy")
+
+    def prompt(data: str) -> str:
+        from langchain_core.load import dumps
+
+        image = LLMWrapper.format(llm, "image", dict(data=data, mime_type="image/png"))
+        return dumps([HumanMessage(content=[dict(type="text", text="Describe this"), image])])
+
+    assert response_key(prompt("aGVsbG8="), "model") != response_key(prompt("d29ybGQ="), "model")
+    assert response_key(prompt("aGVsbG8="), "model") != response_key(prompt("aGVsbG8="), "other model")
+    assert response_key(prompt("aGVsbG8="), "model") == response_key(prompt("aGVsbG8="), "model")
+
+
+def test_eviction(tmp_path):
+    """Test that the least recently used responses are evicted when the cache exceeds its size."""
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    generation = lambda i: [ChatGeneration(message=AIMessage(content=f"response {i}"))]  # noqa: E731
+
+    cache.update("first", "model", generation(0))
+    cache.update("second", "model", generation(1))
+    cache.update("third", "model", generation(2))
+    cache.max_bytes = cache.info().bytes
+    assert cache.lookup("first", "model") is not None  # now the most recently used
+
+    cache.update("fourth", "model", generation(3))
+
+    assert cache.lookup("second", "model") is None
+    assert cache.lookup("first", "model")[0].message.content == "response 0"
+    assert len(cache) == 3
+    assert cache.info().bytes <= cache.max_bytes
+
+
+def test_clear(tmp_path):
+    """Test removing all responses."""
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.update("prompt", "model", [ChatGeneration(message=AIMessage(content="response"))])
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.info().bytes == 0
+    assert cache.lookup("prompt", "model") is None
+
+
+def test_processes(tmp_path):
+    """Test that several processes can write to the same cache at once."""
+    path = tmp_path / "responses.sqlite"
+    ResponseCache(path)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=write_responses, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+    cache = ResponseCache(path)
+    assert len(cache) == 200
+    assert cache.lookup("prompt 3 49", "model")[0].message.content == "3 49"
+
+
+def test_load_with_cache(tmp_path):
+    """Test that `load(..., cache=path)` shares one response cache between loads of the same path."""
+    path = tmp_path / "responses.sqlite"
+
+    llm = load("dummy", cache=path)
+    llm.invoke("Hello")
+    load("dummy", cache=str(path)).invoke("Hello")
+
+    assert isinstance(llm.cache, ResponseCache)
+    assert llm.cache.info()[:3] == (1, 1, 1)
+
+
+def test_load_with_cache_object(tmp_path):
+    """Test that a cache object is used as is."""
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+
+    assert load("dummy", cache=cache).cache is cache
+
+
+def test_load_with_client_cache(tmp_path):
+    """Test that clients loaded with different response caches are not shared."""
+    from llmloader import ClientCache
+
+    clients = ClientCache()
+    first = load("dummy", client_cache=clients, cache=tmp_path / "first.sqlite")
+    second = load("dummy", client_cache=clients, cache=tmp_path / "second.sqlite")
+
+    assert first is not second
+    assert first is load("dummy", client_cache=clients, cache=tmp_path / "first.sqlite")
+    assert load("dummy", client_cache=clients).cache is None
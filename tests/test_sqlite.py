@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+
+from llmloader.sqlite import SQLiteConnections
+
+
+def test_connection_per_thread(tmp_path):
+    """Test that each thread gets its own connection and a thread reuses its connection."""
+    connections = SQLiteConnections(tmp_path / "db.sqlite")
+    other = []
+    thread = threading.Thread(target=lambda: other.append(connections()))
+    thread.start()
+    thread.join()
+
+    assert connections() is connections()
+    assert other[0] is not connections()
+    assert connections().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_transaction_rolls_back_on_error(tmp_path):
+    """Test that the writes of a failed transaction are rolled back and those of a finished one are kept."""
+    connections = SQLiteConnections(tmp_path / "db.sqlite")
+    connections().execute("CREATE TABLE items (name TEXT)")
+
+    with connections.transaction() as connection:
+        connection.execute("INSERT INTO items VALUES ('kept')")
+    with pytest.raises(ValueError), connections.transaction() as connection:
+        connection.execute("INSERT INTO items VALUES ('lost')")
+        raise ValueError("failed")
+
+    assert connections().execute("SELECT name FROM items").fetchall() == [("kept",)]
@@ -0,0 +1,129 @@
+import asyncio
+import multiprocessing
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from llmloader.usage import UsageLedger, get_ledger, to_timestamp
+
+DAY = datetime(2026, 3, 1, tzinfo=timezone.utc).timestamp()
+
+
+def record_usage(path, worker: int) -> None:
+    """Test helper which records usage from a separate process and flushes it when the process exits."""
+    ledger = UsageLedger(path, flush_size=7)
+    for i in range(100):
+        ledger.record("gpt-4o", "openai", input_tokens=1, output_tokens=2, when=DAY + i)
+
+
+def test_to_timestamp():
+    """Test converting times given in different ways."""
+    assert to_timestamp(None) is None
+    assert to_timestamp(DAY) == DAY
+    assert to_timestamp("2026-03-01") == DAY
+    assert to_timestamp("2026-03-01T10:00:00+10:00") == DAY
+    assert to_timestamp(datetime(2026, 3, 1)) == DAY
+
+
+def test_totals(tmp_path):
+    """Test the totals grouped by model, provider and period."""
+    ledger = UsageLedger(tmp_path / "usage.sqlite")
+    ledger.record("gpt-4o", "openai", input_tokens=10, output_tokens=5, when=DAY + 60)
+    ledger.record("gpt-4o", "openai", input_tokens=20, output_tokens=5, total_tokens=30, when=DAY + 7200)
+    ledger.record("claude", "anthropic", input_tokens=1, output_tokens=2, when=DAY + 86400)
+
+    assert ledger.totals() == [
+        dict(model="claude", requests=1, input_tokens=1, output_tokens=2, total_tokens=3),
+        dict(model="gpt-4o", requests=2, input_tokens=30, output_tokens=10, total_tokens=45),
+    ]
+    assert [row["provider"] for row in ledger.totals(by=["provider"])] == ["anthropic", "openai"]
+    assert ledger.totals(by=[]) == [dict(requests=3, input_tokens=31, output_tokens=12, total_tokens=48)]
+
+    days = ledger.totals(by=["period", "model"])
+    assert [(row["period"], row["model"], row["requests"]) for row in days] == [
+        ("2026-03-01T00:00:00+00:00", "gpt-4o", 2),
+        ("2026-03-02T00:00:00+00:00", "claude", 1),
+    ]
+    assert len(ledger.totals(by=["period"], period="hour")) == 3
+
+
+def test_totals_filters(tmp_path):
+    """Test restricting the totals to a time range, a model and a provider."""
+    ledger = UsageLedger(tmp_path / "usage.sqlite")
+    ledger.record("gpt-4o", "openai", input_tokens=10, when=DAY)
+    ledger.record("gpt-4o", "openai", input_tokens=20, when=DAY + 86400)
+    ledger.record("gpt-4o", "azure", input_tokens=40, when=DAY + 86400)
+
+    assert ledger.totals(since="2026-03-02")[0]["input_tokens"] == 60
+    assert ledger.totals(until="2026-03-02")[0]["input_tokens"] == 10
+    assert ledger.totals(provider="azure")[0]["input_tokens"] == 40
+    assert ledger.totals(model="claude") == []
+    assert ledger.totals(by=[], model="claude") == []
+
+
+@pytest.mark.parametrize("kwargs", [dict(by=["cost"]), dict(period="week")])
+def test_totals_invalid(kwargs, tmp_path):
+    """Test that unknown groups and periods raise an error."""
+    with pytest.raises(ValueError):
+        UsageLedger(tmp_path / "usage.sqlite").totals(**kwargs)
+
+
+def test_flush_in_batches(tmp_path):
+    """Test that records stay in memory until a batch is full."""
+    path = tmp_path / "usage.sqlite"
+    ledger = UsageLedger(path, flush_size=3, flush_interval=3600)
+    reader = UsageLedger(path)
+
+    ledger.record("gpt-4o", input_tokens=1)
+    ledger.record("gpt-4o", input_tokens=1)
+    assert reader.totals() == []
+
+    ledger.record("gpt-4o", input_tokens=1)
+    ledger._executor.submit(lambda: None).result()  # wait for the background flush
+    assert reader.totals()[0]["requests"] == 3
+
+
+def test_threads_and_tasks(tmp_path):
+    """Test recording from many threads and asyncio tasks at once."""
+    ledger = UsageLedger(tmp_path / "usage.sqlite", flush_size=10)
+
+    def record_many():
+        for _ in range(200):
+            ledger.record("gpt-4o", "openai", input_tokens=1, output_tokens=1)
+
+    async def record_async():
+        for _ in range(200):
+            ledger.record("gpt-4o", "openai", input_tokens=1, output_tokens=1)
+            await asyncio.sleep(0)
+
+    async def record_tasks():
+        await asyncio.gather(*(record_async() for _ in range(4)))
+
+    threads = [threading.Thread(target=record_many) for _ in range(4)]
+    threads.append(threading.Thread(target=asyncio.run, args=(record_tasks(),)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert ledger.totals(by=[]) == [dict(requests=1600, input_tokens=1600, output_tokens=1600, total_tokens=3200)]
+
+
+def test_processes(tmp_path):
+    """Test that several processes can record to the same ledger."""
+    path = tmp_path / "usage.sqlite"
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=record_usage, args=(str(path), worker)) for worker in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    assert UsageLedger(path).totals()[0]["requests"] == 300
+
+
+def test_get_ledger(tmp_path):
+    """Test that the ledger for a file is shared."""
+    assert get_ledger(tmp_path / "usage.sqlite") is get_ledger(str(tmp_path / "usage.sqlite"))
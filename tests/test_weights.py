@@ -0,0 +1,220 @@
+import gc
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from llmloader.huggingface import HuggingFaceLoader
+from llmloader.weights import WeightKey, WeightRegistry
+
+
+def fake_weights(size: int = 1000):
+    """Test helper returning a factory for a mock model of a given size and a mock tokenizer.
+
+    Args:
+        size: The memory footprint of the model in bytes.
+
+    Returns:
+        Callable: A factory returning a (model, tokenizer) tuple.
+    """
+
+    def factory():
+        model = MagicMock()
+        model.get_memory_footprint.return_value = size
+        return model, MagicMock()
+
+    return factory
+
+
+def key(name: str) -> WeightKey:
+    return WeightKey(name, "float16", "none", "cpu")
+
+
+def test_acquire_shares_weights():
+    """Test that acquiring the same key twice returns the same model and counts both references."""
+    registry = WeightRegistry()
+    factory = MagicMock(side_effect=fake_weights())
+
+    model1, tokenizer1 = registry.acquire(key("a"), factory)
+    model2, tokenizer2 = registry.acquire(key("a"), factory)
+
+    assert model1 is model2
+    assert tokenizer1 is tokenizer2
+    assert factory.call_count == 1
+    assert registry.references(key("a")) == 2
+    assert registry.total_size() == 1000
+
+
+def test_different_keys_load_separately():
+    """Test that a different dtype or device gives separate weights."""
+    registry = WeightRegistry()
+    model1, _ = registry.acquire(WeightKey("a", "float16", "none", "cpu"), fake_weights())
+    model2, _ = registry.acquire(WeightKey("a", "float32", "none", "cpu"), fake_weights())
+
+    assert model1 is not model2
+    assert len(registry) == 2
+
+
+def test_loads_do_not_block_each_other():
+    """Test that a slow load does not block other keys and that concurrent loads of one key load it once."""
+    registry = WeightRegistry(memory_budget=None)
+    loading = threading.Event()
+    finish = threading.Event()
+    factory = MagicMock(side_effect=fake_weights())
+
+    def slow_factory():
+        loading.set()
+        assert finish.wait(5)
+        return factory()
+
+    threads = [threading.Thread(target=registry.acquire, args=(key("slow"), slow_factory)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    assert loading.wait(5)
+
+    registry.acquire(key("fast"), fake_weights())
+    registry.release(key("fast"))
+    assert registry.unload("fast") == 1
+
+    finish.set()
+    for thread in threads:
+        thread.join()
+    assert factory.call_count == 1
+    assert registry.references(key("slow")) == 3
+
+
+def test_failed_load_can_be_retried():
+    """Test that a load which fails leaves no entry and can be tried again."""
+    registry = WeightRegistry()
+
+    with pytest.raises(OSError):
+        registry.acquire(key("a"), MagicMock(side_effect=OSError("download failed")))
+    assert key("a") not in registry
+    registry.acquire(key("a"), fake_weights())
+    assert registry.references(key("a")) == 1
+
+
+def test_default_frees_weights_on_last_release():
+    """Test that by default the weights are evicted when the last reference is released, even of unknown size."""
+    registry = WeightRegistry()
+    registry.acquire(key("a"), fake_weights(size=0))
+    registry.acquire(key("a"), fake_weights(size=0))
+
+    registry.release(key("a"))
+    assert key("a") in registry
+    registry.release(key("a"))
+    assert key("a") not in registry
+
+
+def test_set_memory_budget():
+    """Test that lowering the budget evicts the unused weights beyond it and that None never evicts."""
+    registry = WeightRegistry(memory_budget=None)
+    for name in "ab":
+        registry.acquire(key(name), fake_weights())
+        registry.release(key(name))
+    assert len(registry) == 2
+
+    registry.set_memory_budget(1000)
+    assert list(registry._entries) == [key("b")]
+    registry.set_memory_budget(0)
+    assert len(registry) == 0
+
+
+def test_release_keeps_unused_weights_within_budget():
+    """Test that released weights stay loaded for reuse while within the memory budget."""
+    registry = WeightRegistry(memory_budget=5000)
+    registry.acquire(key("a"), fake_weights())
+    registry.release(key("a"))
+
+    assert key("a") in registry
+    assert registry.references(key("a")) == 0
+
+
+def test_evicts_unused_weights_over_budget():
+    """Test that unused weights are evicted, least recently used first, when over the memory budget."""
+    registry = WeightRegistry(memory_budget=2500)
+    registry.acquire(key("a"), fake_weights())
+    registry.acquire(key("b"), fake_weights())
+    registry.release(key("a"))
+    registry.release(key("b"))
+
+    registry.acquire(key("c"), fake_weights())
+
+    assert key("a") not in registry
+    assert key("b") in registry
+    assert key("c") in registry
+
+
+def test_does_not_evict_weights_in_use():
+    """Test that weights which are still referenced are never evicted."""
+    registry = WeightRegistry(memory_budget=1500)
+    registry.acquire(key("a"), fake_weights())
+    registry.acquire(key("b"), fake_weights())
+
+    assert key("a") in registry
+    assert key("b") in registry
+    assert registry.total_size() == 2000
+
+
+def test_unload():
+    """Test that unload removes weights and returns the number of entries removed."""
+    registry = WeightRegistry(memory_budget=None)
+    registry.acquire(key("a"), fake_weights())
+    registry.acquire(key("b"), fake_weights())
+    registry.release(key("a"))
+    registry.release(key("b"))
+
+    assert registry.unload("a") == 1
+    assert key("a") not in registry
+    assert registry.unload() == 1
+    assert len(registry) == 0
+
+
+def test_unload_in_use_warns():
+    """Test that unloading weights which are still in use gives a warning."""
+    registry = WeightRegistry()
+    registry.acquire(key("a"), fake_weights())
+
+    with pytest.warns(UserWarning, match="still used"):
+        assert registry.unload("a") == 1
+
+
+def test_huggingface_loader_shares_weights(huggingface_mock_setup):
+    """Test that loading the same model twice loads the weights once and releases them on deletion.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    transformers_mock, _ = huggingface_mock_setup
+    registry = WeightRegistry()
+    loader = HuggingFaceLoader(weight_registry=registry)
+
+    llm1 = loader(model="meta-llama/Llama-3-8B", api_key="hf")
+    llm2 = loader(model="meta-llama/Llama-3-8B", api_key="hf")
+
+    assert transformers_mock.AutoModelForCausalLM.from_pretrained.call_count == 1
+    assert transformers_mock.AutoTokenizer.from_pretrained.call_count == 1
+    assert llm1.pipeline.model is llm2.pipeline.model
+    (weight_key,) = list(registry._entries)
+    assert registry.references(weight_key) == 2
+
+    del llm1, llm2
+    gc.collect()
+    assert registry.references(weight_key) == 0
+
+
+def test_huggingface_loader_releases_weights_on_pipeline_error(huggingface_mock_setup):
+    """Test that the weights are released if the pipeline cannot be built, so that they can be unloaded.
+
+    Args:
+        huggingface_mock_setup (tuple): Fixture providing mocked transformers and torch modules.
+    """
+    transformers_mock, _ = huggingface_mock_setup
+    transformers_mock.pipeline.side_effect = ValueError("unsupported task")
+    registry = WeightRegistry()
+    loader = HuggingFaceLoader(weight_registry=registry)
+
+    with pytest.raises(ValueError, match="unsupported task"):
+        loader(model="meta-llama/Llama-3-8B", api_key="hf")
+
+    assert len(registry) == 0
@@ -109,3 +109,106 @@ def test_get_token_count_empty_metadata():
     assert result["input_tokens"] == 0
     assert result["output_tokens"] == 0
     assert result["total_tokens"] == 0
+
+
+def test_get_token_count_record(token_response_metadata, tmp_path):
+    """Test that the usage is added to a usage ledger when a record path is given.
+
+    Args:
+        token_response_metadata: Fixture providing sample response metadata.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    from langchain_core.messages import AIMessage
+
+    from llmloader.usage import get_ledger
+    from llmloader.wrappers import LLMWrapper
+
+    record = tmp_path / "usage.sqlite"
+    metadata = dict(token_response_metadata, model_name="gpt-4o", model_provider="openai")
+
+    LLMWrapper.get_token_count(metadata, record=record)
+    LLMWrapper.get_token_count(AIMessage(content="", response_metadata=metadata), record=record)
+
+    (totals,) = get_ledger(record).totals(by=["model", "provider"])
+    assert totals == dict(
+        model="gpt-4o", provider="openai", requests=2, input_tokens=100, output_tokens=200, total_tokens=300
+    )
+
+
+def test_format_image_path(azure_llm_mock, openai_llm_mock, tmp_path):
+    """Test encoding and formatting an image file for different models.
+
+    Args:
+        azure_llm_mock: Fixture providing a mocked Azure LLM instance.
+        openai_llm_mock: Fixture providing a mocked OpenAI LLM instance.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    import base64
+
+    from llmloader.wrappers import LLMWrapper
+
+    path = tmp_path / "page.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xe0" + b"scan" * 1000)
+    encoded = base64.b64encode(path.read_bytes()).decode("ascii")
+
+    result = LLMWrapper.format_image(openai_llm_mock, path)
+    assert result["mime_type"] == "image/jpeg"
+    assert result["data"] == encoded
+
+    result = LLMWrapper.format_image(azure_llm_mock, path.read_bytes())
+    assert result["image_url"]["url"] == f"data:image/jpeg;base64,{encoded}"
+
+
+def test_format_image_list(openai_llm_mock, tmp_path):
+    """Test encoding a list of images in parallel, keeping their order.
+
+    Args:
+        openai_llm_mock: Fixture providing a mocked OpenAI LLM instance.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    import base64
+
+    from llmloader.wrappers import LLMWrapper
+
+    paths = []
+    for i in range(8):
+        path = tmp_path / f"page{i}.png"
+        path.write_bytes(b"\x89PNG\r\n\x1a\n" + bytes([i]) * 5000)
+        paths.append(path)
+
+    results = LLMWrapper.format_image(openai_llm_mock, paths, max_workers=4)
+
+    assert [result["data"] for result in results] == [
+        base64.b64encode(path.read_bytes()).decode("ascii") for path in paths
+    ]
+    assert {result["mime_type"] for result in results} == {"image/png"}
+
+
+def test_format_image_resize(anthropic_llm_mock, openai_llm_mock, tmp_path):
+    """Test resizing images to the limits of each provider.
+
+    Args:
+        anthropic_llm_mock: Fixture providing a mocked Anthropic LLM instance.
+        openai_llm_mock: Fixture providing a mocked OpenAI LLM instance.
+        tmp_path: Pytest fixture providing a temporary directory.
+    """
+    import base64
+    import io
+
+    Image = pytest.importorskip("PIL.Image")
+    from llmloader.wrappers import LLMWrapper
+
+    path = tmp_path / "scan.png"
+    Image.new("RGB", (4000, 3000), "white").save(path)
+
+    def size(result):
+        return Image.open(io.BytesIO(base64.b64decode(result["data"]))).size
+
+    assert size(LLMWrapper.format_image(openai_llm_mock, path, resize=True)) == (1024, 768)
+    assert size(LLMWrapper.format_image(anthropic_llm_mock, path, resize=True)) == (1568, 1176)
+    assert size(LLMWrapper.format_image(openai_llm_mock, path)) == (4000, 3000)
+
+    data = dict(data=base64.b64encode(path.read_bytes()).decode("ascii"), mime_type="image/png")
+    result = LLMWrapper.format(openai_llm_mock, "image", data, resize=True)
+    assert result["mime_type"] == "image/jpeg"
+    assert size(result) == (1024, 768)